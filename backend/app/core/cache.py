@@ -0,0 +1,76 @@
+# Filename: app/core/cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable
+
+
+class TTLCache:
+    """
+    Least-recently-used mapping whose entries also expire a fixed number of
+    seconds after they were stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value, or `default` if it is missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Stores a value, evicting the least recently used entry when full."""
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Removes a key and returns its value if it was cached."""
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Returns size and hit/miss counters."""
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class InMemorySharedCache:
+    """
+    Stand-in for a cache shared by all workers, such as Redis or memcached, with the same async
+    interface of bytes values under string keys. It is only shared within this process, which
+    makes it suitable for a single worker and for development.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize, ttl)
+
+    async def get(self, key: str) -> bytes | None:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: bytes):
+        self._cache.set(key, value)
+
+    async def delete(self, keys: Iterable[str]):
+        for key in keys:
+            self._cache.pop(key)
@@ -12,12 +12,164 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_MINUTES: int
     API_VERSION: str
 
+    # Password hashing
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_REHASH_ON_LOGIN: bool = True
+    PASSWORD_HASH_EXECUTOR: str = "thread"  # "thread" or "process"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 256
+
+    # Principal cache for authenticated requests
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    # How often user changes (role, deactivation) are broadcast to the other workers' principal caches
+    AUTH_INVALIDATION_FLUSH_SECONDS: float = 0.5
+    # Revoked access tokens are held in memory, grouped into expiry buckets of this width,
+    # and reloaded from the database on this interval to pick up other workers' revocations
+    TOKEN_REVOCATION_BUCKET_SECONDS: int = 60
+    TOKEN_REVOCATION_SYNC_SECONDS: float = 30.0
+
+    # Tourist profile cache: a per-worker LRU in front of an optional shared backend ("" for none,
+    # "memory" for an in-process stand-in). Other workers drop their copies of changed profiles
+    # via the event broker, batched over the flush interval; the TTLs bound staleness from
+    # writes that do not go through the tourist service, e.g. background safety-score updates
+    PROFILE_CACHE_MAX_ENTRIES: int = 10000
+    PROFILE_CACHE_TTL_SECONDS: int = 30
+    PROFILE_CACHE_SHARED_BACKEND: str = ""
+    PROFILE_CACHE_SHARED_TTL_SECONDS: int = 60
+    PROFILE_CACHE_INVALIDATION_FLUSH_SECONDS: float = 0.5
+
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_SERVER: str
     POSTGRES_PORT: int
     POSTGRES_DB: str
 
+    # Connection pool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Logs every SQL statement; for local debugging only
+    DB_ECHO: bool = False
+
+    # Prometheus-style /metrics endpoint
+    METRICS_ENABLED: bool = True
+    METRICS_LOOP_LAG_INTERVAL_SECONDS: float = 0.5
+
+    # Access log writer (also used for failed login rows)
+    ACCESS_LOG_QUEUE_SIZE: int = 10000
+    ACCESS_LOG_BATCH_SIZE: int = 500
+    ACCESS_LOG_FLUSH_INTERVAL_SECONDS: float = 1.0
+
+    # Login brute-force protection: failures are counted per username and per client IP
+    # over a sliding window, and attempts beyond either limit are refused before bcrypt runs
+    LOGIN_WINDOW_SECONDS: float = 900.0
+    LOGIN_MAX_FAILURES_PER_USERNAME: int = 5
+    LOGIN_MAX_FAILURES_PER_IP: int = 50
+    LOGIN_THROTTLE_MAX_KEYS: int = 100000
+    # Only enable behind a proxy that sets X-Forwarded-For; otherwise clients can spoof it
+    LOGIN_TRUST_FORWARDED_FOR: bool = False
+
+    # Admission control in front of the routers. SOS and acknowledge calls are never limited,
+    # queued or shed. Other requests take a token from their user's role bucket (or the client
+    # IP's when unauthenticated, read from X-Forwarded-For if LOGIN_TRUST_FORWARDED_FOR is set;
+    # behind a proxy without it every anonymous caller shares one bucket) and, for routes listed
+    # below, from the route's shared bucket; limits are [requests per second, burst]. Route keys are "METHOD /path", with a trailing
+    # "*" matching any path below it; these routes are also admitted last when queueing.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_ROLE_LIMITS: dict[str, list[float]] = {
+        "tourist": [2.0, 20.0],
+        "police": [20.0, 100.0],
+        "admin": [20.0, 100.0],
+        "cybersecurity": [10.0, 50.0],
+        "unauthenticated": [5.0, 20.0],
+    }
+    ADMISSION_ROUTE_LIMITS: dict[str, list[float]] = {
+        "GET /api/v1/tourists/": [20.0, 40.0],
+        "GET /api/v1/alerts/history": [20.0, 40.0],
+        "GET /api/v1/logs/*": [2.0, 5.0],
+    }
+    ADMISSION_MAX_KEYS: int = 100000
+    # Requests beyond this many in flight wait, by priority, for at most the queue timeout
+    ADMISSION_MAX_CONCURRENT: int = 200
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    # Low-priority requests are shed with 503 once the recent pool wait passes this, others at twice it
+    ADMISSION_SHED_POOL_WAIT_SECONDS: float = 0.25
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+
+    # Real-time event fan-out ("memory" for a single worker, "postgres" for LISTEN/NOTIFY across workers)
+    EVENT_BACKEND: str = "memory"
+    EVENT_SUBSCRIBER_QUEUE_SIZE: int = 100
+    EVENT_HEARTBEAT_SECONDS: float = 15.0
+
+    # Geo-fencing
+    GEOFENCE_GRID_CELL_DEGREES: float = 0.05
+    # How often each worker polls for fence changes made by other workers
+    GEOFENCE_REFRESH_SECONDS: float = 5.0
+    # Douglas-Peucker tolerance applied to imported polygons (~1 m at the equator)
+    GEOFENCE_SIMPLIFY_TOLERANCE_DEGREES: float = 0.00001
+    GEOFENCE_MAX_VERTICES: int = 10000
+    # A membership change is only confirmed after this many consecutive fixes spanning the dwell time
+    GEOFENCE_MIN_FIXES: int = 2
+    GEOFENCE_DWELL_SECONDS: float = 30.0
+    # Fixes closer than this to a fence edge keep the tourist's current membership of that fence
+    GEOFENCE_HYSTERESIS_METERS: float = 15.0
+
+    # Location history: fixes are buffered per tourist and written as encoded segments
+    LOCATION_HISTORY_FLUSH_SECONDS: float = 10.0
+    LOCATION_HISTORY_MAX_BUFFERED_POINTS: int = 100000
+    LOCATION_HISTORY_SEGMENT_MAX_POINTS: int = 1000
+    # Raw history older than this is thinned to one fix per bucket; anything past retention is deleted
+    LOCATION_HISTORY_DOWNSAMPLE_AFTER_HOURS: float = 24.0
+    LOCATION_HISTORY_DOWNSAMPLE_SECONDS: int = 60
+    LOCATION_HISTORY_RETENTION_DAYS: int = 30
+    LOCATION_HISTORY_COMPACT_SECONDS: float = 3600.0
+
+    # Anomaly detection on the live location stream
+    ANOMALY_MAX_TOURISTS: int = 200000
+    ANOMALY_TICK_SECONDS: float = 1.0
+    # A tourist is silent after missing this many expected fixes, within the min/max bounds
+    ANOMALY_DEFAULT_CADENCE_SECONDS: float = 60.0
+    ANOMALY_SILENCE_FACTOR: float = 5.0
+    ANOMALY_MIN_SILENCE_SECONDS: float = 300.0
+    ANOMALY_MAX_SILENCE_SECONDS: float = 3600.0
+    # Silence right after moving at least this fast is reported as a sudden drop-off
+    ANOMALY_DROP_OFF_SPEED_MPS: float = 2.0
+    ANOMALY_INACTIVITY_SECONDS: float = 7200.0
+    ANOMALY_STATIONARY_METERS: float = 50.0
+    ANOMALY_MAX_SPEED_MPS: float = 70.0
+    # State of tourists silent for this long is released
+    ANOMALY_FORGET_SECONDS: float = 86400.0
+
+    # Responder dispatch: the KD-tree is rebuilt from the database on this interval,
+    # or earlier once this many positions changed since the last build
+    RESPONDER_REFRESH_SECONDS: float = 30.0
+    RESPONDER_OVERLAY_LIMIT: int = 256
+    # Responders who have not reported for this long are not dispatched
+    RESPONDER_MAX_AGE_SECONDS: float = 900.0
+    SOS_RESPONDER_COUNT: int = 3
+
+    # Heat map: geohash precisions served as zoom levels, and how many levels below the
+    # requested tile a response may expand (32**depth cells at most)
+    HEATMAP_PRECISIONS: list[int] = [4, 5, 6]
+    HEATMAP_MAX_TILE_DEPTH: int = 3
+    HEATMAP_CACHE_MAX_ENTRIES: int = 4096
+    HEATMAP_RESEED_SECONDS: float = 600.0
+
+    # Safety score: tourists touched by a fix, alert or fence edit are rescored on this interval
+    SAFETY_SCORE_INTERVAL_SECONDS: float = 5.0
+    SAFETY_SCORE_BATCH_SIZE: int = 2000
+    SAFETY_SCORE_ALERT_WINDOW_DAYS: int = 30
+    # Area risk of a tourist outside every safe zone
+    SAFETY_SCORE_UNFENCED_RISK: float = 0.3
+    # Feature weights; they should add up to 1
+    SAFETY_SCORE_WEIGHT_AREA: float = 0.4
+    SAFETY_SCORE_WEIGHT_TIME: float = 0.15
+    SAFETY_SCORE_WEIGHT_ALERTS: float = 0.3
+    SAFETY_SCORE_WEIGHT_TRAJECTORY: float = 0.15
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
     @property
@@ -0,0 +1,40 @@
+# Filename: app/core/context.py
+from fastapi import Request
+
+_UNRESOLVED = object()
+
+
+class RequestContext:
+    """
+    Per-request state shared by the middleware, dependencies, routers and services that handle
+    one request. Each value is resolved lazily, at most once, by whoever needs it first.
+    """
+
+    __slots__ = ("token", "principal", "_tourist")
+
+    def __init__(self):
+        # Bearer token the principal was resolved from
+        self.token: str | None = None
+        self.principal = None
+        self._tourist = _UNRESOLVED
+
+    @property
+    def tourist_resolved(self) -> bool:
+        return self._tourist is not _UNRESOLVED
+
+    @property
+    def tourist(self):
+        """The principal's tourist profile (None if they have none); only valid once resolved."""
+        return None if self._tourist is _UNRESOLVED else self._tourist
+
+    @tourist.setter
+    def tourist(self, value):
+        self._tourist = value
+
+
+def get_request_context(request: Request) -> RequestContext:
+    """Dependency returning the request's context, created on first use. Lives in the ASGI scope's state."""
+    context = getattr(request.state, "context", None)
+    if context is None:
+        context = request.state.context = RequestContext()
+    return context
@@ -0,0 +1,58 @@
+# Filename: app/core/geohash.py
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: i for i, char in enumerate(BASE32)}
+
+
+def encode(latitude: float, longitude: float, precision: int) -> str:
+    """Encodes a point as a geohash of `precision` characters."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def bounds(geohash: str) -> tuple[float, float, float, float]:
+    """Returns the (min_lon, min_lat, max_lon, max_lat) box of a geohash cell."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lon_lo, lat_lo, lon_hi, lat_hi
+
+
+def is_valid(geohash: str) -> bool:
+    return all(char in _DECODE for char in geohash)
@@ -0,0 +1,68 @@
+# Filename: app/core/geometry.py
+import struct
+from typing import Annotated
+from geoalchemy2.elements import WKBElement
+from pydantic import BeforeValidator
+
+_EWKB_SRID_FLAG = 0x20000000
+_EWKB_TYPE_MASK = 0x0FFFFFFF
+_WKB_POINT = 1
+
+
+def point_coordinates(value) -> tuple[float, float] | None:
+    """
+    Extracts (longitude, latitude) from a point geometry value.
+    Accepts geoalchemy2 WKB elements, raw (E)WKB bytes and hex strings;
+    returns None for anything that is not a decodable point.
+    """
+    if value is None:
+        return None
+    data = getattr(value, "data", value)
+    if isinstance(data, str):
+        try:
+            data = bytes.fromhex(data)
+        except ValueError:
+            return None
+    if not isinstance(data, (bytes, bytearray, memoryview)) or len(data) < 21:
+        return None
+    fmt = "<" if data[0] == 1 else ">"
+    (geom_type,) = struct.unpack_from(fmt + "I", data, 1)
+    offset = 5
+    if geom_type & _EWKB_SRID_FLAG:
+        offset += 4
+    # ISO WKB encodes Z/M variants as 1001, 2001, 3001
+    if (geom_type & _EWKB_TYPE_MASK) % 1000 != _WKB_POINT:
+        return None
+    return struct.unpack_from(fmt + "dd", data, offset)
+
+
+def point_geojson(longitude: float, latitude: float) -> dict:
+    """Builds a GeoJSON Point dict."""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def point_element(longitude: float, latitude: float, srid: int = 4326) -> WKBElement:
+    """
+    Builds an EWKB point to assign to a geometry column. Unlike a SQL expression such as
+    ST_GeomFromText, the value stays readable on the instance after a flush, so the row
+    need not be reloaded to serialize it.
+    """
+    data = struct.pack("<BIIdd", 1, _WKB_POINT | _EWKB_SRID_FLAG, srid, longitude, latitude)
+    return WKBElement(data, srid=srid, extended=True)
+
+
+def to_geojson_point(value):
+    """
+    Normalizes a point for responses: GeoJSON dicts pass through, geometry values from
+    the database are decoded in place without a round trip through shapely or geojson.
+    """
+    if value is None or isinstance(value, dict):
+        return value
+    coordinates = point_coordinates(value)
+    if coordinates is None:
+        raise ValueError("Expected a point geometry")
+    return point_geojson(*coordinates)
+
+
+# Response field type for point geometry columns
+GeoJSONPoint = Annotated[dict, BeforeValidator(to_geojson_point)]
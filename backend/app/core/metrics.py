@@ -0,0 +1,236 @@
+# Filename: app/core/metrics.py
+import asyncio
+import contextvars
+import logging
+import math
+import time
+from bisect import bisect_left
+from sqlalchemy import event
+from typing import Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Metrics are only updated from the event loop thread, so plain dict and list updates need no locks.
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels; bucket counts are made cumulative when rendered."""
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float] = LATENCY_BUCKETS,
+                 labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        # labels -> [per-bucket counts including +Inf, sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class GaugeCollector:
+    """Gauge whose samples are produced by a callback when the metrics are scraped."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str],
+                 collect: Callable[[], Iterable[Tuple[tuple, float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            samples = list(self.collect())
+        except Exception:
+            logger.exception("Failed to collect %s", self.name)
+            return lines
+        for labels, value in samples:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: list = []
+        self._components: Dict[str, Callable[[], dict]] = {}
+        self.add(GaugeCollector("app_component_stat", "Counters reported by background components.",
+                                ("component", "stat"), self._collect_components))
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, buckets: Iterable[float] = LATENCY_BUCKETS,
+                  labelnames: Iterable[str] = ()) -> Histogram:
+        return self.add(Histogram(name, documentation, buckets, labelnames))
+
+    def register_component(self, name: str, stats: Callable[[], dict]):
+        """Exposes the numeric values of a component's `stats()` dict (nested dicts are flattened)."""
+        self._components[name] = stats
+
+    def _collect_components(self):
+        for component, stats in self._components.items():
+            stack = [("", stats())]
+            while stack:
+                prefix, values = stack.pop()
+                for key, value in values.items():
+                    if isinstance(value, dict):
+                        stack.append((f"{prefix}{key}_", value))
+                    elif isinstance(value, (int, float)):
+                        yield (component, f"{prefix}{key}"), value
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route template, method and status code.", ("method", "route", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", labelnames=("method", "route"))
+http_request_db_queries = registry.histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request.", COUNT_BUCKETS, ("method", "route"))
+http_request_db_seconds = registry.histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per HTTP request.", labelnames=("method", "route"))
+db_queries = registry.counter("db_queries_total", "SQL statements executed.")
+db_query_duration = registry.histogram("db_query_duration_seconds", "SQL statement latency.")
+db_pool_wait = registry.histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection.")
+event_loop_lag = registry.histogram("event_loop_lag_seconds", "Delay of event loop callbacks past their schedule.")
+
+# [statements, seconds] of the request being handled; tasks spawned by the request share it
+_request_db_usage: contextvars.ContextVar[list | None] = contextvars.ContextVar("request_db_usage", default=None)
+
+
+def begin_request() -> list:
+    """Starts attributing SQL statements to the current request; returns its [statements, seconds]."""
+    usage = [0, 0.0]
+    _request_db_usage.set(usage)
+    return usage
+
+
+def instrument_engine(engine):
+    """Records statement counts and latency for a (sync) SQLAlchemy engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        db_queries.inc()
+        db_query_duration.observe(elapsed)
+        usage = _request_db_usage.get()
+        if usage is not None:
+            usage[0] += 1
+            usage[1] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("metrics_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up, i.e. how long the event loop was blocked."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            event_loop_lag.observe(max(0.0, loop.time() - scheduled))
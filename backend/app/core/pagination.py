@@ -0,0 +1,42 @@
+# Filename: app/core/pagination.py
+import base64
+import json
+from fastapi import HTTPException, Query, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """Encodes the sort key of the last row of a page as an opaque cursor string."""
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *parsers) -> tuple:
+    """
+    Decodes a cursor produced by encode_cursor, converting each value with the matching
+    parser (e.g. `int`, `datetime.fromisoformat`). Malformed cursors are rejected with a 400.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError(cursor)
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+
+
+def bbox_params(
+        min_lon: float | None = Query(None, ge=-180, le=180),
+        min_lat: float | None = Query(None, ge=-90, le=90),
+        max_lon: float | None = Query(None, ge=-180, le=180),
+        max_lat: float | None = Query(None, ge=-90, le=90)
+) -> tuple[float, float, float, float] | None:
+    """Dependency for an optional (min_lon, min_lat, max_lon, max_lat) bounding-box filter."""
+    values = (min_lon, min_lat, max_lon, max_lat)
+    if all(value is None for value in values):
+        return None
+    if any(value is None for value in values) or min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Bounding box needs min_lon <= max_lon and min_lat <= max_lat.")
+    return values
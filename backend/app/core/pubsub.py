@@ -0,0 +1,214 @@
+# Filename: app/core/pubsub.py
+import asyncio
+import json
+import logging
+from typing import Callable, Dict, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A subscriber's bounded queue of messages on one channel.
+    A subscriber that falls behind loses its oldest messages rather than
+    slowing down the publisher or other subscribers.
+    """
+
+    def __init__(self, broker: "Broker", channel: str, maxsize: int, predicate: Callable[[dict], bool] | None):
+        self.broker = broker
+        self.channel = channel
+        self.predicate = predicate
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, message: dict):
+        if self.predicate is not None and not self.predicate(message):
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(message)
+
+    async def get(self) -> dict:
+        """Waits for the next message."""
+        return await self._queue.get()
+
+    def close(self):
+        """Stops receiving messages."""
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBackend:
+    """Delivers messages to subscribers in this process only."""
+
+    async def start(self, deliver: Callable[[str, dict], None]):
+        self._deliver = deliver
+
+    async def stop(self):
+        pass
+
+    async def listen(self, channel: str):
+        pass
+
+    async def publish(self, channel: str, message: dict):
+        self._deliver(channel, message)
+
+
+class PostgresNotifyBackend:
+    """
+    Fans messages out across workers with PostgreSQL LISTEN/NOTIFY.
+    Every worker listens on the channels it has subscribers for; a published
+    message is delivered locally only once it comes back as a notification,
+    so all workers (including the publisher) see the same stream.
+
+    LISTENs and NOTIFYs use separate connections, since asyncpg allows one operation
+    at a time per connection; publishes are serialized on theirs. A dropped listener
+    connection is re-established in the background and its channels listened to again.
+    """
+
+    # PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+    MAX_PAYLOAD_BYTES = 7999
+
+    def __init__(self, connect: Callable, channel_prefix: str = "events_", max_reconnect_delay: float = 30.0):
+        self._connect = connect
+        self.channel_prefix = channel_prefix
+        self.max_reconnect_delay = max_reconnect_delay
+        self._conn = None
+        self._publish_conn = None
+        self._publish_lock = asyncio.Lock()
+        self._deliver = None
+        self._listening: Set[str] = set()
+        self._reconnect_task: asyncio.Task | None = None
+        self._closing = False
+
+    async def start(self, deliver: Callable[[str, dict], None]):
+        self._deliver = deliver
+        self._closing = False
+        await self._connect_listener()
+
+    async def stop(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            await asyncio.gather(self._reconnect_task, return_exceptions=True)
+            self._reconnect_task = None
+        for conn in (self._conn, self._publish_conn):
+            if conn is not None:
+                await conn.close()
+        self._conn = self._publish_conn = None
+        self._listening.clear()
+
+    async def _connect_listener(self):
+        conn = await self._connect()
+        conn.add_termination_listener(self._on_termination)
+        for channel in self._listening:
+            await conn.add_listener(self.channel_prefix + channel, self._on_notify)
+        self._conn = conn
+
+    def _on_termination(self, connection):
+        if self._closing or connection is not self._conn:
+            return
+        logger.warning("Event listener connection lost; reconnecting")
+        self._conn = None
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 0.5
+        while not self._closing:
+            try:
+                await self._connect_listener()
+                return
+            except Exception:
+                logger.exception("Failed to reconnect the event listener; retrying in %.1fs", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def listen(self, channel: str):
+        if channel in self._listening:
+            return
+        self._listening.add(channel)
+        if self._conn is not None:
+            await self._conn.add_listener(self.channel_prefix + channel, self._on_notify)
+
+    def _on_notify(self, connection, pid, pg_channel, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Dropping malformed notification on %s", pg_channel)
+            return
+        self._deliver(pg_channel[len(self.channel_prefix):], message)
+
+    async def publish(self, channel: str, message: dict):
+        payload = json.dumps(message, default=str)
+        size = len(payload.encode())
+        if size > self.MAX_PAYLOAD_BYTES:
+            raise ValueError(f"Notification payload of {size} bytes on {channel} exceeds "
+                             f"{self.MAX_PAYLOAD_BYTES} bytes")
+        async with self._publish_lock:
+            # A broken connection is replaced and the notification retried once
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None or self._publish_conn.is_closed():
+                        self._publish_conn = await self._connect()
+                    await self._publish_conn.execute("SELECT pg_notify($1, $2)", self.channel_prefix + channel,
+                                                     payload)
+                    return
+                except Exception:
+                    conn, self._publish_conn = self._publish_conn, None
+                    if conn is not None and not conn.is_closed():
+                        conn.terminate()
+                    if attempt:
+                        raise
+
+
+class Broker:
+    """In-process publish/subscribe hub with a pluggable transport backend."""
+
+    def __init__(self, backend, queue_size: int = 100):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.published = 0
+        self._started = False
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+
+    async def start(self):
+        await self.backend.start(self._deliver)
+        self._started = True
+        for channel in self._subscriptions:
+            await self.backend.listen(channel)
+
+    async def stop(self):
+        self._started = False
+        await self.backend.stop()
+
+    async def subscribe(self, channel: str, predicate: Callable[[dict], bool] | None = None) -> Subscription:
+        """Registers a subscriber; `predicate` can filter out messages it does not want."""
+        subscription = Subscription(self, channel, self.queue_size, predicate)
+        self._subscriptions.setdefault(channel, set()).add(subscription)
+        if self._started:
+            await self.backend.listen(channel)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscriptions.get(subscription.channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+
+    async def publish(self, channel: str, message: dict):
+        """Publishes a JSON-serializable message to every subscriber of a channel."""
+        self.published += 1
+        if not self._started:
+            self._deliver(channel, message)
+            return
+        try:
+            await self.backend.publish(channel, message)
+        except Exception:
+            logger.exception("Failed to publish message on %s", channel)
+
+    def subscriber_count(self, channel: str) -> int:
+        return len(self._subscriptions.get(channel, ()))
+
+    def _deliver(self, channel: str, message: dict):
+        for subscription in list(self._subscriptions.get(channel, ())):
+            subscription.offer(message)
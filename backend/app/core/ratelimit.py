@@ -0,0 +1,114 @@
+# Filename: app/core/ratelimit.py
+import math
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class SlidingWindowCounter:
+    """
+    Approximate sliding-window event counts per key in constant memory per key.
+
+    Each key keeps the counts of the current and previous fixed windows; the sliding count
+    weights the previous window by how much of it still overlaps the sliding window. Keys are
+    held in LRU order and the least recently touched key is evicted beyond `max_keys`.
+    """
+
+    def __init__(self, window_seconds: float, max_keys: int):
+        self.window = window_seconds
+        self.max_keys = max_keys
+        # key -> [current window index, count in current window, count in previous window]
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _entry(self, key: Hashable, now: float, create: bool) -> list | None:
+        index = math.floor(now / self.window)
+        entry = self._entries.get(key)
+        if entry is None:
+            if not create:
+                return None
+            entry = self._entries[key] = [index, 0, 0]
+            if len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        elif entry[0] != index:
+            # Roll forward; anything older than the previous window no longer counts
+            entry[2] = entry[1] if entry[0] == index - 1 else 0
+            entry[1] = 0
+            entry[0] = index
+        self._entries.move_to_end(key)
+        return entry
+
+    def count(self, key: Hashable, now: float | None = None) -> float:
+        now = time.time() if now is None else now
+        entry = self._entry(key, now, create=False)
+        if entry is None:
+            return 0.0
+        elapsed = now / self.window - entry[0]
+        return entry[1] + entry[2] * (1.0 - elapsed)
+
+    def hit(self, key: Hashable, now: float | None = None) -> float:
+        """Counts one event and returns the sliding count including it."""
+        now = time.time() if now is None else now
+        self._entry(key, now, create=True)[1] += 1
+        return self.count(key, now)
+
+    def retry_after(self, key: Hashable, limit: float, now: float | None = None) -> float:
+        """Seconds until the sliding count of `key` drops below `limit` if no further events occur."""
+        now = time.time() if now is None else now
+        entry = self._entry(key, now, create=False)
+        if entry is None:
+            return 0.0
+        current, previous = entry[1], entry[2]
+        window_start = entry[0] * self.window
+        if current >= limit:
+            # Only the decay of this window's count, once it becomes the previous one, brings it under the limit
+            return window_start + self.window * (2.0 - limit / current) - now
+        if previous == 0 or current + previous * (1.0 - (now - window_start) / self.window) < limit:
+            return 0.0
+        # previous * (1 - t / window) + current < limit  =>  t > window * (1 - (limit - current) / previous)
+        return window_start + self.window * (1.0 - (limit - current) / previous) - now
+
+    def reset(self, key: Hashable):
+        self._entries.pop(key, None)
+
+
+class TokenBuckets:
+    """
+    Token buckets per key, refilled at `rate` tokens per second up to `burst`.
+    Keys are held in LRU order; an evicted key simply starts again with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> [tokens, last refill time]
+        self._buckets: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: Hashable, now: float | None = None) -> float:
+        """Takes a token; returns 0 on success, otherwise the seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / self.rate if self.rate > 0 else math.inf
+
+    def refund(self, key: Hashable):
+        """Gives back a token taken for a request that was refused for another reason."""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(self.burst, bucket[0] + 1.0)
@@ -0,0 +1,92 @@
+# Filename: app/core/spatial.py
+import heapq
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_000.0
+
+
+def unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """Maps degrees to points on the unit sphere, where chord length orders like great-circle distance."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_meters(chord_sq: np.ndarray) -> np.ndarray:
+    """Converts squared chord lengths on the unit sphere to haversine distances in meters."""
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(chord_sq) / 2))
+
+
+class SphereKDTree:
+    """
+    Static KD-tree over points on the unit sphere, answering k-nearest queries by
+    great-circle distance. Built once from NumPy arrays; leaves are scanned vectorized.
+    """
+
+    def __init__(self, ids, latitudes, longitudes, leaf_size: int = 16):
+        ids = np.asarray(ids, dtype=np.int64)
+        points = unit_vectors(latitudes, longitudes).reshape(-1, 3)
+        order = np.arange(len(ids))
+        # Node arrays: children (-1 for leaves), index range into `order` and bounding box
+        self._left, self._right, self._start, self._end, self._mins, self._maxs = [], [], [], [], [], []
+        if len(ids):
+            stack = [(self._new_node(), 0, len(ids))]
+            while stack:
+                node, start, end = stack.pop()
+                box = points[order[start:end]]
+                self._start[node], self._end[node] = start, end
+                self._mins[node], self._maxs[node] = box.min(axis=0), box.max(axis=0)
+                if end - start <= leaf_size:
+                    continue
+                dim = int(np.argmax(self._maxs[node] - self._mins[node]))
+                mid = (start + end) // 2
+                part = np.argpartition(box[:, dim], mid - start)
+                order[start:end] = order[start:end][part]
+                left, right = self._new_node(), self._new_node()
+                self._left[node], self._right[node] = left, right
+                stack.append((left, start, mid))
+                stack.append((right, mid, end))
+        self.ids = ids[order]
+        self.points = points[order]
+        self._mins = np.array(self._mins).reshape(-1, 3)
+        self._maxs = np.array(self._maxs).reshape(-1, 3)
+
+    def _new_node(self) -> int:
+        self._left.append(-1)
+        self._right.append(-1)
+        self._start.append(0)
+        self._end.append(0)
+        self._mins.append(None)
+        self._maxs.append(None)
+        return len(self._left) - 1
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(self, latitude: float, longitude: float, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the ids and distances in meters of the k nearest points, nearest first."""
+        if not len(self.ids) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        target = unit_vectors([latitude], [longitude])[0]
+        best_d = np.empty(0)
+        best_i = np.empty(0, dtype=np.int64)
+        heap = [(0.0, 0)]
+        while heap:
+            bound, node = heapq.heappop(heap)
+            if len(best_d) == k and bound > best_d[-1]:
+                break
+            left = self._left[node]
+            if left < 0:
+                start, end = self._start[node], self._end[node]
+                diff = self.points[start:end] - target
+                d = np.einsum("ij,ij->i", diff, diff)
+                best_d = np.concatenate((best_d, d))
+                best_i = np.concatenate((best_i, np.arange(start, end)))
+                keep = np.argsort(best_d, kind="stable")[:k]
+                best_d, best_i = best_d[keep], best_i[keep]
+                continue
+            for child in (left, self._right[node]):
+                gap = np.maximum(0.0, np.maximum(self._mins[child] - target, target - self._maxs[child]))
+                heapq.heappush(heap, (float(gap @ gap), child))
+        return self.ids[best_i], chord_to_meters(best_d)
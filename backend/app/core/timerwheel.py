@@ -0,0 +1,38 @@
+# Filename: app/core/timerwheel.py
+import math
+from typing import Hashable, List
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel of opaque handles.
+    Scheduling and expiring cost O(1) per timer regardless of how many are pending.
+    Deadlines further out than one revolution land in a bucket that fires early, so
+    callers must check the real deadline of every handle returned by `advance` and
+    reschedule the ones that are not due yet.
+    """
+
+    def __init__(self, buckets: int, resolution: float, now: float):
+        self.resolution = resolution
+        self._buckets: List[List[Hashable]] = [[] for _ in range(buckets)]
+        self._tick = math.floor(now / resolution)
+        self.pending = 0
+
+    def schedule(self, handle: Hashable, deadline: float):
+        tick = max(math.ceil(deadline / self.resolution), self._tick + 1)
+        self._buckets[tick % len(self._buckets)].append(handle)
+        self.pending += 1
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Moves the wheel to `now` and returns the handles of every bucket passed."""
+        target = math.floor(now / self.resolution)
+        steps = min(target - self._tick, len(self._buckets))
+        fired = []
+        for tick in range(target - steps + 1, target + 1):
+            index = tick % len(self._buckets)
+            if self._buckets[index]:
+                fired.extend(self._buckets[index])
+                self._buckets[index] = []
+        self._tick = max(self._tick, target)
+        self.pending -= len(fired)
+        return fired
@@ -0,0 +1,70 @@
+# Filename: app/core/trackcodec.py
+from typing import Iterable, List, Tuple
+
+# Coordinates are stored as integer micro-degrees (~11 cm) and timestamps as epoch milliseconds
+COORDINATE_SCALE = 1_000_000
+
+TrackPoint = Tuple[int, int, int]  # (timestamp_ms, lat_e6, lon_e6)
+
+
+def to_track_point(timestamp_ms: int, latitude: float, longitude: float) -> TrackPoint:
+    return timestamp_ms, round(latitude * COORDINATE_SCALE), round(longitude * COORDINATE_SCALE)
+
+
+def _write_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_track(points: Iterable[TrackPoint]) -> bytes:
+    """
+    Encodes time-ordered points as zigzag varints of the deltas between consecutive
+    points. Consecutive fixes of a moving tourist differ by a few seconds and a few
+    hundred micro-degrees, so most points take 5-7 bytes instead of 20.
+    """
+    out = bytearray()
+    prev_ts = prev_lat = prev_lon = 0
+    for ts, lat, lon in points:
+        for delta in (ts - prev_ts, lat - prev_lat, lon - prev_lon):
+            _write_varint(out, (delta << 1) ^ (delta >> 63))
+        prev_ts, prev_lat, prev_lon = ts, lat, lon
+    return bytes(out)
+
+
+def decode_track(data: bytes) -> List[TrackPoint]:
+    """Decodes a payload produced by encode_track."""
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append((value >> 1) ^ -(value & 1))
+        value = shift = 0
+    if shift or len(values) % 3:
+        raise ValueError("Truncated track payload")
+
+    points = []
+    ts = lat = lon = 0
+    for i in range(0, len(values), 3):
+        ts += values[i]
+        lat += values[i + 1]
+        lon += values[i + 2]
+        points.append((ts, lat, lon))
+    return points
+
+
+def downsample_track(points: List[TrackPoint], interval_ms: int) -> List[TrackPoint]:
+    """Keeps the last point of every `interval_ms` bucket of time-ordered points."""
+    if interval_ms <= 0:
+        return list(points)
+    kept = []
+    for point in points:
+        if kept and kept[-1][0] // interval_ms == point[0] // interval_ms:
+            kept[-1] = point
+        else:
+            kept.append(point)
+    return kept
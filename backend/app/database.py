@@ -1,12 +1,68 @@
 # Filename: app/database.py
+import math
+import time
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy import create_engine
 from app.core.config import settings
+from app.core import metrics
+
+
+class PoolStats:
+    """Counters describing how long requests wait for a pooled connection."""
+
+    def __init__(self, decay_seconds: float = 5.0):
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.decay_seconds = decay_seconds
+        self._recent_wait = 0.0
+        self._recent_at = time.monotonic()
+
+    def recent_wait(self, now: float | None = None) -> float:
+        """Moving average of recent checkout waits; decays towards zero while nothing checks out."""
+        now = time.monotonic() if now is None else now
+        return self._recent_wait * math.exp(-(now - self._recent_at) / self.decay_seconds)
+
+    def record_wait(self, seconds: float):
+        now = time.monotonic()
+        self._recent_wait = 0.8 * self.recent_wait(now) + 0.2 * seconds
+        self._recent_at = now
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        if seconds > self.wait_seconds_max:
+            self.wait_seconds_max = seconds
+        metrics.db_pool_wait.observe(seconds)
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records the time spent waiting for each checkout."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_stats.record_wait(time.perf_counter() - start)
+
 
 # For async operations (FastAPI and Async SQLAlchemy)
-async_engine = create_async_engine(settings.DATABASE_URL, echo=True)
+async_engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DB_ECHO,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
 AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+metrics.instrument_engine(async_engine.sync_engine)
 
 Base = declarative_base()
 
@@ -14,6 +70,22 @@ Base = declarative_base()
 sync_engine = create_engine(settings.DATABASE_URL.replace("+asyncpg", ""))
 SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
 
+
+def get_pool_status() -> dict:
+    """Returns a snapshot of the async connection pool and its wait statistics."""
+    pool = async_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": pool_stats.checkouts,
+        "wait_seconds_total": pool_stats.wait_seconds_total,
+        "wait_seconds_max": pool_stats.wait_seconds_max,
+        "wait_seconds_recent": pool_stats.recent_wait(),
+    }
+
+
 async def get_db():
     """
     Dependency to get an async database session.
@@ -1,12 +1,25 @@
 # Filename: app/main.py
-from fastapi import FastAPI, Depends, Request
+import time
+from fastapi import FastAPI, Depends, Request, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.core.config import settings
-from app.routers import auth, tourist, alert
-from app.services.log import create_access_log
-from app.services.auth import get_current_user
-from app.database import get_db
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.user import User
+from app.core import metrics
+from app.core.context import get_request_context
+from app.routers import auth, tourist, alert, log, geofence, responder, heatmap
+from app.services.log import create_access_log, access_log_sink, failed_login_sink
+from app.services.login_throttle import login_throttle, client_ip
+from app.services.admission import admission
+from app.services.events import event_broker
+from app.services.location_history import location_history
+from app.services.anomaly import anomaly_detector
+from app.services.responder import responder_registry
+from app.services.heatmap import heatmap as heatmap_aggregator
+from app.services.safety_score import safety_scores
+from app.services.revocation import revoked_tokens
+from app.services.tourist import profile_cache
+from app.services.auth import password_pool, principal_cache, token_identity, user_invalidations
+from app.database import AsyncSessionLocal, async_engine, get_pool_status
+from app.schemas.user import Principal
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -17,44 +30,115 @@ app = FastAPI(
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(tourist.router, prefix="/api/v1")
 app.include_router(alert.router, prefix="/api/v1")
+app.include_router(log.router, prefix="/api/v1")
+app.include_router(geofence.router, prefix="/api/v1")
+app.include_router(responder.router, prefix="/api/v1")
+app.include_router(heatmap.router, prefix="/api/v1")
+
+loop_lag_monitor = metrics.LoopLagMonitor(settings.METRICS_LOOP_LAG_INTERVAL_SECONDS)
+for _name, _stats in (("db_pool", get_pool_status), ("password_pool", password_pool.stats),
+                      ("principal_cache", principal_cache.stats), ("access_log_sink", access_log_sink.stats),
+                      ("failed_login_sink", failed_login_sink.stats), ("login_throttle", login_throttle.stats),
+                      ("location_history", location_history.stats), ("anomaly_detector", anomaly_detector.stats),
+                      ("responder_registry", responder_registry.stats), ("heatmap", heatmap_aggregator.stats),
+                      ("safety_scores", safety_scores.stats), ("revoked_tokens", revoked_tokens.stats),
+                      ("admission", admission.stats), ("profile_cache", profile_cache.stats),
+                      ("user_invalidations", user_invalidations.stats)):
+    metrics.registry.register_component(_name, _stats)
+
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """
+    Rate-limits, queues and sheds requests before they reach the routers.
+    SOS and acknowledge calls always pass. Anonymous callers are keyed by client IP, which
+    honours LOGIN_TRUST_FORWARDED_FOR. Registered before log_access so that refused requests
+    are still logged and counted.
+    """
+    if not settings.ADMISSION_ENABLED:
+        return await call_next(request)
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+    identity = token_identity(token) if token else None
+    if identity is None:
+        identity = (client_ip(request), "unauthenticated")
+    try:
+        priority = await admission.admit(request.method, request.url.path, identity[1], identity[0])
+    except HTTPException as exc:
+        return JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+    try:
+        return await call_next(request)
+    finally:
+        admission.release(priority)
 
 
 @app.middleware("http")
 async def log_access(request: Request, call_next):
     """
-    Middleware to log every API access.
+    Middleware to log every API access, once, and record its latency and database usage.
+    The user is taken from the request context, as resolved by the request's own dependencies;
+    requests that never authenticated are logged as unauthenticated.
     """
-    user_id = None
-    role = "unauthenticated"
-    is_successful = True
+    context = get_request_context(request)
+    status_code = 500
+    db_usage = metrics.begin_request()
+    start = time.perf_counter()
 
     try:
         response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        # Label by route template so that path parameters do not create a series per id
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.http_requests.inc(request.method, route, status_code)
+        metrics.http_request_duration.observe(time.perf_counter() - start, request.method, route)
+        metrics.http_request_db_queries.observe(db_usage[0], request.method, route)
+        metrics.http_request_db_seconds.observe(db_usage[1], request.method, route)
+        principal: Principal | None = context.principal
+        # The session only connects if the log sink is not running and the row is written inline
+        async with AsyncSessionLocal() as db:
+            await create_access_log(db, principal.id if principal else None, request.url.path, request.method,
+                                    status_code < 400, principal.role if principal else "unauthenticated")
+    return response
 
-        # Log successful requests with user info
-        db: AsyncSession = request.app.state.db
-        user: User | None = await get_current_user(request.headers.get("Authorization", "").replace("Bearer ", ""), db)
-        if user:
-            user_id = user.id
-            role = user.role
 
-        await create_access_log(db, user_id, request.url.path, request.method, is_successful, role)
-        return response
-    except Exception as e:
-        is_successful = False
-        await create_access_log(db, user_id, request.url.path, request.method, is_successful, role)
-        raise e
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request, database and background component metrics in the Prometheus text format."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Initializes database and other resources on startup."""
-    # This is a good place to set up the DB session for middleware
-    from app.database import AsyncSessionLocal
-    app.state.db = AsyncSessionLocal()
+    """Starts background workers on startup."""
+    loop_lag_monitor.start()
+    access_log_sink.start()
+    failed_login_sink.start()
+    location_history.start()
+    anomaly_detector.start()
+    responder_registry.start()
+    await event_broker.start()
+    await revoked_tokens.start()
+    await user_invalidations.start()
+    await profile_cache.start()
+    await heatmap_aggregator.start()
+    await safety_scores.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Closes database connection on shutdown."""
-    await app.state.db.close()
+    """Flushes buffered history and logs and closes pooled database connections on shutdown."""
+    await responder_registry.stop()
+    await anomaly_detector.stop()
+    await safety_scores.stop()
+    await heatmap_aggregator.stop()
+    await profile_cache.stop()
+    await user_invalidations.stop()
+    await revoked_tokens.stop()
+    await event_broker.stop()
+    await location_history.stop()
+    await failed_login_sink.stop()
+    await access_log_sink.stop()
+    await loop_lag_monitor.stop()
+    await async_engine.dispose()
@@ -1,6 +1,6 @@
 # Filename: app/models/alert.py
 import enum
-from sqlalchemy import Column, String, DateTime, Enum, Integer, ForeignKey
+from sqlalchemy import Column, String, DateTime, Enum, Integer, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
 from app.models.base import BaseMixin, Base
@@ -22,6 +22,18 @@ class EmergencyAlert(BaseMixin, Base):
     status = Column(Enum(AlertStatus), default=AlertStatus.ACTIVE, nullable=False)
     message = Column(String, nullable=True)
     acknowledged_by = Column(Integer, ForeignKey('users.id'), nullable=True)
+    # Client-supplied key that makes SOS retries return the original alert
+    idempotency_key = Column(String(128), nullable=True)
+
+    # Support keyset pagination in (timestamp, id) order, optionally per status. Active alerts
+    # are a small, hot subset, so they get their own partial index.
+    __table_args__ = (
+        Index("ix_emergencyalerts_timestamp_id", "timestamp", "id"),
+        Index("ix_emergencyalerts_status_timestamp_id", "status", "timestamp", "id"),
+        Index("ix_emergencyalerts_active_timestamp_id", "timestamp", "id",
+              postgresql_where=status == AlertStatus.ACTIVE),
+        UniqueConstraint("tourist_id", "idempotency_key", name="uq_emergencyalerts_tourist_idempotency_key"),
+    )
 
     tourist = relationship("Tourist", backref="alerts")
     acknowledged_by_user = relationship("User", back_populates="acknowledged_alerts", foreign_keys=[acknowledged_by])
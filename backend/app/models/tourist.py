@@ -1,5 +1,8 @@
 # Filename: app/models/tourist.py
-from sqlalchemy import Column, String, ForeignKey, Integer
+import enum
+from sqlalchemy import Column, String, ForeignKey, Integer, BigInteger, Float, Boolean, DateTime, Index, Sequence, \
+    Enum, LargeBinary, false
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
 from app.models.base import BaseMixin, Base
@@ -15,14 +18,71 @@ class Tourist(BaseMixin, Base):
     contact_number = Column(String, nullable=False)
     # PostGIS geometry column for location tracking
     last_location = Column(Geometry(geometry_type='POINT', srid=4326), nullable=True)
+    # When the last location was received; shared by all workers, unlike their in-memory stream state
+    last_location_at = Column(DateTime(timezone=True), nullable=True)
+    # Geo-fence membership maintained by app.services.fence_membership; written with each fix
+    fence_membership = Column(JSONB, nullable=True)
+    # 0 (high risk) to 100 (safe), maintained by app.services.safety_score
+    safety_score = Column(Float, nullable=True)
+    safety_score_updated_at = Column(DateTime(timezone=True), nullable=True)
+    # 0-1 movement risk at the last fix, from the anomaly detector of the worker that handled it
+    trajectory_risk = Column(Float, nullable=True)
 
     user = relationship("User", backref="tourist", uselist=False)
 
+class LocationSegment(BaseMixin, Base):
+    """
+    Database model for a tourist's location history.
+    Each row is an append-only segment of consecutive fixes, delta-encoded into `payload`
+    (see app.core.trackcodec), so the table grows by batches rather than by pings.
+    """
+    __table_args__ = (
+        Index("ix_locationsegments_tourist_start", "tourist_id", "start_time"),
+        Index("ix_locationsegments_resolution_end", "resolution_seconds", "end_time"),
+    )
+
+    tourist_id = Column(Integer, ForeignKey('tourists.id', ondelete="CASCADE"), nullable=False)
+    start_time = Column(DateTime(timezone=True), nullable=False)
+    end_time = Column(DateTime(timezone=True), nullable=False)
+    point_count = Column(Integer, nullable=False)
+    # 0 for raw fixes, otherwise the bucket width the segment was downsampled to
+    resolution_seconds = Column(Integer, default=0, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+
+
+class ZoneType(str, enum.Enum):
+    """Defines which geo-fence transition raises an alert."""
+    SAFE = "safe"  # alert when a tourist leaves the zone
+    RESTRICTED = "restricted"  # alert when a tourist enters the zone
+
+
+geofence_revision_seq = Sequence("geofences_revision_seq")
+
+
 class GeoFence(BaseMixin, Base):
     """
     Database model for defining safe zones and geo-fences.
     """
-    name = Column(String, unique=True, index=True, nullable=False)
+    # Names only need to be unique among fences that have not been deleted
+    __table_args__ = (
+        Index("uq_geofences_name_live", "name", unique=True, postgresql_where=Column("is_deleted") == false()),
+    )
+
+    name = Column(String, index=True, nullable=False)
     description = Column(String, nullable=True)
     # PostGIS geometry column for the geo-fence polygon
     area = Column(Geometry(geometry_type='POLYGON', srid=4326), nullable=False)
+    zone_type = Column(Enum(ZoneType), default=ZoneType.SAFE, nullable=False)
+    # 0-1 weight of this area in the safety score of tourists inside it
+    sensitivity = Column(Float, default=0.0, nullable=False)
+    # Precomputed bounding box of the (simplified) polygon
+    min_lon = Column(Float, nullable=False)
+    min_lat = Column(Float, nullable=False)
+    max_lon = Column(Float, nullable=False)
+    max_lat = Column(Float, nullable=False)
+    # Drawn from a global sequence on every insert/update; workers reload fences with a newer revision
+    revision = Column(BigInteger, geofence_revision_seq, onupdate=geofence_revision_seq.next_value(),
+                      nullable=False, index=True)
+    # Deleted fences are kept as tombstones so workers can observe the deletion incrementally
+    is_deleted = Column(Boolean, default=False, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
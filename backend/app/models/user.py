@@ -1,6 +1,7 @@
 # Filename: app/models/user.py
 import enum
-from sqlalchemy import Column, String, Enum, Boolean, DateTime
+from sqlalchemy import Column, String, Enum, Boolean, DateTime, Integer, Float, ForeignKey
+from geoalchemy2 import Geometry
 from app.models.base import BaseMixin, Base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -28,3 +29,28 @@ class User(BaseMixin, Base):
     # Relationship to EmergencyAlert
     acknowledged_alerts = relationship("EmergencyAlert", back_populates="acknowledged_by_user",
                                        foreign_keys="EmergencyAlert.acknowledged_by")
+
+
+class ResponderLocation(BaseMixin, Base):
+    """
+    Database model for the last reported position of a police responder.
+    """
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), unique=True, nullable=False)
+    location = Column(Geometry(geometry_type='POINT', srid=4326), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    is_available = Column(Boolean, default=True, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    user = relationship("User")
+
+
+class RevokedToken(BaseMixin, Base):
+    """
+    Database model for a revoked (or already rotated) token, kept until the token expires.
+    """
+    jti = Column(String(32), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
+    token_type = Column(String(10), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
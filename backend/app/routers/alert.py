@@ -1,27 +1,52 @@
 # Filename: app/routers/alert.py
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, \
+    status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.alert import EmergencyAlertCreate, EmergencyAlertResponse, EmergencyAlertAcknowledge, \
-    EmergencyAlertClose
+    EmergencyAlertClose, SOSAlertResponse
 from app.services import alert as alert_service
-from app.services.auth import get_current_active_user, get_current_active_police_or_admin
-from app.services.log import create_access_log
-from app.database import get_db
-from app.models.user import User
+from app.services.tourist import get_context_tourist
+from app.services import events
+from app.services.auth import get_current_active_user, get_current_active_police_or_admin, resolve_principal
+from app.core.config import settings
+from app.core.context import RequestContext, get_request_context
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, bbox_params
+from app.database import get_db, AsyncSessionLocal
+from app.models.user import UserRole
+from app.models.alert import AlertStatus
+from app.schemas.user import Principal
 from typing import List
 
 router = APIRouter(prefix="/alerts", tags=["Emergency Alerts"])
 
 
-@router.post("/sos", response_model=EmergencyAlertResponse)
+def _alert_cursor(cursor: str | None) -> tuple | None:
+    return decode_cursor(cursor, datetime.fromisoformat, int) if cursor else None
+
+
+def _set_next_cursor(response: Response, alerts: list, limit: int):
+    if len(alerts) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(alerts[-1]["timestamp"], alerts[-1]["id"])
+
+
+@router.post("/sos", response_model=SOSAlertResponse)
 async def create_sos_alert(
         alert_in: EmergencyAlertCreate,
-        current_user: User = Depends(get_current_active_user),
+        idempotency_key: str | None = Header(None, max_length=128),
+        current_user: Principal = Depends(get_current_active_user),
+        context: RequestContext = Depends(get_request_context),
         db: AsyncSession = Depends(get_db)
 ):
     """
     Allows a tourist to raise an emergency SOS alert.
-    The user must have a tourist profile.
+    The user must have a tourist profile. The alert is shared with the nearest available
+    police responders, which are returned in `responders`.
+    Send a unique `Idempotency-Key` header per SOS so that retries over a flaky connection
+    return the original alert instead of raising a new one.
     **Example Request:**
     ```json
     {
@@ -42,27 +67,43 @@ async def create_sos_alert(
       "timestamp": "2023-10-27T10:00:00.123Z",
       "status": "active",
       "message": "I need help near the city center!",
-      "acknowledged_by": null
+      "acknowledged_by": null,
+      "responders": [
+        {
+          "user_id": 7,
+          "latitude": 34.0507,
+          "longitude": -118.2468,
+          "updated_at": "2023-10-27T09:59:41Z",
+          "distance_m": 334.2
+        }
+      ]
     }
     ```
     """
-    tourist_profile = await alert_service.get_tourist_by_user_id(db, current_user.id)
+    tourist_profile = await get_context_tourist(db, context)
     if not tourist_profile:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Tourist profile not found. Cannot raise an alert.")
 
-    new_alert = await alert_service.create_sos_alert(db, tourist_profile.id, alert_in)
-    await create_access_log(db, current_user.id, "/alerts/sos", "POST", True, current_user.role)
+    new_alert, created = await alert_service.create_sos_alert(db, tourist_profile.id, alert_in, idempotency_key)
+    if created:
+        await events.publish_alert_event(events.ALERT_CREATED, new_alert)
     return new_alert
 
 
 @router.get("/active", response_model=List[EmergencyAlertResponse])
 async def get_active_alerts(
-        current_user: User = Depends(get_current_active_police_or_admin),
+        response: Response,
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: str | None = None,
+        bbox: tuple | None = Depends(bbox_params),
+        current_user: Principal = Depends(get_current_active_police_or_admin),
         db: AsyncSession = Depends(get_db)
 ):
     """
-    Fetches all currently active emergency alerts.
+    Fetches one page of currently active emergency alerts, newest first,
+    optionally limited to a `min_lon`/`min_lat`/`max_lon`/`max_lat` bounding box.
+    When more results exist, the `X-Next-Cursor` response header holds the `cursor` for the next page.
     Requires 'police' or 'admin' role.
     **Example Response:**
     ```json
@@ -79,19 +120,20 @@ async def get_active_alerts(
     ]
     ```
     """
-    alerts = await alert_service.get_all_active_alerts(db)
-    await create_access_log(db, current_user.id, "/alerts/active", "GET", True, current_user.role)
+    alerts = await alert_service.get_all_active_alerts(db, limit=limit, cursor=_alert_cursor(cursor), bbox=bbox)
+    _set_next_cursor(response, alerts, limit)
     return alerts
 
 
 @router.put("/{alert_id}/acknowledge", response_model=EmergencyAlertResponse)
 async def acknowledge_alert(
         alert_id: int,
-        current_user: User = Depends(get_current_active_police_or_admin),
+        current_user: Principal = Depends(get_current_active_police_or_admin),
         db: AsyncSession = Depends(get_db)
 ):
     """
     Allows a police officer or admin to acknowledge an active alert.
+    Returns 409 if the alert is no longer active, e.g. another officer acknowledged it first.
     Requires 'police' or 'admin' role.
     **Example Response:**
     ```json
@@ -107,18 +149,19 @@ async def acknowledge_alert(
     ```
     """
     acknowledged_alert = await alert_service.acknowledge_alert(db, alert_id, current_user.id)
-    await create_access_log(db, current_user.id, f"/alerts/{alert_id}/acknowledge", "PUT", True, current_user.role)
+    await events.publish_alert_event(events.ALERT_ACKNOWLEDGED, acknowledged_alert)
     return acknowledged_alert
 
 
 @router.put("/{alert_id}/close", response_model=EmergencyAlertResponse)
 async def close_alert(
         alert_id: int,
-        current_user: User = Depends(get_current_active_police_or_admin),
+        current_user: Principal = Depends(get_current_active_police_or_admin),
         db: AsyncSession = Depends(get_db)
 ):
     """
     Allows a police officer or admin to close an acknowledged alert.
+    Returns 409 if the alert has not been acknowledged or is already closed.
     Requires 'police' or 'admin' role.
     **Example Response:**
     ```json
@@ -134,17 +177,27 @@ async def close_alert(
     ```
     """
     closed_alert = await alert_service.close_alert(db, alert_id)
-    await create_access_log(db, current_user.id, f"/alerts/{alert_id}/close", "PUT", True, current_user.role)
+    await events.publish_alert_event(events.ALERT_CLOSED, closed_alert)
     return closed_alert
 
 
 @router.get("/history", response_model=List[EmergencyAlertResponse])
 async def get_alert_history(
-        current_user: User = Depends(get_current_active_police_or_admin),
+        response: Response,
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: str | None = None,
+        alert_status: AlertStatus | None = Query(None, alias="status"),
+        since: datetime | None = None,
+        until: datetime | None = None,
+        bbox: tuple | None = Depends(bbox_params),
+        current_user: Principal = Depends(get_current_active_police_or_admin),
         db: AsyncSession = Depends(get_db)
 ):
     """
-    Fetches the history of all emergency alerts.
+    Fetches one page of the emergency alert history, newest first.
+    Filters: `status`, `since`/`until` on the alert timestamp, and a
+    `min_lon`/`min_lat`/`max_lon`/`max_lat` bounding box.
+    When more results exist, the `X-Next-Cursor` response header holds the `cursor` for the next page.
     Requires 'police' or 'admin' role.
     **Example Response:**
     ```json
@@ -170,6 +223,96 @@ async def get_alert_history(
     ]
     ```
     """
-    alerts = await alert_service.get_alert_history(db)
-    await create_access_log(db, current_user.id, "/alerts/history", "GET", True, current_user.role)
+    alerts = await alert_service.get_alert_history(db, limit=limit, cursor=_alert_cursor(cursor),
+                                                   status=alert_status, since=since, until=until, bbox=bbox)
+    _set_next_cursor(response, alerts, limit)
     return alerts
+
+
+@router.get("/stream")
+async def stream_alert_events(
+        request: Request,
+        min_lon: float | None = None,
+        min_lat: float | None = None,
+        max_lon: float | None = None,
+        max_lat: float | None = None,
+        current_user: Principal = Depends(get_current_active_police_or_admin)
+):
+    """
+    Streams alert events as Server-Sent Events for the police dashboard.
+    Pass all four bounding-box parameters to only receive events inside a region.
+    Requires 'police' or 'admin' role.
+    **Example Event:**
+    ```
+    event: alert.created
+    data: {"type": "alert.created", "alert_id": 1, "tourist_id": 1, "status": "active", "longitude": -118.2437, "latitude": 34.0522, ...}
+    ```
+    """
+    subscription = await events.event_broker.subscribe(
+        events.ALERTS_CHANNEL, events.bbox_filter(min_lon, min_lat, max_lon, max_lat)
+    )
+
+    async def event_source():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(subscription.get(), timeout=settings.EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(event_source(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/ws")
+async def alert_events_websocket(
+        websocket: WebSocket,
+        token: str,
+        min_lon: float | None = None,
+        min_lat: float | None = None,
+        max_lon: float | None = None,
+        max_lat: float | None = None
+):
+    """
+    Pushes alert events to the police dashboard over a WebSocket.
+    Browsers cannot set headers on WebSocket requests, so the access token is passed as `?token=`.
+    Pass all four bounding-box parameters to only receive events inside a region.
+    Requires 'police' or 'admin' role.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            principal = await resolve_principal(token, db)
+        except HTTPException:
+            principal = None
+    if principal is None or not principal.is_active or principal.role not in [UserRole.POLICE, UserRole.ADMIN]:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = await events.event_broker.subscribe(
+        events.ALERTS_CHANNEL, events.bbox_filter(min_lon, min_lat, max_lon, max_lat)
+    )
+
+    async def forward_events():
+        while True:
+            await websocket.send_json(await subscription.get())
+
+    async def wait_for_disconnect():
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(forward_events()), asyncio.create_task(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        subscription.close()
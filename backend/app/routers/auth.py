@@ -1,14 +1,16 @@
 # Filename: app/routers/auth.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import timedelta
-from app.schemas.user import UserCreate, UserLogin, UserInDB
-from app.schemas.token import Token
+from app.schemas.user import UserCreate, UserLogin, UserInDB, Principal
+from app.schemas.token import Token, RefreshRequest, LogoutRequest
 from app.services.user import create_user, get_user_by_username
-from app.services.auth import verify_password, create_access_token, get_current_active_user
+from app.services.auth import verify_and_update_password, get_current_active_user, issue_tokens, \
+    refresh_tokens, logout, oauth2_scheme
 from app.core.config import settings
+from app.core.context import get_request_context
 from app.database import get_db
-from app.services.log import create_access_log, create_failed_login_log
+from app.services.log import create_failed_login_log
+from app.services.login_throttle import login_throttle, client_ip
 from app.models.user import User
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -43,14 +45,16 @@ async def register_user(user_in: UserCreate, db: AsyncSession = Depends(get_db))
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already registered")
 
     new_user = await create_user(db=db, user_in=user_in)
-    await create_access_log(db, None, "/auth/register", "POST", True, new_user.role)
     return new_user
 
 
 @router.post("/login", response_model=Token)
-async def login_for_access_token(user_in: UserLogin, db: AsyncSession = Depends(get_db)):
+async def login_for_access_token(user_in: UserLogin, request: Request, db: AsyncSession = Depends(get_db)):
     """
-    Logs in a user and returns a JWT access token.
+    Logs in a user and returns a short-lived JWT access token and a refresh token.
+    Use `/auth/refresh` to get a new pair before the access token expires.
+    After repeated failures for the same username or from the same IP, attempts are refused
+    with 429 and a `Retry-After` header until the failures age out.
     **Example Request:**
     ```json
     {
@@ -62,33 +66,77 @@ async def login_for_access_token(user_in: UserLogin, db: AsyncSession = Depends(
     ```json
     {
       "access_token": "eyJhbGciOiJIUzI1Ni...",
+      "refresh_token": "eyJhbGciOiJIUzI1Ni...",
       "token_type": "bearer",
       "issued_at": "2023-10-27T10:00:00.123Z",
-      "expires_at": "2023-10-27T10:30:00.123Z"
+      "expires_at": "2023-10-27T10:30:00.123Z",
+      "refresh_expires_at": "2023-10-28T10:00:00.123Z"
     }
     ```
     """
+    ip_address = client_ip(request)
+    try:
+        login_throttle.check(user_in.username, ip_address)
+    except HTTPException:
+        await create_failed_login_log(db, user_in.username, ip_address)
+        raise
+
     db_user = await get_user_by_username(db, username=user_in.username)
-    if not db_user or not verify_password(user_in.password, db_user.hashed_password):
-        await create_failed_login_log(db, user_in.username, None)
-        await create_access_log(db, None, "/auth/login", "POST", False, "unauthenticated")
+    verified, new_hash = False, None
+    if db_user:
+        verified, new_hash = await verify_and_update_password(user_in.password, db_user.hashed_password)
+    if not verified:
+        login_throttle.record_failure(user_in.username, ip_address)
+        await create_failed_login_log(db, user_in.username, ip_address)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": db_user.username, "role": db_user.role},
-        expires_delta=access_token_expires
-    )
+    if new_hash and settings.PASSWORD_REHASH_ON_LOGIN:
+        # Transparently upgrade the stored hash to the configured bcrypt cost
+        db_user.hashed_password = new_hash
+        await db.commit()
+
+    login_throttle.record_success(user_in.username)
+    # Attribute the access log row of this request to the user who just logged in
+    get_request_context(request).principal = Principal(
+        id=db_user.id, username=db_user.username, role=db_user.role, is_active=bool(db_user.is_active))
+    return issue_tokens(db_user.username, db_user.role)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(refresh_in: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Exchanges a refresh token for a new access and refresh token pair, without a password check.
+    The presented refresh token is revoked, so each one can only be used once.
+    **Example Request:**
+    ```json
+    {
+      "refresh_token": "eyJhbGciOiJIUzI1Ni..."
+    }
+    ```
+    **Example Response:** same as `/auth/login`.
+    """
+    return await refresh_tokens(db, refresh_in.refresh_token)
 
-    await create_access_log(db, db_user.id, "/auth/login", "POST", True, db_user.role)
 
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "issued_at": db_user.created_at,
-        "expires_at": db_user.created_at + access_token_expires
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_user(
+        logout_in: LogoutRequest | None = None,
+        token: str = Depends(oauth2_scheme),
+        current_user: Principal = Depends(get_current_active_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Revokes the access token used for this request and, if given, the refresh token,
+    on every worker. Both are rejected from then on even though they have not expired.
+    **Example Request:**
+    ```json
+    {
+      "refresh_token": "eyJhbGciOiJIUzI1Ni..."
     }
+    ```
+    """
+    await logout(db, current_user, token, logout_in.refresh_token if logout_in else None)
@@ -0,0 +1,152 @@
+# Filename: app/routers/geofence.py
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.tourist import GeoFenceCreate, GeoFenceUpdate, GeoFenceResponse, GeoFenceFeatureCollection, \
+    GeoFenceImportResult, GeoFenceVersion
+from app.services import geofence as geofence_service
+from app.services.auth import get_current_active_admin, get_current_active_police_or_admin
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, bbox_params
+from app.database import get_db
+from app.schemas.user import Principal
+
+router = APIRouter(prefix="/geofences", tags=["Geo-Fences"])
+
+
+@router.get("/", response_model=list[GeoFenceResponse])
+async def read_geofences(
+        response: Response,
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: str | None = None,
+        bbox: tuple | None = Depends(bbox_params),
+        current_user: Principal = Depends(get_current_active_police_or_admin),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Retrieves one page of geo-fences in ascending ID order, optionally only those whose
+    bounding box overlaps `min_lon`/`min_lat`/`max_lon`/`max_lat`.
+    When more results exist, the `X-Next-Cursor` response header holds the `cursor` for the next page.
+    Requires 'police' or 'admin' role.
+    """
+    after_id = decode_cursor(cursor, int)[0] if cursor else None
+    fences = await geofence_service.list_geofences(db, limit=limit, after_id=after_id, bbox=bbox)
+    if len(fences) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(fences[-1]["id"])
+    return fences
+
+
+@router.get("/version", response_model=GeoFenceVersion)
+async def read_geofence_version(
+        current_user: Principal = Depends(get_current_active_police_or_admin),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Returns the current geo-fence revision. It increases whenever any fence is created,
+    updated or deleted, so clients can cheaply detect that their fence set is out of date.
+    Requires 'police' or 'admin' role.
+    **Example Response:**
+    ```json
+    { "revision": 42 }
+    ```
+    """
+    return {"revision": await geofence_service.get_geofence_revision(db)}
+
+
+@router.post("/", response_model=GeoFenceResponse)
+async def create_geofence(
+        fence_in: GeoFenceCreate,
+        current_user: Principal = Depends(get_current_active_admin),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Creates a geo-fence. The polygon is validated, simplified and stored with its bounding box.
+    Requires 'admin' role.
+    **Example Request:**
+    ```json
+    {
+      "name": "Old Town Safe Zone",
+      "description": "Patrolled tourist district",
+      "geojson": {
+        "type": "Polygon",
+        "coordinates": [[[-118.25, 34.05], [-118.24, 34.05], [-118.24, 34.06], [-118.25, 34.06], [-118.25, 34.05]]]
+      }
+    }
+    ```
+    **Example Response:**
+    ```json
+    {
+      "id": 1,
+      "name": "Old Town Safe Zone",
+      "description": "Patrolled tourist district",
+      "geojson": { "type": "Polygon", "coordinates": [[[-118.25, 34.05], ...]] },
+      "bbox": [-118.25, 34.05, -118.24, 34.06],
+      "revision": 1
+    }
+    ```
+    """
+    fence = await geofence_service.create_geofence(db, fence_in)
+    return fence
+
+
+@router.post("/import", response_model=GeoFenceImportResult)
+async def import_geofences(
+        collection: GeoFenceFeatureCollection,
+        current_user: Principal = Depends(get_current_active_admin),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Bulk-imports geo-fences from a GeoJSON FeatureCollection in a single transaction.
+    Each feature needs a Polygon geometry and a `name` property; features named like an
+    existing fence replace it. Requires 'admin' role.
+    **Example Response:**
+    ```json
+    { "created": 12, "updated": 3, "revision": 57 }
+    ```
+    """
+    result = await geofence_service.import_geofences(db, collection)
+    return result
+
+
+@router.get("/{fence_id}", response_model=GeoFenceResponse)
+async def read_geofence(
+        fence_id: int,
+        current_user: Principal = Depends(get_current_active_police_or_admin),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Retrieves a single geo-fence by ID.
+    Requires 'police' or 'admin' role.
+    """
+    fence = await geofence_service.get_geofence(db, fence_id)
+    if not fence:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Geo-fence not found.")
+
+    return fence
+
+
+@router.put("/{fence_id}", response_model=GeoFenceResponse)
+async def update_geofence(
+        fence_id: int,
+        fence_in: GeoFenceUpdate,
+        current_user: Principal = Depends(get_current_active_admin),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Updates a geo-fence's name, description and/or polygon.
+    Requires 'admin' role.
+    """
+    fence = await geofence_service.update_geofence(db, fence_id, fence_in)
+    return fence
+
+
+@router.delete("/{fence_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_geofence(
+        fence_id: int,
+        current_user: Principal = Depends(get_current_active_admin),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Deletes a geo-fence.
+    Requires 'admin' role.
+    """
+    await geofence_service.delete_geofence(db, fence_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,53 @@
+# Filename: app/routers/heatmap.py
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from app.core import geohash
+from app.schemas.heatmap import HeatmapTile
+from app.services.heatmap import heatmap
+from app.services.auth import get_current_active_police_or_admin
+from app.schemas.user import Principal
+
+router = APIRouter(prefix="/heatmap", tags=["Heat Map"])
+
+
+@router.get("/", response_model=HeatmapTile, responses={304: {"description": "Tile unchanged"}})
+async def read_heatmap_tile(
+        response: Response,
+        precision: int = Query(..., description="Geohash precision (zoom level) of the returned cells."),
+        tile: str = Query("", max_length=12, description="Geohash prefix of the area to return."),
+        if_none_match: str | None = Header(None),
+        current_user: Principal = Depends(get_current_active_police_or_admin)
+):
+    """
+    Returns tourist and active-alert counts per geohash cell of `precision` within `tile`.
+    Responses carry a versioned `ETag`; send it back in `If-None-Match` to get a 304 when
+    nothing in the tile has changed.
+    Requires 'police' or 'admin' role.
+    **Example Response:**
+    ```json
+    {
+      "precision": 5,
+      "tile": "9q5",
+      "version": 118,
+      "cells": [
+        { "geohash": "9q5ct", "latitude": 34.0510, "longitude": -118.2568, "tourists": 42, "active_alerts": 1 }
+      ]
+    }
+    ```
+    """
+    tile = tile.lower()
+    if precision not in heatmap.precisions:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"precision must be one of {heatmap.precisions}.")
+    if not geohash.is_valid(tile) or not 0 <= precision - len(tile) <= heatmap.max_tile_depth:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"tile must be a geohash at most {heatmap.max_tile_depth} characters shorter "
+                                   f"than precision.")
+
+    etag = heatmap.etag(precision, tile)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match is not None and etag in (value.strip() for value in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    body, etag = heatmap.tile(precision, tile)
+    response.headers.update({"ETag": etag, "Cache-Control": "private, no-cache"})
+    return body
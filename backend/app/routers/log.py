@@ -0,0 +1,74 @@
+# Filename: app/routers/log.py
+from datetime import datetime
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from app.models.log import AccessLog, FailedLoginAttempt
+from app.services import log as log_service
+from app.services.auth import get_current_active_cybersecurity
+from app.schemas.user import Principal
+
+router = APIRouter(prefix="/logs", tags=["Security Logs"])
+
+
+def _export_response(model, name: str, export_format: str, compress: bool,
+                     since: datetime | None, until: datetime | None, after_id: int | None) -> StreamingResponse:
+    rows = log_service.stream_logs(model, since=since, until=until, after_id=after_id)
+    if export_format == "csv":
+        chunks = log_service.iter_csv(rows, [column.key for column in model.__table__.columns])
+        media_type, extension = "text/csv", "csv"
+    else:
+        chunks = log_service.iter_ndjson(rows)
+        media_type, extension = "application/x-ndjson", "ndjson"
+    if compress:
+        chunks = log_service.iter_gzip(chunks)
+        media_type, extension = "application/gzip", f"{extension}.gz"
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'})
+
+
+@router.get("/access/export")
+async def export_access_logs(
+        export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+        gzip: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        after_id: int | None = None,
+        current_user: Principal = Depends(get_current_active_cybersecurity)
+):
+    """
+    Streams API access logs in ascending ID order as CSV or NDJSON, optionally gzip-compressed.
+    Memory use is constant regardless of table size. Use `since`/`until` to bound the time range
+    and `after_id` (the last ID received) to resume an interrupted export.
+    Requires 'cybersecurity' role.
+    **Example Request:**
+    ```
+    GET /api/v1/logs/access/export?format=ndjson&gzip=true&since=2023-10-27T00:00:00Z
+    ```
+    **Example Response (NDJSON, before compression):**
+    ```
+    {"id": 1, "user_id": 1, "endpoint": "/api/v1/alerts/sos", "method": "POST", "timestamp": "2023-10-27 10:00:00.123000+00:00", "is_successful": true, "role": "tourist"}
+    ```
+    """
+    return _export_response(AccessLog, "access_logs", export_format, gzip, since, until, after_id)
+
+
+@router.get("/failed-logins/export")
+async def export_failed_logins(
+        export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+        gzip: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        after_id: int | None = None,
+        current_user: Principal = Depends(get_current_active_cybersecurity)
+):
+    """
+    Streams failed login attempts in ascending ID order as CSV or NDJSON, optionally gzip-compressed.
+    Supports the same `since`/`until`/`after_id` filters as the access log export.
+    Requires 'cybersecurity' role.
+    **Example Response (CSV):**
+    ```
+    id,username,ip_address,timestamp
+    1,john.doe,203.0.113.7,2023-10-27 10:00:00.123000+00:00
+    ```
+    """
+    return _export_response(FailedLoginAttempt, "failed_logins", export_format, gzip, since, until, after_id)
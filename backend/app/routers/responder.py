@@ -0,0 +1,69 @@
+# Filename: app/routers/responder.py
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.responder import ResponderLocationUpdate, ResponderPosition, AssignedResponder
+from app.services import responder as responder_service
+from app.services.auth import get_current_active_police, get_current_active_police_or_admin
+from app.database import get_db
+from app.schemas.user import Principal
+from typing import List
+
+router = APIRouter(prefix="/responders", tags=["Responders"])
+
+
+@router.put("/me/location", response_model=ResponderPosition)
+async def update_responder_location(
+        location_in: ResponderLocationUpdate,
+        current_user: Principal = Depends(get_current_active_police),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Reports the authenticated police officer's position for SOS dispatch.
+    Set `is_available` to false to stop receiving dispatches.
+    Requires 'police' role.
+    **Example Request:**
+    ```json
+    {
+      "latitude": 34.0507,
+      "longitude": -118.2468,
+      "is_available": true
+    }
+    ```
+    **Example Response:**
+    ```json
+    {
+      "user_id": 7,
+      "latitude": 34.0507,
+      "longitude": -118.2468,
+      "updated_at": "2023-10-27T09:59:41Z"
+    }
+    ```
+    """
+    position = await responder_service.update_responder_location(db, current_user.id, location_in)
+    return position
+
+
+@router.get("/nearest", response_model=List[AssignedResponder])
+async def read_nearest_responders(
+        latitude: float = Query(..., ge=-90, le=90),
+        longitude: float = Query(..., ge=-180, le=180),
+        k: int = Query(5, ge=1, le=50),
+        current_user: Principal = Depends(get_current_active_police_or_admin),
+):
+    """
+    Lists the k available responders nearest to a point, nearest first.
+    Requires 'police' or 'admin' role.
+    **Example Response:**
+    ```json
+    [
+      {
+        "user_id": 7,
+        "latitude": 34.0507,
+        "longitude": -118.2468,
+        "updated_at": "2023-10-27T09:59:41Z",
+        "distance_m": 334.2
+      }
+    ]
+    ```
+    """
+    return responder_service.responder_registry.nearest(latitude, longitude, k)
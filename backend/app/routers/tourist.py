@@ -1,21 +1,52 @@
 # Filename: app/routers/tourist.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.schemas.tourist import TouristCreate, TouristUpdate, TouristLocationUpdate, TouristProfile
-from app.schemas.user import UserInDB
+from app.schemas.tourist import TouristCreate, TouristUpdate, TouristLocationUpdate, TouristProfile, \
+    TouristLocationBatch, GatewayLocationBatch, LocationBatchResult, LocationTrack, SafetyRescoreResult
+from app.models.tourist import Tourist
 from app.services import tourist as tourist_service
-from app.services.auth import get_current_active_user, get_current_active_police_or_admin
-from app.services.log import create_access_log
+from app.services.location_history import get_location_track
+from app.services.safety_score import rescore_region
+from app.services.auth import get_current_active_user, get_current_active_police_or_admin, get_current_active_admin
+from app.core.context import RequestContext, get_request_context
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, bbox_params
 from app.database import get_db
-from app.models.user import User
+from app.schemas.user import Principal
 
 router = APIRouter(prefix="/tourists", tags=["Tourist Management"])
 
+MAX_TRACK_WINDOW = timedelta(days=31)
+
+
+def _profile_response(entry: tuple[str, bytes], if_none_match: str | None) -> Response:
+    """Serves a cached profile body, or 304 if the client already holds this version."""
+    etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match is not None and etag in (value.strip() for value in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def track_window(since: datetime | None = None, until: datetime | None = None) -> tuple[datetime, datetime]:
+    """Dependency for a track time window; defaults to the last 24 hours. Naive times are taken as UTC."""
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if until is not None and until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(hours=24)
+    if since >= until or until - since > MAX_TRACK_WINDOW:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Track window needs since < until and may span at most 31 days.")
+    return since, until
+
 
 @router.post("/", response_model=TouristProfile)
 async def create_tourist(
         tourist_in: TouristCreate,
-        current_user: User = Depends(get_current_active_user),
+        current_user: Principal = Depends(get_current_active_user),
+        context: RequestContext = Depends(get_request_context),
         db: AsyncSession = Depends(get_db)
 ):
     """
@@ -46,23 +77,27 @@ async def create_tourist(
     }
     ```
     """
-    existing_profile = await tourist_service.get_tourist_by_user_id(db, current_user.id)
+    existing_profile = await tourist_service.get_context_tourist(db, context)
     if existing_profile:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Tourist profile already exists for this user.")
 
     new_tourist = await tourist_service.create_tourist_profile(db, current_user.id, tourist_in)
-    await create_access_log(db, current_user.id, "/tourists/", "POST", True, current_user.role)
+    context.tourist = new_tourist
     return new_tourist
 
 
-@router.get("/me", response_model=TouristProfile)
+@router.get("/me", response_model=TouristProfile, responses={304: {"description": "Profile unchanged"}})
 async def read_tourist_me(
-        current_user: User = Depends(get_current_active_user),
+        if_none_match: str | None = Header(None),
+        current_user: Principal = Depends(get_current_active_user),
+        context: RequestContext = Depends(get_request_context),
         db: AsyncSession = Depends(get_db)
 ):
     """
     Retrieves the tourist profile of the authenticated user.
+    Responses carry an `ETag`; send it back in `If-None-Match` to get a 304 when the profile
+    has not changed.
     **Example Response:**
     ```json
     {
@@ -81,19 +116,18 @@ async def read_tourist_me(
     }
     ```
     """
-    tourist_profile = await tourist_service.get_tourist_by_user_id(db, current_user.id)
-    if not tourist_profile:
+    profile = await tourist_service.get_context_profile(db, context)
+    if profile is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Tourist profile not found. Please create one.")
 
-    await create_access_log(db, current_user.id, "/tourists/me", "GET", True, current_user.role)
-    return tourist_profile
+    return _profile_response(profile, if_none_match)
 
 
 @router.put("/me", response_model=TouristProfile)
 async def update_tourist_me(
         tourist_in: TouristUpdate,
-        current_user: User = Depends(get_current_active_user),
+        tourist_profile: Tourist = Depends(tourist_service.get_current_tourist),
         db: AsyncSession = Depends(get_db)
 ):
     """
@@ -122,24 +156,19 @@ async def update_tourist_me(
     }
     ```
     """
-    tourist_profile = await tourist_service.get_tourist_by_user_id(db, current_user.id)
-    if not tourist_profile:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tourist profile not found.")
-
     updated_tourist = await tourist_service.update_tourist_profile(db, tourist_profile, tourist_in)
-    await create_access_log(db, current_user.id, "/tourists/me", "PUT", True, current_user.role)
     return updated_tourist
 
 
 @router.put("/me/location", response_model=TouristProfile)
 async def update_tourist_location(
         location_in: TouristLocationUpdate,
-        current_user: User = Depends(get_current_active_user),
+        tourist_profile: Tourist = Depends(tourist_service.get_current_tourist),
         db: AsyncSession = Depends(get_db)
 ):
     """
     Updates the current location of the authenticated tourist.
-    This endpoint also triggers a geo-fence check.
+    Confirmed geo-fence transitions are recorded; leaving a safe zone or entering a restricted zone raises an alert.
     **Example Request:**
     ```json
     {
@@ -162,22 +191,146 @@ async def update_tourist_location(
     }
     ```
     """
-    tourist_profile = await tourist_service.get_tourist_by_user_id(db, current_user.id)
-    if not tourist_profile:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tourist profile not found.")
-
-    updated_profile = await tourist_service.update_tourist_location(db, tourist_profile.id, location_in)
-    await create_access_log(db, current_user.id, "/tourists/me/location", "PUT", True, current_user.role)
+    updated_profile = await tourist_service.update_tourist_location(db, tourist_profile, location_in)
     return updated_profile
 
 
+@router.post("/me/locations:batch", response_model=LocationBatchResult)
+async def update_tourist_locations_batch(
+        batch_in: TouristLocationBatch,
+        tourist_profile: Tourist = Depends(tourist_service.get_current_tourist),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Ingests a batch of buffered location fixes from the authenticated tourist's device.
+    The latest fix becomes the tourist's current location; every fix is fed through the geo-fence transition check.
+    **Example Request:**
+    ```json
+    {
+      "fixes": [
+        { "latitude": 34.0522, "longitude": -118.2437, "timestamp": "2023-10-27T10:00:00Z" },
+        { "latitude": 34.0531, "longitude": -118.2442, "timestamp": "2023-10-27T10:00:30Z" }
+      ]
+    }
+    ```
+    **Example Response:**
+    ```json
+    {
+      "accepted_fixes": 2,
+      "updated_tourists": 1,
+      "violations": []
+    }
+    ```
+    """
+    result = await tourist_service.ingest_location_batch(db, {tourist_profile.id: batch_in.fixes})
+    return result
+
+
+@router.get("/me/track", response_model=LocationTrack)
+async def read_tourist_track_me(
+        window: tuple[datetime, datetime] = Depends(track_window),
+        interval_seconds: int = Query(0, ge=0, le=86400),
+        tourist_profile: Tourist = Depends(tourist_service.get_current_tourist),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Retrieves the authenticated tourist's location history between `since` and `until`
+    (default: the last 24 hours), oldest first. With `interval_seconds`, only the last fix
+    of each interval is returned.
+    **Example Response:**
+    ```json
+    {
+      "tourist_id": 1,
+      "points": [
+        { "latitude": 34.0522, "longitude": -118.2437, "timestamp": "2023-10-27T10:00:00Z" },
+        { "latitude": 34.0531, "longitude": -118.2442, "timestamp": "2023-10-27T10:00:30Z" }
+      ]
+    }
+    ```
+    """
+    points = await get_location_track(db, tourist_profile.id, *window, interval_seconds=interval_seconds)
+    return {"tourist_id": tourist_profile.id, "points": points}
+
+
+@router.post("/locations:batch", response_model=LocationBatchResult)
+async def ingest_gateway_locations_batch(
+        batch_in: GatewayLocationBatch,
+        current_user: Principal = Depends(get_current_active_admin),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Ingests buffered location fixes for many tourists at once, e.g. from an IoT band gateway.
+    Requires 'admin' role. Fixes for unknown tourist IDs are ignored.
+    **Example Request:**
+    ```json
+    {
+      "tourists": [
+        {
+          "tourist_id": 1,
+          "fixes": [{ "latitude": 34.0522, "longitude": -118.2437, "timestamp": "2023-10-27T10:00:00Z" }]
+        },
+        {
+          "tourist_id": 2,
+          "fixes": [{ "latitude": 34.1015, "longitude": -118.3269, "timestamp": "2023-10-27T10:00:05Z" }]
+        }
+      ]
+    }
+    ```
+    **Example Response:**
+    ```json
+    {
+      "accepted_fixes": 2,
+      "updated_tourists": 2,
+      "violations": []
+    }
+    ```
+    """
+    fixes_by_tourist = {}
+    for entry in batch_in.tourists:
+        fixes_by_tourist.setdefault(entry.tourist_id, []).extend(entry.fixes)
+
+    result = await tourist_service.ingest_location_batch(db, fixes_by_tourist)
+    return result
+
+
+@router.post("/safety-scores:rescore", response_model=SafetyRescoreResult)
+async def rescore_safety_region(
+        bbox: tuple | None = Depends(bbox_params),
+        current_user: Principal = Depends(get_current_active_admin),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Immediately recomputes the safety score of every tourist whose last known location lies in
+    the `min_lon`/`min_lat`/`max_lon`/`max_lat` bounding box, e.g. after a change in local conditions.
+    Scores are otherwise kept current automatically. Requires 'admin' role.
+    **Example Response:**
+    ```json
+    { "rescored": 1824 }
+    ```
+    """
+    if bbox is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A bounding box is required.")
+    rescored = await rescore_region(db, bbox)
+    return {"rescored": rescored}
+
+
 @router.get("/", response_model=list[TouristProfile])
 async def read_all_tourists(
-        current_user: User = Depends(get_current_active_police_or_admin),
+        response: Response,
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: str | None = None,
+        is_active: bool | None = None,
+        registered_since: datetime | None = None,
+        registered_until: datetime | None = None,
+        bbox: tuple | None = Depends(bbox_params),
+        current_user: Principal = Depends(get_current_active_police_or_admin),
         db: AsyncSession = Depends(get_db)
 ):
     """
-    Retrieves a list of all tourist profiles.
+    Retrieves one page of tourist profiles in ascending ID order.
+    Filters: `is_active`, `registered_since`/`registered_until` (account creation time) and a
+    `min_lon`/`min_lat`/`max_lon`/`max_lat` bounding box on the last known location.
+    When more results exist, the `X-Next-Cursor` response header holds the `cursor` for the next page.
     Requires 'police' or 'admin' role.
     **Example Response:**
     ```json
@@ -199,19 +352,27 @@ async def read_all_tourists(
     ]
     ```
     """
-    tourists = await tourist_service.get_all_tourists(db)
-    await create_access_log(db, current_user.id, "/tourists/", "GET", True, current_user.role)
+    after_id = decode_cursor(cursor, int)[0] if cursor else None
+    tourists = await tourist_service.get_all_tourists(
+        db, limit=limit, after_id=after_id, is_active=is_active,
+        registered_since=registered_since, registered_until=registered_until, bbox=bbox
+    )
+    if len(tourists) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(tourists[-1].id)
     return tourists
 
 
-@router.get("/{tourist_id}", response_model=TouristProfile)
+@router.get("/{tourist_id}", response_model=TouristProfile, responses={304: {"description": "Profile unchanged"}})
 async def read_tourist_by_id(
         tourist_id: int,
-        current_user: User = Depends(get_current_active_police_or_admin),
+        if_none_match: str | None = Header(None),
+        current_user: Principal = Depends(get_current_active_police_or_admin),
         db: AsyncSession = Depends(get_db)
 ):
     """
     Retrieves a single tourist profile by ID.
+    Responses carry an `ETag`; send it back in `If-None-Match` to get a 304 when the profile
+    has not changed.
     Requires 'police' or 'admin' role.
     **Example Response:**
     ```json
@@ -224,9 +385,29 @@ async def read_tourist_by_id(
     }
     ```
     """
+    profile = await tourist_service.get_profile(db, tourist_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tourist not found.")
+
+    return _profile_response(profile, if_none_match)
+
+
+@router.get("/{tourist_id}/track", response_model=LocationTrack)
+async def read_tourist_track(
+        tourist_id: int,
+        window: tuple[datetime, datetime] = Depends(track_window),
+        interval_seconds: int = Query(0, ge=0, le=86400),
+        current_user: Principal = Depends(get_current_active_police_or_admin),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Retrieves a tourist's location history between `since` and `until`
+    (default: the last 24 hours), oldest first.
+    Requires 'police' or 'admin' role.
+    """
     tourist_profile = await tourist_service.get_tourist_by_id(db, tourist_id)
     if not tourist_profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tourist not found.")
 
-    await create_access_log(db, current_user.id, f"/tourists/{tourist_id}", "GET", True, current_user.role)
-    return tourist_profile
+    points = await get_location_track(db, tourist_id, *window, interval_seconds=interval_seconds)
+    return {"tourist_id": tourist_id, "points": points}
@@ -1,8 +1,10 @@
 # Filename: app/schemas/alert.py
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
+from app.core.geometry import GeoJSONPoint
 from app.models.alert import AlertStatus
+from app.schemas.responder import AssignedResponder
 
 class EmergencyAlertBase(BaseModel):
     """Base schema for an emergency alert."""
@@ -10,8 +12,8 @@ class EmergencyAlertBase(BaseModel):
 
 class EmergencyAlertCreate(BaseModel):
     """Schema for a tourist to raise a new alert."""
-    latitude: float
-    longitude: float
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
     message: Optional[str] = None
 
 class EmergencyAlertAcknowledge(BaseModel):
@@ -26,11 +28,15 @@ class EmergencyAlertResponse(EmergencyAlertBase):
     """Schema for a detailed emergency alert response."""
     id: int
     tourist_id: int
-    location: dict  # GeoJSON representation
+    location: GeoJSONPoint
     timestamp: datetime
     status: AlertStatus
     acknowledged_by: Optional[int] = None
 
+class SOSAlertResponse(EmergencyAlertResponse):
+    """Schema for a newly raised SOS alert with the responders it was shared with."""
+    responders: List[AssignedResponder] = []
+
 class EmergencyAlertHistory(EmergencyAlertResponse):
     """Schema for fetching alert history."""
     pass
@@ -0,0 +1,18 @@
+# Filename: app/schemas/heatmap.py
+from pydantic import BaseModel
+from typing import List
+
+class HeatmapCell(BaseModel):
+    """Schema for the counts of one geohash cell; latitude/longitude is the cell center."""
+    geohash: str
+    latitude: float
+    longitude: float
+    tourists: int
+    active_alerts: int
+
+class HeatmapTile(BaseModel):
+    """Schema for all non-empty cells of a given precision within a tile."""
+    precision: int
+    tile: str
+    version: int
+    cells: List[HeatmapCell] = []
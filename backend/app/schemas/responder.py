@@ -0,0 +1,20 @@
+# Filename: app/schemas/responder.py
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+class ResponderLocationUpdate(BaseModel):
+    """Schema for a police responder reporting their position."""
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    is_available: bool = True
+
+class ResponderPosition(BaseModel):
+    """Schema for a responder's last known position."""
+    user_id: int
+    latitude: float
+    longitude: float
+    updated_at: datetime
+
+class AssignedResponder(ResponderPosition):
+    """Schema for a responder matched to a location, with the great-circle distance to it."""
+    distance_m: float
@@ -3,11 +3,21 @@ from pydantic import BaseModel, ConfigDict
 from datetime import datetime
 
 class Token(BaseModel):
-    """Schema for a JWT access token response."""
+    """Schema for a JWT access and refresh token pair."""
     access_token: str
+    refresh_token: str
     token_type: str
     issued_at: datetime
     expires_at: datetime
+    refresh_expires_at: datetime
+
+class RefreshRequest(BaseModel):
+    """Schema for exchanging a refresh token for a new token pair."""
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    """Schema for logging out; the refresh token is revoked too when given."""
+    refresh_token: str | None = None
 
 class TokenData(BaseModel):
     """Schema for the payload contained within a JWT."""
@@ -1,7 +1,10 @@
 # Filename: app/schemas/tourist.py
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import AwareDatetime, BaseModel, Field, model_validator
+from typing import ClassVar, Optional, List, Literal
+from datetime import datetime
+from app.core.geometry import GeoJSONPoint
 from app.schemas.user import UserProfile
+from app.models.tourist import ZoneType
 
 class TouristBase(BaseModel):
     """Base schema for a tourist profile."""
@@ -20,21 +23,109 @@ class TouristUpdate(BaseModel):
 
 class TouristLocationUpdate(BaseModel):
     """Schema for updating a tourist's location."""
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+class TouristLocationFix(TouristLocationUpdate):
+    """Schema for a single timestamped location fix buffered by a device."""
+    timestamp: AwareDatetime
+
+class TouristLocationBatch(BaseModel):
+    """Schema for a batch of buffered location fixes from one tourist."""
+    fixes: List[TouristLocationFix] = Field(..., min_length=1, max_length=1000)
+
+class TouristLocationBatchEntry(TouristLocationBatch):
+    """Schema for the buffered fixes of one tourist within a gateway batch."""
+    tourist_id: int
+
+class GatewayLocationBatch(BaseModel):
+    """Schema for a gateway batch covering many tourists, with at most MAX_FIXES fixes in total."""
+    MAX_FIXES: ClassVar[int] = 10000
+
+    tourists: List[TouristLocationBatchEntry] = Field(..., min_length=1, max_length=1000)
+
+    @model_validator(mode="after")
+    def check_total_fixes(self):
+        if sum(len(entry.fixes) for entry in self.tourists) > self.MAX_FIXES:
+            raise ValueError(f"A gateway batch may carry at most {self.MAX_FIXES} fixes in total.")
+        return self
+
+class GeoFenceViolation(BaseModel):
+    """Schema for an alert-raising geo-fence transition detected while processing a batch."""
+    tourist_id: int
+    fence_id: int
+    fence_name: str
+    zone_type: ZoneType
+    transition: Literal["enter", "exit"]
+    latitude: float
+    longitude: float
+    timestamp: datetime
+
+class LocationBatchResult(BaseModel):
+    """Schema for the outcome of a location batch."""
+    accepted_fixes: int
+    updated_tourists: int
+    violations: List[GeoFenceViolation] = []
+
+class TrackPoint(BaseModel):
+    """Schema for one fix of a tourist's location history."""
     latitude: float
     longitude: float
+    timestamp: datetime
+
+class LocationTrack(BaseModel):
+    """Schema for a tourist's location history within a time window."""
+    tourist_id: int
+    points: List[TrackPoint] = []
 
 class TouristProfile(TouristBase):
     """Schema for a full tourist profile with user info."""
     id: int
+    last_location: Optional[GeoJSONPoint] = None
+    safety_score: Optional[float] = Field(None, description="0 (high risk) to 100 (safe); null until first scored.")
     user: UserProfile
 
 class GeoFenceCreate(BaseModel):
     """Schema for creating a geo-fence."""
     name: str = Field(..., min_length=3)
     description: Optional[str] = None
+    zone_type: ZoneType = ZoneType.SAFE
+    sensitivity: float = Field(0.0, ge=0, le=1, description="How much being in this area lowers a tourist's safety score.")
     # GeoJSON representation of a polygon
     geojson: dict = Field(..., description="GeoJSON Polygon object for the geo-fence area.")
 
+class GeoFenceUpdate(BaseModel):
+    """Schema for updating a geo-fence; omitted fields are left unchanged."""
+    name: Optional[str] = Field(None, min_length=3)
+    description: Optional[str] = None
+    zone_type: Optional[ZoneType] = None
+    sensitivity: Optional[float] = Field(None, ge=0, le=1)
+    geojson: Optional[dict] = Field(None, description="GeoJSON Polygon object for the geo-fence area.")
+
 class GeoFenceResponse(GeoFenceCreate):
     """Schema for a geo-fence response."""
     id: int
+    bbox: List[float] = Field(..., description="[min_lon, min_lat, max_lon, max_lat] of the fence area.")
+    revision: int
+
+class GeoFenceFeatureCollection(BaseModel):
+    """
+    Schema for a bulk GeoJSON import. Each feature needs a Polygon geometry and a
+    `name` property; optional `description`, `zone_type` and `sensitivity` properties are also stored.
+    """
+    type: Literal["FeatureCollection"]
+    features: List[dict] = Field(..., min_length=1, max_length=5000)
+
+class GeoFenceImportResult(BaseModel):
+    """Schema for the outcome of a bulk geo-fence import."""
+    created: int
+    updated: int
+    revision: int
+
+class SafetyRescoreResult(BaseModel):
+    """Schema for the outcome of a region-wide safety score recomputation."""
+    rescored: int
+
+class GeoFenceVersion(BaseModel):
+    """Schema for the current geo-fence revision watched by location workers."""
+    revision: int
@@ -1,5 +1,5 @@
 # Filename: app/schemas/user.py
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from app.models.user import UserRole
 from typing import Optional
 from datetime import datetime
@@ -28,3 +28,12 @@ class UserLogin(UserBase):
 class UserProfile(UserInDB):
     """Schema for a user's full profile, including sensitive info."""
     pass
+
+class Principal(BaseModel):
+    """Schema for the identity resolved from an access token."""
+    id: int
+    username: str
+    role: UserRole
+    is_active: bool
+
+    model_config = ConfigDict(frozen=True)
@@ -0,0 +1,186 @@
+# Filename: app/services/admission.py
+import asyncio
+import heapq
+import itertools
+import math
+import re
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.core.ratelimit import TokenBuckets
+from app.database import pool_stats
+from typing import Dict, List, Tuple
+
+# Priorities; lower values are admitted first
+CRITICAL = 0
+NORMAL = 1
+LOW = 2
+
+# Emergency traffic: raising an alert and taking it on
+_CRITICAL_ROUTES = (
+    ("POST", re.compile(r"^/api/v1/alerts/sos/?$")),
+    ("PUT", re.compile(r"^/api/v1/alerts/\d+/acknowledge/?$")),
+)
+
+
+class PriorityLimiter:
+    """
+    Caps the number of requests in flight. When the cap is reached, requests wait and a
+    released slot is handed to the waiter with the lowest priority value, FIFO among equals.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        # Heap of waiters; entries whose future is done are dead and skipped or purged
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued = 0
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return self._queued
+
+    async def acquire(self, priority: int, timeout: float) -> bool:
+        """Takes a slot, waiting at most `timeout` seconds; returns False if none was free in time."""
+        if self.active < self.limit and not self._queued:
+            self.active += 1
+            return True
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._queued += 1
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            # The slot may have been handed over just as the wait timed out; it is ours then
+            if future.done() and not future.cancelled():
+                return True
+            self._abandon()
+            return False
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Cancelled after being handed a slot: pass it on rather than leak it
+                self.release()
+            else:
+                self._abandon()
+            raise
+
+    def _abandon(self):
+        """Accounts for a waiter that left without a slot, purging dead entries once they dominate."""
+        self._queued -= 1
+        if len(self._waiters) > 2 * self._queued + 16:
+            self._waiters = [waiter for waiter in self._waiters if not waiter[2].done()]
+            heapq.heapify(self._waiters)
+
+    def release(self):
+        """Frees a slot, passing it straight on to the next waiter still waiting."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._queued -= 1
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    """
+    Decides whether a request may proceed before it reaches the routers.
+
+    SOS and acknowledge calls are always admitted immediately. Every other request must take
+    a token from the bucket of its principal (sized by role) and, for the configured routes,
+    from the route's shared bucket, otherwise it gets 429. When the database pool is backing
+    up, listed routes and then all other non-critical requests are shed with 503 so that the
+    remaining connections serve emergency traffic. Finally, requests queue for a concurrency
+    slot in priority order. State is per worker.
+    """
+
+    def __init__(self, role_limits: Dict[str, List[float]], route_limits: Dict[str, List[float]],
+                 max_keys: int, max_concurrent: int, queue_timeout: float, shed_pool_wait: float,
+                 retry_after: int):
+        self.queue_timeout = queue_timeout
+        self.shed_pool_wait = shed_pool_wait
+        self.retry_after = retry_after
+        self.limiter = PriorityLimiter(max_concurrent)
+        self._roles = {role: TokenBuckets(rate, burst, max_keys) for role, (rate, burst) in role_limits.items()}
+        # (method, path, is prefix, bucket shared by every caller)
+        self._routes = []
+        for key, (rate, burst) in route_limits.items():
+            method, path = key.split(" ", 1)
+            prefix = path.endswith("*")
+            self._routes.append((method.upper(), path.rstrip("*"), prefix, TokenBuckets(rate, burst, 1)))
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    def stats(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "in_flight": self.limiter.active,
+            "queued": len(self.limiter),
+            "principals": {role: len(buckets) for role, buckets in self._roles.items()},
+        }
+
+    def _route_bucket(self, method: str, path: str) -> TokenBuckets | None:
+        for route_method, route_path, prefix, bucket in self._routes:
+            if route_method == method and (path.startswith(route_path) if prefix else path == route_path):
+                return bucket
+        return None
+
+    def _reject(self, status_code: int, detail: str, retry_after: float):
+        raise HTTPException(status_code=status_code, detail=detail,
+                            headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+    async def admit(self, method: str, path: str, role: str, principal: str) -> int | None:
+        """
+        Admits a request or raises 429/503. Returns the priority to pass to `release`, or None
+        for critical requests, which do not hold a concurrency slot.
+        """
+        if any(method == m and pattern.match(path) for m, pattern in _CRITICAL_ROUTES):
+            self.admitted += 1
+            return None
+
+        route_bucket = self._route_bucket(method, path)
+        priority = LOW if route_bucket is not None else NORMAL
+
+        role_buckets = self._roles.get(role)
+        wait = role_buckets.take(principal) if role_buckets is not None else 0.0
+        if wait == 0.0 and route_bucket is not None:
+            wait = route_bucket.take(None)
+            if wait > 0.0 and role_buckets is not None:
+                # Refusals on a throttled route must not drain the caller's budget for other routes
+                role_buckets.refund(principal)
+        if wait > 0.0:
+            self.rate_limited += 1
+            self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "Rate limit exceeded. Please retry later.", wait)
+
+        shed_at = self.shed_pool_wait if priority == LOW else 2 * self.shed_pool_wait
+        if pool_stats.recent_wait() > shed_at:
+            self.shed += 1
+            self._reject(status.HTTP_503_SERVICE_UNAVAILABLE,
+                         "Service is under heavy load. Please retry later.", self.retry_after)
+
+        if not await self.limiter.acquire(priority, self.queue_timeout):
+            self.timed_out += 1
+            self._reject(status.HTTP_503_SERVICE_UNAVAILABLE,
+                         "Service is under heavy load. Please retry later.", self.retry_after)
+        self.admitted += 1
+        return priority
+
+    def release(self, priority: int | None):
+        if priority is not None:
+            self.limiter.release()
+
+
+admission = AdmissionController(
+    role_limits=settings.ADMISSION_ROLE_LIMITS,
+    route_limits=settings.ADMISSION_ROUTE_LIMITS,
+    max_keys=settings.ADMISSION_MAX_KEYS,
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    shed_pool_wait=settings.ADMISSION_SHED_POOL_WAIT_SECONDS,
+    retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS,
+)
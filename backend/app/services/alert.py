@@ -1,27 +1,180 @@
-# Filename: app/models/alert.py
-import enum
-from sqlalchemy import Column, String, DateTime, Enum, Integer, ForeignKey
-from sqlalchemy.orm import relationship
-from geoalchemy2 import Geometry
-from app.models.base import BaseMixin, Base
-from sqlalchemy.sql import func
-
-class AlertStatus(str, enum.Enum):
-    """Defines the possible statuses for an emergency alert."""
-    ACTIVE = "active"
-    ACKNOWLEDGED = "acknowledged"
-    CLOSED = "closed"
-
-class EmergencyAlert(BaseMixin, Base):
-    """
-    Database model for emergency alerts raised by tourists.
-    """
-    tourist_id = Column(Integer, ForeignKey('tourists.id'), nullable=False)
-    location = Column(Geometry(geometry_type='POINT', srid=4326), nullable=False)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
-    status = Column(Enum(AlertStatus), default=AlertStatus.ACTIVE, nullable=False)
-    message = Column(String, nullable=True)
-    acknowledged_by = Column(Integer, ForeignKey('users.id'), nullable=True)
-
-    tourist = relationship("Tourist", backref="alerts")
-    acknowledged_by_user = relationship("User", back_populates="acknowledged_alerts", foreign_keys=[acknowledged_by])
+# Filename: app/services/alert.py
+from datetime import datetime
+from fastapi import HTTPException, status as http_status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func, tuple_, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.config import settings
+from app.core.geometry import point_geojson, point_coordinates
+from app.models.alert import EmergencyAlert, AlertStatus
+from app.schemas.alert import EmergencyAlertCreate
+from app.services.responder import responder_registry
+from typing import List
+
+
+def _alert_dict(row) -> dict:
+    """Converts a returned alert row to a response dict with a GeoJSON location."""
+    alert = dict(row)
+    coordinates = point_coordinates(alert["location"])
+    alert["location"] = point_geojson(*coordinates) if coordinates else None
+    return alert
+
+
+async def create_sos_alert(db: AsyncSession, tourist_id: int, alert_in: EmergencyAlertCreate,
+                           idempotency_key: str | None = None) -> tuple[dict, bool]:
+    """
+    Raises an SOS alert at the given location and assigns the nearest available responders
+    from the in-memory registry. Returns the alert and whether it was newly created.
+
+    With an `idempotency_key`, a retry by the same tourist returns the alert created by the
+    first request. The insert and the lookup are one statement: the conflicting row is
+    "updated" to itself so that RETURNING yields it, and `xmax = 0` tells a fresh insert apart.
+    """
+    stmt = pg_insert(EmergencyAlert).values(
+        tourist_id=tourist_id,
+        location=func.ST_SetSRID(func.ST_MakePoint(alert_in.longitude, alert_in.latitude), 4326),
+        status=AlertStatus.ACTIVE,
+        message=alert_in.message,
+        idempotency_key=idempotency_key,
+    )
+    if idempotency_key is not None:
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_emergencyalerts_tourist_idempotency_key",
+            set_={"idempotency_key": stmt.excluded.idempotency_key},
+        )
+    result = await db.execute(
+        stmt.returning(*EmergencyAlert.__table__.c, literal_column("xmax = 0").label("created"))
+    )
+    alert = _alert_dict(result.mappings().one())
+    await db.commit()
+
+    created = alert.pop("created")
+    longitude, latitude = alert["location"]["coordinates"]
+    alert["responders"] = responder_registry.nearest(latitude, longitude, settings.SOS_RESPONDER_COUNT)
+    return alert, created
+
+
+async def _transition(db: AsyncSession, alert_id: int, from_status: AlertStatus, values: dict) -> dict:
+    """
+    Moves an alert out of `from_status` with a single conditional UPDATE, so two officers
+    racing on the same alert cannot both succeed. Raises 404 or 409 when no row matched.
+    """
+    result = await db.execute(
+        update(EmergencyAlert)
+        .where(EmergencyAlert.id == alert_id, EmergencyAlert.status == from_status)
+        .values(**values)
+        .returning(*EmergencyAlert.__table__.c)
+    )
+    row = result.mappings().one_or_none()
+    if row is None:
+        current = (await db.execute(
+            select(EmergencyAlert.status).filter(EmergencyAlert.id == alert_id)
+        )).scalar_one_or_none()
+        await db.rollback()
+        if current is None:
+            raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Alert not found")
+        raise HTTPException(status_code=http_status.HTTP_409_CONFLICT,
+                            detail=f"Alert is {current.value}, expected {from_status.value}")
+    alert = _alert_dict(row)
+    await db.commit()
+    return alert
+
+
+async def acknowledge_alert(db: AsyncSession, alert_id: int, user_id: int) -> dict:
+    """Marks an active alert as acknowledged by the given officer."""
+    return await _transition(db, alert_id, AlertStatus.ACTIVE,
+                             {"status": AlertStatus.ACKNOWLEDGED, "acknowledged_by": user_id})
+
+
+async def close_alert(db: AsyncSession, alert_id: int) -> dict:
+    """Closes an acknowledged alert."""
+    return await _transition(db, alert_id, AlertStatus.ACKNOWLEDGED, {"status": AlertStatus.CLOSED})
+
+
+# Alert columns for list queries, with the point decoded to coordinates by PostGIS
+_ALERT_COLUMNS = (
+    EmergencyAlert.id,
+    EmergencyAlert.tourist_id,
+    func.ST_X(EmergencyAlert.location).label("longitude"),
+    func.ST_Y(EmergencyAlert.location).label("latitude"),
+    EmergencyAlert.timestamp,
+    EmergencyAlert.status,
+    EmergencyAlert.message,
+    EmergencyAlert.acknowledged_by,
+)
+
+
+async def get_alert_history(db: AsyncSession, limit: int = 100, cursor: tuple | None = None,
+                            status: AlertStatus | None = None, since: datetime | None = None,
+                            until: datetime | None = None, bbox: tuple | None = None) -> List[dict]:
+    """
+    Fetches one page of alerts, newest first, as response-ready dicts.
+    `cursor` is the (timestamp, id) of the last alert of the previous page.
+    """
+    stmt = (
+        select(*_ALERT_COLUMNS)
+        .order_by(EmergencyAlert.timestamp.desc(), EmergencyAlert.id.desc())
+        .limit(limit)
+    )
+    if cursor is not None:
+        stmt = stmt.filter(tuple_(EmergencyAlert.timestamp, EmergencyAlert.id) < tuple_(*cursor))
+    if status is not None:
+        stmt = stmt.filter(EmergencyAlert.status == status)
+    if since is not None:
+        stmt = stmt.filter(EmergencyAlert.timestamp >= since)
+    if until is not None:
+        stmt = stmt.filter(EmergencyAlert.timestamp < until)
+    if bbox is not None:
+        stmt = stmt.filter(func.ST_Intersects(EmergencyAlert.location, func.ST_MakeEnvelope(*bbox, 4326)))
+    result = await db.execute(stmt)
+    return [
+        {
+            "id": row[0],
+            "tourist_id": row[1],
+            "location": point_geojson(row[2], row[3]),
+            "timestamp": row[4],
+            "status": row[5],
+            "message": row[6],
+            "acknowledged_by": row[7],
+        }
+        for row in result.tuples()
+    ]
+
+
+async def get_all_active_alerts(db: AsyncSession, limit: int = 100, cursor: tuple | None = None,
+                                bbox: tuple | None = None) -> List[dict]:
+    """Fetches one page of currently active alerts, newest first."""
+    return await get_alert_history(db, limit=limit, cursor=cursor, status=AlertStatus.ACTIVE, bbox=bbox)
+
+
+async def create_system_alerts(db: AsyncSession, candidates: List[dict]) -> List[dict]:
+    """
+    Inserts one active alert per candidate (tourist_id, longitude, latitude, timestamp, message)
+    with a single multi-row INSERT. Candidates may carry an `idempotency_key`; a candidate whose
+    key the tourist already has is skipped, so workers detecting the same episode raise one
+    alert. Returns the inserted rows; the caller commits.
+    """
+    rows = [
+        {
+            "tourist_id": c["tourist_id"],
+            "location": func.ST_SetSRID(func.ST_MakePoint(c["longitude"], c["latitude"]), 4326),
+            "timestamp": c["timestamp"],
+            "status": AlertStatus.ACTIVE,
+            "message": c["message"],
+            "idempotency_key": c.get("idempotency_key"),
+        }
+        for c in candidates
+    ]
+    result = await db.execute(
+        pg_insert(EmergencyAlert).values(rows)
+        .on_conflict_do_nothing(constraint="uq_emergencyalerts_tourist_idempotency_key")
+        .returning(*EmergencyAlert.__table__.c)
+    )
+    return [dict(row) for row in result.mappings()]
+
+
+async def create_geofence_alerts(db: AsyncSession, violations: List[dict]) -> List[dict]:
+    """Inserts one active alert per geo-fence violation; the caller commits."""
+    return await create_system_alerts(
+        db, [dict(v, message=f"Geo-fence {v['transition']}: {v['fence_name']}") for v in violations]
+    )
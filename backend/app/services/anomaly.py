@@ -0,0 +1,329 @@
+# Filename: app/services/anomaly.py
+import asyncio
+import logging
+import math
+import time
+from array import array
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.timerwheel import TimerWheel
+from app.database import AsyncSessionLocal
+from app.models.tourist import Tourist
+from app.services import events
+from app.services.alert import create_system_alerts
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+_SILENT = 1  # a silence alert was raised and no fix has arrived since
+_INACTIVE = 2  # an inactivity alert was raised for the current stationary episode
+
+_DOUBLE_FIELDS = ("_fix_ts", "_lat", "_lon", "_speed", "_heading", "_cadence", "_seen",
+                  "_anchor_ts", "_anchor_lat", "_anchor_lon")
+
+
+def _distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Haversine distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 12_742_000.0 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _bearing_deg(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlon = math.radians(lon2 - lon1)
+    y = math.sin(dlon) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlon)
+    return math.degrees(math.atan2(y, x)) % 360.0
+
+
+class AnomalyDetector:
+    """
+    Streaming detector for the anomalies promised by the README:
+    - silence: no fix for several times the tourist's usual reporting cadence, reported as a
+      sudden drop-off when the tourist was moving just before;
+    - prolonged inactivity: fixes keep arriving but stay within a small radius;
+    - implausible movement: a jump faster than any realistic means of travel, the closest
+      proxy for route deviation while tourists have no planned routes.
+
+    Per-tourist state lives in parallel `array` columns indexed by a slot number (about 100
+    bytes per tourist) and slots of long-silent tourists are recycled, so memory is bounded
+    by `capacity`. Silences are found with a timer wheel holding one live timer per tourist,
+    so each tick only touches the tourists whose deadline has come up.
+
+    With several workers, a tourist's fixes may be spread over them and each worker sees a
+    subsequence. Speeds and stationarity measured on a subsequence still hold, but a worker's
+    silence timer can fire while the tourist reports elsewhere, so silences are confirmed
+    against the shared `Tourist.last_location_at` before they are raised. Alerts carry
+    idempotency keys derived from the episode, so workers detecting the same one insert a
+    single alert.
+    """
+
+    def __init__(self, capacity: int, tick_seconds: float, default_cadence: float, silence_factor: float,
+                 min_silence: float, max_silence: float, drop_off_speed: float, inactivity_seconds: float,
+                 stationary_m: float, max_speed: float, forget_after: float):
+        self.capacity = capacity
+        self.tick_seconds = tick_seconds
+        self.default_cadence = default_cadence
+        self.silence_factor = silence_factor
+        self.min_silence = min_silence
+        self.max_silence = max_silence
+        self.drop_off_speed = drop_off_speed
+        self.inactivity_seconds = inactivity_seconds
+        self.stationary_m = stationary_m
+        self.max_speed = max_speed
+        self.forget_after = forget_after
+        self.rejected = 0
+        self.candidates = 0
+        self._slots: Dict[int, int] = {}
+        self._free: List[int] = []
+        self._tourist = array("q")
+        self._generation = array("I")
+        self._flags = bytearray()
+        for name in _DOUBLE_FIELDS:
+            setattr(self, name, array("d"))
+        self._wheel = TimerWheel(4096, tick_seconds, time.time())
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._slots),
+            "slots": len(self._tourist),
+            "timers": self._wheel.pending,
+            "rejected": self.rejected,
+            "candidates": self.candidates,
+        }
+
+    def _allocate(self, tourist_id: int) -> int | None:
+        if self._free:
+            slot = self._free.pop()
+        elif len(self._tourist) < self.capacity:
+            slot = len(self._tourist)
+            self._tourist.append(0)
+            self._generation.append(0)
+            self._flags.append(0)
+            for name in _DOUBLE_FIELDS:
+                getattr(self, name).append(0.0)
+        else:
+            return None
+        self._slots[tourist_id] = slot
+        self._tourist[slot] = tourist_id
+        self._flags[slot] = 0
+        return slot
+
+    def _release(self, slot: int):
+        del self._slots[self._tourist[slot]]
+        self._generation[slot] = (self._generation[slot] + 1) & 0xFFFFFFFF
+        self._free.append(slot)
+
+    def _schedule(self, slot: int, deadline: float):
+        # Bumping the generation turns any timer already pending for the slot into a no-op
+        generation = (self._generation[slot] + 1) & 0xFFFFFFFF
+        self._generation[slot] = generation
+        self._wheel.schedule((slot, generation), deadline)
+
+    def _silence_deadline(self, slot: int) -> float:
+        allowed = min(max(self._cadence[slot] * self.silence_factor, self.min_silence), self.max_silence)
+        return self._seen[slot] + allowed
+
+    def _candidate(self, slot: int, message: str, idempotency_key: str) -> dict:
+        self.candidates += 1
+        return {
+            "tourist_id": self._tourist[slot],
+            "longitude": self._lon[slot],
+            "latitude": self._lat[slot],
+            "timestamp": datetime.fromtimestamp(self._fix_ts[slot], tz=timezone.utc),
+            "message": message,
+            "idempotency_key": idempotency_key,
+            "last_seen": self._seen[slot],
+        }
+
+    def observe(self, tourist_id: int, longitude: float, latitude: float, fix_ts: float,
+                now: float | None = None) -> List[dict]:
+        """
+        Feeds one fix (device timestamp in unix seconds) and returns alert candidates
+        for inactivity or implausible movement. The first fix of a tourist only sets a baseline.
+        """
+        now = time.time() if now is None else now
+        slot = self._slots.get(tourist_id)
+        if slot is None:
+            slot = self._allocate(tourist_id)
+            if slot is None:
+                self.rejected += 1
+                return []
+            self._fix_ts[slot] = self._anchor_ts[slot] = fix_ts
+            self._lat[slot] = self._anchor_lat[slot] = latitude
+            self._lon[slot] = self._anchor_lon[slot] = longitude
+            self._speed[slot] = self._heading[slot] = 0.0
+            self._cadence[slot] = self.default_cadence
+            self._seen[slot] = now
+            self._schedule(slot, self._silence_deadline(slot))
+            return []
+
+        self._seen[slot] = now
+        if self._flags[slot] & _SILENT:
+            self._flags[slot] &= ~_SILENT
+            self._schedule(slot, self._silence_deadline(slot))
+        elapsed = fix_ts - self._fix_ts[slot]
+        if elapsed <= 0:
+            # Duplicate or out-of-order fix: it proves the device is alive but says nothing about movement
+            return []
+
+        distance = _distance_m(self._lat[slot], self._lon[slot], latitude, longitude)
+        speed = distance / elapsed
+        jumped = speed > self.max_speed and distance > self.stationary_m
+        if not jumped:
+            self._speed[slot] = speed
+            if distance > 0:
+                self._heading[slot] = _bearing_deg(self._lat[slot], self._lon[slot], latitude, longitude)
+        self._cadence[slot] = 0.8 * self._cadence[slot] + 0.2 * min(elapsed, self.max_silence)
+        self._fix_ts[slot] = fix_ts
+        self._lat[slot] = latitude
+        self._lon[slot] = longitude
+
+        candidates = []
+        if jumped:
+            candidates.append(self._candidate(slot, f"Implausible jump of {distance / 1000:.1f} km in {elapsed:.0f} s",
+                                              f"jump:{fix_ts:.0f}"))
+
+        if _distance_m(self._anchor_lat[slot], self._anchor_lon[slot], latitude, longitude) > self.stationary_m:
+            self._anchor_ts[slot] = fix_ts
+            self._anchor_lat[slot] = latitude
+            self._anchor_lon[slot] = longitude
+            self._flags[slot] &= ~_INACTIVE
+        elif fix_ts - self._anchor_ts[slot] >= self.inactivity_seconds and not self._flags[slot] & _INACTIVE:
+            self._flags[slot] |= _INACTIVE
+            minutes = (fix_ts - self._anchor_ts[slot]) / 60
+            # Workers seeing different fixes may anchor the episode slightly differently
+            episode = math.floor(self._anchor_ts[slot] / self.inactivity_seconds)
+            candidates.append(self._candidate(slot, f"No movement for {minutes:.0f} min", f"inactive:{episode}"))
+        return candidates
+
+    def trajectory_risk(self, tourist_id: int) -> float:
+        """0-1 risk from the tourist's recent movement, stored with each fix for the safety score; 0 if not tracked here."""
+        slot = self._slots.get(tourist_id)
+        if slot is None:
+            return 0.0
+        if self._flags[slot] & _SILENT:
+            return 1.0
+        if self._flags[slot] & _INACTIVE:
+            return 0.5
+        return min(self._speed[slot] / self.max_speed, 1.0) * 0.5
+
+    def forget(self, tourist_id: int):
+        slot = self._slots.get(tourist_id)
+        if slot is not None:
+            self._release(slot)
+
+    def expire(self, now: float | None = None) -> List[dict]:
+        """Advances the timer wheel and returns silence alert candidates that came due."""
+        now = time.time() if now is None else now
+        candidates = []
+        for slot, generation in self._wheel.advance(now):
+            if self._generation[slot] != generation:
+                continue
+            if self._flags[slot] & _SILENT:
+                forget_at = self._seen[slot] + self.forget_after
+                if now >= forget_at:
+                    self._release(slot)
+                else:
+                    self._schedule(slot, forget_at)
+                continue
+            deadline = self._silence_deadline(slot)
+            if now < deadline:
+                self._schedule(slot, deadline)
+                continue
+            self._flags[slot] |= _SILENT
+            minutes = (now - self._seen[slot]) / 60
+            if self._speed[slot] >= self.drop_off_speed:
+                message = (f"Sudden location drop-off while moving at {self._speed[slot] * 3.6:.0f} km/h "
+                           f"heading {self._heading[slot]:.0f}°")
+            else:
+                message = f"No location update for {minutes:.0f} min"
+            # Keyed on the shared last-seen time by confirm_silences
+            candidates.append(self._candidate(slot, message, ""))
+            self._schedule(slot, self._seen[slot] + self.forget_after)
+        return candidates
+
+    def confirm_silences(self, candidates: List[dict], last_seen: Dict[int, float]) -> List[dict]:
+        """
+        Filters silence candidates against the shared last-seen times (unix seconds) of their
+        tourists. A tourist seen after the candidate's basis reported to another worker (or here,
+        meanwhile): the candidate is dropped and the silence timer restarted from that time.
+        Confirmed candidates are keyed on the shared time, identical on every worker.
+        """
+        confirmed = []
+        for candidate in candidates:
+            tourist_id = candidate["tourist_id"]
+            shared = last_seen.get(tourist_id)
+            slot = self._slots.get(tourist_id)
+            latest = max(shared or 0.0, self._seen[slot] if slot is not None else 0.0)
+            if latest > candidate["last_seen"] + 1.0:
+                if slot is not None:
+                    self._seen[slot] = latest
+                    self._flags[slot] &= ~_SILENT
+                    self._schedule(slot, self._silence_deadline(slot))
+                continue
+            candidate["idempotency_key"] = f"silence:{(shared or candidate['last_seen']):.0f}"
+            confirmed.append(candidate)
+        return confirmed
+
+    def start(self):
+        """Starts the silence detection loop on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            candidates = self.expire()
+            if not candidates:
+                continue
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(
+                        select(Tourist.id, Tourist.last_location_at)
+                        .filter(Tourist.id.in_({c["tourist_id"] for c in candidates}))
+                    )
+                    last_seen = {tourist_id: seen.timestamp() for tourist_id, seen in result if seen is not None}
+                    candidates = self.confirm_silences(candidates, last_seen)
+                    if candidates:
+                        await raise_anomaly_alerts(db, candidates)
+            except Exception:
+                logger.exception("Failed to raise %d anomaly alerts", len(candidates))
+
+
+anomaly_detector = AnomalyDetector(
+    capacity=settings.ANOMALY_MAX_TOURISTS,
+    tick_seconds=settings.ANOMALY_TICK_SECONDS,
+    default_cadence=settings.ANOMALY_DEFAULT_CADENCE_SECONDS,
+    silence_factor=settings.ANOMALY_SILENCE_FACTOR,
+    min_silence=settings.ANOMALY_MIN_SILENCE_SECONDS,
+    max_silence=settings.ANOMALY_MAX_SILENCE_SECONDS,
+    drop_off_speed=settings.ANOMALY_DROP_OFF_SPEED_MPS,
+    inactivity_seconds=settings.ANOMALY_INACTIVITY_SECONDS,
+    stationary_m=settings.ANOMALY_STATIONARY_METERS,
+    max_speed=settings.ANOMALY_MAX_SPEED_MPS,
+    forget_after=settings.ANOMALY_FORGET_SECONDS,
+)
+
+
+async def raise_anomaly_alerts(db: AsyncSession, candidates: List[dict]):
+    """Persists anomaly candidates as active alerts, commits and broadcasts them."""
+    alerts = await create_system_alerts(db, candidates)
+    await db.commit()
+    for alert in alerts:
+        await events.publish_alert_event(events.ALERT_CREATED, alert)
@@ -1,83 +1,383 @@
 # Filename: app/services/auth.py
+import asyncio
+import logging
+import math
+import time
+import uuid
 import jwt
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session, object_session
 from passlib.context import CryptContext
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.context import get_request_context
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.schemas.token import TokenData
+from app.schemas.user import Principal
+from app.services import events
+from app.services.revocation import revoked_tokens, revoke_tokens, ACCESS, REFRESH
+from typing import Iterable
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# Hashes outside the configured cost are flagged by needs_update so they can be rehashed on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
+# token -> (principal, invalidation generation at resolve time, token expiry as a unix timestamp, token id)
+principal_cache = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL_SECONDS)
+
+
+class UserInvalidations:
+    """
+    Tracks which users changed since a cached principal was resolved.
+
+    Every invalidation advances a generation, and a principal resolved at generation `g` stays
+    valid while its user has not been invalidated after `g`. Only the most recent `max_tracked`
+    users are remembered; principals older than the last forgotten invalidation are treated
+    as stale. Changes committed on this worker are broadcast over the event broker, batched
+    every flush interval, and other workers' changes are applied as they arrive.
+    """
+
+    def __init__(self, max_tracked: int, flush_interval: float):
+        self.max_tracked = max_tracked
+        self.flush_interval = flush_interval
+        self.generation = 0
+        # user id -> generation of their latest invalidation
+        self._invalidated: OrderedDict = OrderedDict()
+        # Newest generation that was dropped from _invalidated
+        self._forgotten = 0
+        self._pending: set = set()
+        self._task: asyncio.Task | None = None
+
+    def stats(self) -> dict:
+        return {"tracked_users": len(self._invalidated), "generation": self.generation, "pending": len(self._pending)}
+
+    def is_current(self, user_id: int, generation: int) -> bool:
+        """Whether a principal of the user resolved at `generation` is still valid."""
+        return generation >= self._forgotten and self._invalidated.get(user_id, 0) <= generation
+
+    def _drop(self, user_ids: Iterable[int]):
+        self.generation += 1
+        for user_id in user_ids:
+            self._invalidated[user_id] = self.generation
+            self._invalidated.move_to_end(user_id)
+        while len(self._invalidated) > self.max_tracked:
+            self._forgotten = max(self._forgotten, self._invalidated.popitem(last=False)[1])
+
+    def invalidate(self, user_ids: Iterable[int]):
+        """Makes the users' cached principals stale here, and queues the broadcast."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        self._drop(user_ids)
+        if self._task is not None:
+            self._pending.update(user_ids)
+
+    async def start(self):
+        """Subscribes to other workers' invalidations and starts broadcasting this worker's."""
+        if self._task is not None:
+            return
+        subscription = await events.event_broker.subscribe(
+            events.AUTH_CHANNEL, lambda message: message.get("type") == events.USERS_CHANGED)
+        self._task = asyncio.create_task(self._run(subscription))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._pending.clear()
+
+    async def _run(self, subscription):
+        flush = asyncio.create_task(self._run_flush())
+        try:
+            while True:
+                message = await subscription.get()
+                self._drop(message["user_ids"])
+        finally:
+            subscription.close()
+            flush.cancel()
+
+    async def _run_flush(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self._pending:
+                continue
+            pending, self._pending = sorted(self._pending), set()
+            try:
+                # Keep each notification well below the 8000-byte NOTIFY payload limit
+                for i in range(0, len(pending), 500):
+                    await events.publish_user_invalidation(pending[i:i + 500])
+            except Exception:
+                logger.exception("Failed to broadcast %d user invalidations", len(pending))
+
+
+user_invalidations = UserInvalidations(
+    max_tracked=settings.AUTH_CACHE_MAX_ENTRIES,
+    flush_interval=settings.AUTH_INVALIDATION_FLUSH_SECONDS,
+)
+
+
+class PasswordWorkPool:
+    """
+    Runs bcrypt work on a bounded executor so it never blocks the event loop.
+    At most `workers` operations run at once; callers beyond that wait in
+    line, and once `max_queue` callers are waiting new work is rejected
+    with a 503 instead of piling up.
+    """
+
+    def __init__(self, executor: Executor, workers: int, max_queue: int):
+        self.executor = executor
+        self.max_queue = max_queue
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(workers)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+    async def run(self, fn, *args):
+        """Runs `fn(*args)` on the executor once a slot is free."""
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Authentication service is busy. Please retry shortly.",
+                                headers={"Retry-After": "1"})
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Returns queue depth and throughput counters."""
+        return {"waiting": self.waiting, "running": self.running,
+                "completed": self.completed, "rejected": self.rejected}
+
+
+if settings.PASSWORD_HASH_EXECUTOR == "process":
+    _password_executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+else:
+    _password_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS,
+                                            thread_name_prefix="password-hash")
+password_pool = PasswordWorkPool(_password_executor, settings.PASSWORD_HASH_WORKERS,
+                                 settings.PASSWORD_HASH_MAX_QUEUE)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain password against a hashed one."""
-    return pwd_context.verify(plain_password, hashed_password)
+    verified, _ = await password_pool.run(_verify_and_update, plain_password, hashed_password)
+    return verified
 
 
-def get_password_hash(password: str) -> str:
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verifies a password and, if the stored hash uses an outdated scheme or cost,
+    also returns a replacement hash made with the current settings.
+    """
+    return await password_pool.run(_verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash(password: str) -> str:
     """Hashes a password."""
-    return pwd_context.hash(password)
+    return await password_pool.run(_hash, password)
+
+
+def _create_token(data: dict, token_type: str, issued_at: datetime, expires_delta: timedelta) -> str:
+    to_encode = data.copy()
+    to_encode.update({"exp": issued_at + expires_delta, "iat": issued_at, "jti": uuid.uuid4().hex, "type": token_type})
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     """Creates a JWT access token."""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    return _create_token(data, ACCESS, datetime.now(timezone.utc), expires_delta or timedelta(minutes=15))
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
-    """
-    Dependency to get the current authenticated user from a JWT.
-    """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def issue_tokens(username: str, role: UserRole) -> dict:
+    """Creates an access and refresh token pair for a user."""
+    now = datetime.now(timezone.utc)
+    access_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    refresh_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
+    data = {"sub": username, "role": getattr(role, "value", role)}
+    return {
+        "access_token": _create_token(data, ACCESS, now, access_expires),
+        "refresh_token": _create_token(data, REFRESH, now, refresh_expires),
+        "token_type": "bearer",
+        "issued_at": now,
+        "expires_at": now + access_expires,
+        "refresh_expires_at": now + refresh_expires,
+    }
+
+
+def _credentials_exception(detail: str = "Could not validate credentials") -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail,
+                         headers={"WWW-Authenticate": "Bearer"})
+
+
+def decode_token(token: str, token_type: str) -> dict:
+    """Verifies a token's signature, expiry and type and returns its claims."""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        role: str = payload.get("role")
-        if username is None or role is None:
-            raise credentials_exception
-        token_data = TokenData(username=username, role=role)
     except jwt.PyJWTError:
+        raise _credentials_exception()
+    # Tokens issued before refresh tokens existed carry no type and are access tokens
+    if payload.get("type", ACCESS) != token_type or payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+
+async def refresh_tokens(db: AsyncSession, refresh_token: str) -> dict:
+    """
+    Exchanges a refresh token for a new pair and revokes it (rotation). Presenting a refresh
+    token that was already rotated or revoked fails, so a stolen copy is only good once.
+    """
+    payload = decode_token(refresh_token, REFRESH)
+    result = await db.execute(select(User).filter(User.username == payload["sub"]))
+    user = result.scalars().first()
+    if user is None or not user.is_active or "jti" not in payload:
+        raise _credentials_exception()
+    if not await revoke_tokens(db, user.id, [payload]):
+        raise _credentials_exception("Refresh token has already been used or revoked")
+    return issue_tokens(user.username, user.role)
+
+
+async def logout(db: AsyncSession, principal: Principal, access_token: str, refresh_token: str | None = None):
+    """Revokes the access token of the request and, if given, the user's refresh token."""
+    claims = [decode_token(access_token, ACCESS)]
+    if refresh_token is not None:
+        refresh_claims = decode_token(refresh_token, REFRESH)
+        if refresh_claims["sub"] != principal.username:
+            raise _credentials_exception()
+        claims.append(refresh_claims)
+    principal_cache.pop(access_token)
+    await revoke_tokens(db, principal.id, [c for c in claims if "jti" in c])
+
+
+def invalidate_user(user_id: int):
+    """Discards every cached principal of a user on all workers, e.g. after deactivation or a role change."""
+    user_invalidations.invalidate([user_id])
+
+
+async def resolve_principal(token: str, db: AsyncSession) -> Principal:
+    """
+    Resolves an access token to the principal it was issued for.
+    Cache hits cost no database query; misses decode the JWT and load the user.
+    Revoked tokens are rejected from the in-memory deny-list in either case.
+    """
+    credentials_exception = _credentials_exception()
+    cached = principal_cache.get(token)
+    if cached is not None:
+        principal, generation, expires_at, jti = cached
+        if jti in revoked_tokens:
+            principal_cache.pop(token)
+            raise credentials_exception
+        if user_invalidations.is_current(principal.id, generation) and expires_at > time.time():
+            return principal
+        principal_cache.pop(token)
+
+    payload = decode_token(token, ACCESS)
+    jti = payload.get("jti")
+    if payload.get("role") is None or jti in revoked_tokens:
         raise credentials_exception
+    token_data = TokenData(username=payload["sub"], role=payload["role"])
 
+    # A user changed while we load them makes this entry stale on its next hit
+    generation = user_invalidations.generation
     result = await db.execute(select(User).filter(User.username == token_data.username))
     user = result.scalars().first()
     if user is None:
         raise credentials_exception
-    return user
+
+    principal = Principal(id=user.id, username=user.username, role=user.role, is_active=bool(user.is_active))
+    principal_cache.set(token, (principal, generation, payload.get("exp", math.inf), jti))
+    return principal
 
 
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+def token_identity(token: str) -> tuple[str, str] | None:
+    """
+    (username, role) of a valid, unrevoked access token, without touching the database.
+    Used to classify requests before they reach a handler; None if the token does not verify.
+    """
+    cached = principal_cache.get(token)
+    if cached is not None:
+        principal, _, expires_at, jti = cached
+        if jti not in revoked_tokens and expires_at > time.time():
+            return principal.username, principal.role.value
+    try:
+        payload = decode_token(token, ACCESS)
+    except HTTPException:
+        return None
+    if payload.get("role") is None or payload.get("jti") in revoked_tokens:
+        return None
+    return payload["sub"], payload["role"]
+
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme),
+                           db: AsyncSession = Depends(get_db)) -> Principal:
+    """
+    Dependency to get the current authenticated user from a JWT.
+    The result is kept in the request context so the token is resolved at most once per request.
+    """
+    context = get_request_context(request)
+    if context.principal is not None and context.token == token:
+        return context.principal
+    principal = await resolve_principal(token, db)
+    context.token, context.principal = token, principal
+    return principal
+
+
+def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Dependency to get the current active authenticated user."""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
-def get_current_active_admin(current_user: User = Depends(get_current_active_user)) -> User:
+def get_current_active_admin(current_user: Principal = Depends(get_current_active_user)) -> Principal:
     """Dependency for Admin role-based access control."""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized to perform this action. Admin role required.")
     return current_user
 
 
-def get_current_active_police_or_admin(current_user: User = Depends(get_current_active_user)) -> User:
+def get_current_active_police(current_user: Principal = Depends(get_current_active_user)) -> Principal:
+    """Dependency for Police role-based access control."""
+    if current_user.role != UserRole.POLICE:
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action. Police role required.")
+    return current_user
+
+
+def get_current_active_police_or_admin(current_user: Principal = Depends(get_current_active_user)) -> Principal:
     """Dependency for Police or Admin role-based access control."""
     if current_user.role not in [UserRole.POLICE, UserRole.ADMIN]:
         raise HTTPException(status_code=403,
@@ -85,9 +385,29 @@ def get_current_active_police_or_admin(current_user: User = Depends(get_current_
     return current_user
 
 
-def get_current_active_cybersecurity(current_user: User = Depends(get_current_active_user)) -> User:
+def get_current_active_cybersecurity(current_user: Principal = Depends(get_current_active_user)) -> Principal:
     """Dependency for Cybersecurity role-based access control."""
     if current_user.role != UserRole.CYBERSECURITY:
         raise HTTPException(status_code=403,
                             detail="Not authorized to perform this action. Cybersecurity role required.")
     return current_user
+
+
+def _mark_user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_user_ids", set()).add(target.id)
+
+
+event.listen(User, "after_update", _mark_user_changed)
+event.listen(User, "after_delete", _mark_user_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_users_after_commit(session):
+    user_invalidations.invalidate(session.info.pop("changed_user_ids", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_users_after_rollback(session):
+    session.info.pop("changed_user_ids", None)
@@ -0,0 +1,115 @@
+# Filename: app/services/events.py
+import asyncpg
+from datetime import datetime
+from app.core.config import settings
+from app.core.geometry import point_coordinates
+from app.core.pubsub import Broker, InMemoryBackend, PostgresNotifyBackend
+from typing import List
+
+ALERTS_CHANNEL = "alerts"
+AUTH_CHANNEL = "auth"
+TOURISTS_CHANNEL = "tourists"
+
+ALERT_CREATED = "alert.created"
+ALERT_ACKNOWLEDGED = "alert.acknowledged"
+ALERT_CLOSED = "alert.closed"
+GEOFENCE_ENTER = "geofence.enter"
+GEOFENCE_EXIT = "geofence.exit"
+TOKEN_REVOKED = "token.revoked"
+USERS_CHANGED = "user.changed"
+PROFILES_CHANGED = "tourist.profiles_changed"
+
+
+def _connect_listener():
+    return asyncpg.connect(
+        user=settings.POSTGRES_USER,
+        password=settings.POSTGRES_PASSWORD,
+        host=settings.POSTGRES_SERVER,
+        port=settings.POSTGRES_PORT,
+        database=settings.POSTGRES_DB,
+    )
+
+
+if settings.EVENT_BACKEND == "postgres":
+    event_broker = Broker(PostgresNotifyBackend(_connect_listener), settings.EVENT_SUBSCRIBER_QUEUE_SIZE)
+else:
+    event_broker = Broker(InMemoryBackend(), settings.EVENT_SUBSCRIBER_QUEUE_SIZE)
+
+
+def _isoformat(value) -> str | None:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _get(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def alert_event(event_type: str, alert) -> dict:
+    """Builds a JSON-ready event payload from an alert ORM object or row dict."""
+    location = _get(alert, "location")
+    coordinates = tuple(location["coordinates"]) if isinstance(location, dict) else point_coordinates(location)
+    status = _get(alert, "status")
+    return {
+        "type": event_type,
+        "alert_id": _get(alert, "id"),
+        "tourist_id": _get(alert, "tourist_id"),
+        "status": getattr(status, "value", status),
+        "message": _get(alert, "message"),
+        "acknowledged_by": _get(alert, "acknowledged_by"),
+        "timestamp": _isoformat(_get(alert, "timestamp")),
+        "longitude": coordinates[0] if coordinates else None,
+        "latitude": coordinates[1] if coordinates else None,
+    }
+
+
+async def publish_alert_event(event_type: str, alert):
+    """Broadcasts an alert lifecycle event to subscribed dashboards."""
+    await event_broker.publish(ALERTS_CHANNEL, alert_event(event_type, alert))
+
+
+async def publish_geofence_transition(transition: dict):
+    """Broadcasts a confirmed geo-fence enter/exit of a tourist."""
+    zone_type = transition["zone_type"]
+    await event_broker.publish(ALERTS_CHANNEL, {
+        "type": GEOFENCE_ENTER if transition["transition"] == "enter" else GEOFENCE_EXIT,
+        "tourist_id": transition["tourist_id"],
+        "fence_id": transition["fence_id"],
+        "fence_name": transition["fence_name"],
+        "zone_type": getattr(zone_type, "value", zone_type),
+        "timestamp": _isoformat(transition["timestamp"]),
+        "longitude": transition["longitude"],
+        "latitude": transition["latitude"],
+    })
+
+
+async def publish_token_revocation(jti: str, expires_at: float):
+    """Tells every worker that an access token was revoked before its expiry (unix seconds)."""
+    await event_broker.publish(AUTH_CHANNEL, {"type": TOKEN_REVOKED, "jti": jti, "expires_at": expires_at})
+
+
+async def publish_user_invalidation(user_ids: List[int]):
+    """Tells every worker that these users changed, so their cached principals are stale."""
+    await event_broker.publish(AUTH_CHANNEL, {"type": USERS_CHANGED, "user_ids": user_ids})
+
+
+async def publish_profile_invalidation(tourist_ids: List[int]):
+    """Tells every worker to drop its cached copies of these tourist profiles."""
+    await event_broker.publish(TOURISTS_CHANNEL, {"type": PROFILES_CHANGED, "tourist_ids": tourist_ids})
+
+
+def bbox_filter(min_lon: float | None, min_lat: float | None, max_lon: float | None, max_lat: float | None):
+    """
+    Returns a subscription predicate that keeps events located inside the box,
+    or None if no box was requested. Events without a location always pass.
+    """
+    if None in (min_lon, min_lat, max_lon, max_lat):
+        return None
+
+    def predicate(message: dict) -> bool:
+        lon = message.get("longitude")
+        lat = message.get("latitude")
+        if lon is None or lat is None:
+            return True
+        return min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
+
+    return predicate
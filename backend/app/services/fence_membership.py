@@ -0,0 +1,142 @@
+# Filename: app/services/fence_membership.py
+import logging
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.tourist import ZoneType
+from app.services import events
+from app.services.alert import create_geofence_alerts
+from app.services.geofence import GeoFenceIndex
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+ENTER = "enter"
+EXIT = "exit"
+
+
+class FenceMembership:
+    """Confirmed fence membership of one tourist plus a pending change awaiting confirmation."""
+    __slots__ = ("confirmed", "candidate", "candidate_since", "candidate_fixes")
+
+    def __init__(self, confirmed: frozenset, candidate: frozenset | None = None, candidate_since: float = 0.0,
+                 candidate_fixes: int = 0):
+        self.confirmed = confirmed
+        self.candidate = candidate
+        self.candidate_since = candidate_since
+        self.candidate_fixes = candidate_fixes
+
+    @classmethod
+    def from_json(cls, data: dict | None) -> "FenceMembership | None":
+        """Decodes the `Tourist.fence_membership` column; None if the tourist has no baseline yet."""
+        if not data:
+            return None
+        candidate = data.get("candidate")
+        return cls(frozenset(data["confirmed"]), None if candidate is None else frozenset(candidate),
+                   data.get("since", 0.0), data.get("fixes", 0))
+
+    def to_json(self) -> dict:
+        return {
+            "confirmed": sorted(self.confirmed),
+            "candidate": None if self.candidate is None else sorted(self.candidate),
+            "since": self.candidate_since,
+            "fixes": self.candidate_fixes,
+        }
+
+
+class FenceMembershipTracker:
+    """
+    Turns location fixes into geo-fence enter/exit transitions.
+
+    A fix only changes a tourist's confirmed membership once the new membership has been
+    observed for `min_fixes` consecutive fixes spanning at least `dwell_seconds`. Points
+    within `hysteresis_m` meters of a fence edge keep their current membership for that
+    fence, so a tourist walking along a boundary does not flap in and out.
+
+    The tracker holds no per-tourist state: callers load the membership from the tourist
+    row and write the returned one back in the same commit as the transitions. Every worker
+    thus continues from the same state, and a failed commit leaves it unchanged.
+    """
+
+    def __init__(self, dwell_seconds: float, min_fixes: int, hysteresis_m: float):
+        self.dwell_seconds = dwell_seconds
+        self.min_fixes = min_fixes
+        self.hysteresis_m = hysteresis_m
+
+    def observe(self, state: FenceMembership | None, longitude: float, latitude: float, timestamp: float,
+                index: GeoFenceIndex) -> tuple[FenceMembership, List[tuple]]:
+        """
+        Feeds one fix (timestamp in unix seconds) to a tourist's membership and returns the new
+        membership with the confirmed transitions as (ENTER|EXIT, CompiledFence) pairs. The first
+        fix of a tourist only sets a baseline. `state` is not modified.
+        """
+        inside = {fence.id for fence in index.containing(longitude, latitude)}
+        if state is None:
+            return FenceMembership(frozenset(inside)), []
+
+        # Fences deleted since the last fix silently leave the membership set
+        confirmed = frozenset(fid for fid in state.confirmed if fid in index.fences)
+        observed = set(inside)
+        for fence_id in confirmed ^ inside:
+            fence = index.fences[fence_id]
+            if fence.boundary_distance_m(longitude, latitude) < self.hysteresis_m:
+                # Too close to the edge to tell: keep the current membership for this fence
+                if fence_id in confirmed:
+                    observed.add(fence_id)
+                else:
+                    observed.discard(fence_id)
+        observed = frozenset(observed)
+
+        if observed == confirmed:
+            return FenceMembership(confirmed), []
+        if observed == state.candidate:
+            pending = FenceMembership(confirmed, observed, state.candidate_since, state.candidate_fixes + 1)
+        else:
+            pending = FenceMembership(confirmed, observed, timestamp, 1)
+        if pending.candidate_fixes < self.min_fixes or timestamp - pending.candidate_since < self.dwell_seconds:
+            return pending, []
+
+        transitions = [(ENTER, index.fences[fid]) for fid in observed - confirmed]
+        transitions += [(EXIT, index.fences[fid]) for fid in confirmed - observed]
+        return FenceMembership(observed), transitions
+
+
+membership_tracker = FenceMembershipTracker(
+    dwell_seconds=settings.GEOFENCE_DWELL_SECONDS,
+    min_fixes=settings.GEOFENCE_MIN_FIXES,
+    hysteresis_m=settings.GEOFENCE_HYSTERESIS_METERS,
+)
+
+
+def raises_alert(transition: str, zone_type: ZoneType) -> bool:
+    """Leaving a safe zone or entering a restricted zone is a violation."""
+    return (transition == EXIT) == (zone_type == ZoneType.SAFE)
+
+
+def transition_record(tourist_id: int, transition: str, fence, longitude: float, latitude: float,
+                      timestamp: datetime) -> dict:
+    return {
+        "tourist_id": tourist_id,
+        "fence_id": fence.id,
+        "fence_name": fence.name,
+        "zone_type": fence.zone_type,
+        "transition": transition,
+        "longitude": longitude,
+        "latitude": latitude,
+        "timestamp": timestamp,
+    }
+
+
+async def record_transitions(db: AsyncSession, transitions: List[dict]) -> List[dict]:
+    """
+    Raises an EmergencyAlert for each violation among the transitions, commits the session
+    and then broadcasts the transitions and new alerts. Returns the violations.
+    """
+    violations = [t for t in transitions if raises_alert(t["transition"], t["zone_type"])]
+    alerts = await create_geofence_alerts(db, violations) if violations else []
+    await db.commit()
+    for transition in transitions:
+        await events.publish_geofence_transition(transition)
+    for alert in alerts:
+        await events.publish_alert_event(events.ALERT_CREATED, alert)
+    return violations
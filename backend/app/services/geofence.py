@@ -0,0 +1,486 @@
+# Filename: app/services/geofence.py
+import asyncio
+import json
+import math
+import time
+from fastapi import HTTPException, status
+from sqlalchemy import select, event, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from geoalchemy2.functions import ST_AsGeoJSON
+from app.core.config import settings
+from app.models.tourist import GeoFence, ZoneType
+from app.schemas.tourist import GeoFenceCreate, GeoFenceUpdate, GeoFenceFeatureCollection
+from typing import Dict, List, Tuple
+
+# Key for the advisory lock that serializes fence writes, so revisions are assigned in commit order
+_FENCE_WRITE_LOCK = 0x6765_6f66
+
+
+class CompiledFence:
+    """
+    A geo-fence polygon held in memory as flat coordinate tuples,
+    ready for point-in-polygon tests without touching the database.
+    """
+    __slots__ = ("id", "name", "zone_type", "sensitivity", "bbox", "rings")
+
+    def __init__(self, fence_id: int, name: str, zone_type: ZoneType, rings: List[Tuple[tuple, tuple]],
+                 sensitivity: float = 0.0):
+        self.id = fence_id
+        self.name = name
+        self.zone_type = zone_type
+        self.sensitivity = sensitivity
+        # rings[0] is the exterior ring, the rest are holes; each ring is (xs, ys)
+        self.rings = rings
+        xs, ys = rings[0]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    def contains(self, x: float, y: float) -> bool:
+        """Returns True if the point lies inside the exterior ring and outside every hole."""
+        min_x, min_y, max_x, max_y = self.bbox
+        if x < min_x or x > max_x or y < min_y or y > max_y:
+            return False
+        if not _point_in_ring(x, y, *self.rings[0]):
+            return False
+        for hole in self.rings[1:]:
+            if _point_in_ring(x, y, *hole):
+                return False
+        return True
+
+    def boundary_distance_m(self, x: float, y: float) -> float:
+        """Approximate distance in meters from the point to the nearest polygon edge."""
+        # Local equirectangular projection, accurate enough at geo-fence scale
+        kx = 111320.0 * math.cos(math.radians(y))
+        ky = 110540.0
+        best = math.inf
+        for xs, ys in self.rings:
+            for i in range(len(xs) - 1):
+                ax, ay = (xs[i] - x) * kx, (ys[i] - y) * ky
+                bx, by = (xs[i + 1] - x) * kx, (ys[i + 1] - y) * ky
+                dx, dy = bx - ax, by - ay
+                length_sq = dx * dx + dy * dy
+                t = 0.0 if length_sq == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / length_sq))
+                best = min(best, math.hypot(ax + t * dx, ay + t * dy))
+        return best
+
+
+def _point_in_ring(x: float, y: float, xs: tuple, ys: tuple) -> bool:
+    """Even-odd ray casting test of a point against a single closed ring."""
+    inside = False
+    j = len(xs) - 1
+    for i in range(len(xs)):
+        yi = ys[i]
+        yj = ys[j]
+        if (yi > y) != (yj > y):
+            xi = xs[i]
+            if x < (xs[j] - xi) * (y - yi) / (yj - yi) + xi:
+                inside = not inside
+        j = i
+    return inside
+
+
+def compile_fence(fence_id: int, name: str, zone_type: ZoneType, geometry: dict,
+                  sensitivity: float = 0.0) -> CompiledFence | None:
+    """Builds a CompiledFence from a GeoJSON Polygon geometry."""
+    if not geometry or geometry.get("type") != "Polygon" or not geometry.get("coordinates"):
+        return None
+    rings = []
+    for ring in geometry["coordinates"]:
+        rings.append((tuple(float(p[0]) for p in ring), tuple(float(p[1]) for p in ring)))
+    return CompiledFence(fence_id, name, zone_type, rings, sensitivity)
+
+
+class GeoFenceIndex:
+    """
+    Uniform grid index over compiled geo-fences.
+    A point lookup only tests the fences registered in its grid cell, so the
+    cost of a containment check depends on local fence density rather than
+    on the total number of fences.
+    """
+
+    def __init__(self, cell_size: float, max_cells_per_fence: int = 4096):
+        self.cell_size = cell_size
+        self.max_cells_per_fence = max_cells_per_fence
+        self.fences: Dict[int, CompiledFence] = {}
+        # Highest fence revision applied so far; None until the first full load
+        self.revision: int | None = None
+        self.refreshed_at = 0.0
+        self.stale = True
+        # Bounding boxes touched by incremental fence changes, drained by the safety score engine
+        self.changed_regions: List[tuple] = []
+        self._cells: Dict[Tuple[int, int], List[CompiledFence]] = {}
+        # Fences too large to register cell by cell are only bbox-filtered
+        self._oversized: List[CompiledFence] = []
+
+    def _cell_range(self, bbox: tuple) -> Tuple[int, int, int, int]:
+        min_x, min_y, max_x, max_y = bbox
+        size = self.cell_size
+        return (math.floor(min_x / size), math.floor(min_y / size),
+                math.floor(max_x / size), math.floor(max_y / size))
+
+    def add(self, fence: CompiledFence):
+        """Registers a fence, replacing any previous fence with the same id."""
+        if fence.id in self.fences:
+            self.remove(fence.id)
+        self.fences[fence.id] = fence
+        cx0, cy0, cx1, cy1 = self._cell_range(fence.bbox)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > self.max_cells_per_fence:
+            self._oversized.append(fence)
+            return
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self._cells.setdefault((cx, cy), []).append(fence)
+
+    def remove(self, fence_id: int):
+        """Unregisters a fence if it is present."""
+        fence = self.fences.pop(fence_id, None)
+        if fence is None:
+            return
+        if fence in self._oversized:
+            self._oversized.remove(fence)
+            return
+        cx0, cy0, cx1, cy1 = self._cell_range(fence.bbox)
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = self._cells.get((cx, cy))
+                if bucket is None:
+                    continue
+                bucket.remove(fence)
+                if not bucket:
+                    del self._cells[(cx, cy)]
+
+    def clear(self):
+        """Drops every registered fence."""
+        self.fences.clear()
+        self._cells.clear()
+        self._oversized.clear()
+
+    def candidates(self, x: float, y: float) -> List[CompiledFence]:
+        """Returns the fences whose grid cells cover the given point."""
+        key = (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+        bucket = self._cells.get(key, [])
+        if self._oversized:
+            return bucket + self._oversized
+        return bucket
+
+    def containing(self, x: float, y: float) -> List[CompiledFence]:
+        """Returns every fence that contains the point (longitude, latitude)."""
+        return [fence for fence in self.candidates(x, y) if fence.contains(x, y)]
+
+    def invalidate(self):
+        """Marks the index for a refresh on its next use."""
+        self.stale = True
+
+    def needs_refresh(self) -> bool:
+        return (self.revision is None or self.stale
+                or time.monotonic() - self.refreshed_at >= settings.GEOFENCE_REFRESH_SECONDS)
+
+
+fence_index = GeoFenceIndex(settings.GEOFENCE_GRID_CELL_DEGREES)
+_reload_lock = asyncio.Lock()
+
+
+async def refresh_fence_index(db: AsyncSession):
+    """
+    Applies fence changes newer than the index's revision: changed fences are
+    recompiled and deleted ones removed. The first call loads every live fence.
+    """
+    full = fence_index.revision is None
+    stmt = select(GeoFence.id, GeoFence.name, GeoFence.zone_type, GeoFence.sensitivity, GeoFence.is_deleted,
+                  GeoFence.revision, ST_AsGeoJSON(GeoFence.area))
+    if full:
+        stmt = stmt.filter(GeoFence.is_deleted.is_(False))
+    else:
+        stmt = stmt.filter(GeoFence.revision > fence_index.revision)
+    fence_index.stale = False
+    result = await db.execute(stmt)
+
+    if full:
+        fence_index.clear()
+    revision = fence_index.revision or 0
+    for fence_id, name, zone_type, sensitivity, is_deleted, fence_revision, area in result.all():
+        revision = max(revision, fence_revision)
+        compiled = None if is_deleted else compile_fence(fence_id, name, zone_type,
+                                                         json.loads(area) if area else None, sensitivity)
+        if not full:
+            previous = fence_index.fences.get(fence_id)
+            fence_index.changed_regions.extend(f.bbox for f in (previous, compiled) if f is not None)
+        if compiled is None:
+            fence_index.remove(fence_id)
+        else:
+            fence_index.add(compiled)
+    fence_index.revision = revision
+    fence_index.refreshed_at = time.monotonic()
+
+
+async def get_fence_index(db: AsyncSession) -> GeoFenceIndex:
+    """
+    Returns the fence index, first applying pending fence changes if a local commit
+    touched a fence or the refresh interval has elapsed.
+    """
+    if fence_index.needs_refresh():
+        async with _reload_lock:
+            if fence_index.needs_refresh():
+                await refresh_fence_index(db)
+    return fence_index
+
+
+def _invalid(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def _simplify_ring(ring: List[list], tolerance: float) -> List[list]:
+    """Douglas-Peucker simplification of a closed ring, never below four positions."""
+    if tolerance <= 0 or len(ring) <= 4:
+        return ring
+    keep = [False] * len(ring)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(ring) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = ring[first][:2], ring[last][:2]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+        max_dist, index = -1.0, None
+        for i in range(first + 1, last):
+            px, py = ring[i][0], ring[i][1]
+            if length_sq == 0:
+                dist = math.hypot(px - x1, py - y1)
+            else:
+                t = max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length_sq))
+                dist = math.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if index is not None and max_dist > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    simplified = [point for point, kept in zip(ring, keep) if kept]
+    return simplified if len(simplified) >= 4 else ring
+
+
+def validate_polygon(geometry: dict) -> dict:
+    """
+    Validates a GeoJSON Polygon and returns a cleaned copy with closed,
+    simplified 2D rings. Invalid input is rejected with a 400.
+    """
+    if not isinstance(geometry, dict) or geometry.get("type") != "Polygon":
+        raise _invalid("Geo-fence geometry must be a GeoJSON Polygon.")
+    rings = geometry.get("coordinates")
+    if not isinstance(rings, list) or not rings:
+        raise _invalid("Polygon has no coordinates.")
+    cleaned = []
+    vertices = 0
+    for ring in rings:
+        try:
+            points = [[float(p[0]), float(p[1])] for p in ring]
+        except (TypeError, ValueError, IndexError):
+            raise _invalid("Polygon positions must be [longitude, latitude] pairs.")
+        if any(not (-180 <= x <= 180 and -90 <= y <= 90) for x, y in points):
+            raise _invalid("Polygon coordinates are outside the valid longitude/latitude range.")
+        if points and points[0] != points[-1]:
+            points.append(list(points[0]))
+        if len(points) < 4:
+            raise _invalid("Each polygon ring needs at least three distinct positions.")
+        points = _simplify_ring(points, settings.GEOFENCE_SIMPLIFY_TOLERANCE_DEGREES)
+        area = sum(points[i][0] * points[i + 1][1] - points[i + 1][0] * points[i][1] for i in range(len(points) - 1))
+        if area == 0:
+            raise _invalid("Polygon ring has zero area.")
+        vertices += len(points)
+        cleaned.append(points)
+    if vertices > settings.GEOFENCE_MAX_VERTICES:
+        raise _invalid(f"Polygon has more than {settings.GEOFENCE_MAX_VERTICES} vertices after simplification.")
+    return {"type": "Polygon", "coordinates": cleaned}
+
+
+def _area_values(geometry: dict) -> dict:
+    """Column values for a validated polygon: the geometry plus its precomputed bounding box."""
+    xs = [p[0] for p in geometry["coordinates"][0]]
+    ys = [p[1] for p in geometry["coordinates"][0]]
+    return {
+        "area": func.ST_SetSRID(func.ST_GeomFromGeoJSON(json.dumps(geometry)), 4326),
+        "min_lon": min(xs), "min_lat": min(ys), "max_lon": max(xs), "max_lat": max(ys),
+    }
+
+
+async def _lock_fence_writes(db: AsyncSession):
+    await db.execute(select(func.pg_advisory_xact_lock(_FENCE_WRITE_LOCK)))
+
+
+def _fence_query():
+    return select(
+        GeoFence.id, GeoFence.name, GeoFence.description, GeoFence.zone_type, GeoFence.sensitivity, GeoFence.revision,
+        GeoFence.min_lon, GeoFence.min_lat, GeoFence.max_lon, GeoFence.max_lat,
+        ST_AsGeoJSON(GeoFence.area).label("geojson"),
+    ).filter(GeoFence.is_deleted.is_(False))
+
+
+def _fence_response(row) -> dict:
+    return {
+        "id": row.id,
+        "name": row.name,
+        "description": row.description,
+        "zone_type": row.zone_type,
+        "sensitivity": row.sensitivity,
+        "geojson": json.loads(row.geojson),
+        "bbox": [row.min_lon, row.min_lat, row.max_lon, row.max_lat],
+        "revision": row.revision,
+    }
+
+
+async def get_geofence(db: AsyncSession, fence_id: int) -> dict | None:
+    """Fetches a live geo-fence by ID."""
+    result = await db.execute(_fence_query().filter(GeoFence.id == fence_id))
+    row = result.first()
+    return _fence_response(row) if row else None
+
+
+async def list_geofences(db: AsyncSession, limit: int = 100, after_id: int | None = None,
+                         bbox: tuple | None = None) -> List[dict]:
+    """Fetches one page of live geo-fences in ascending ID order, optionally overlapping a bounding box."""
+    stmt = _fence_query().order_by(GeoFence.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.filter(GeoFence.id > after_id)
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        stmt = stmt.filter(GeoFence.max_lon >= min_lon, GeoFence.min_lon <= max_lon,
+                           GeoFence.max_lat >= min_lat, GeoFence.min_lat <= max_lat)
+    result = await db.execute(stmt)
+    return [_fence_response(row) for row in result.all()]
+
+
+async def get_geofence_revision(db: AsyncSession) -> int:
+    """Returns the highest fence revision, which changes whenever any fence does."""
+    result = await db.execute(select(func.coalesce(func.max(GeoFence.revision), 0)))
+    return result.scalar_one()
+
+
+async def _get_live_fence(db: AsyncSession, fence_id: int) -> GeoFence:
+    result = await db.execute(select(GeoFence).filter(GeoFence.id == fence_id, GeoFence.is_deleted.is_(False)))
+    fence = result.scalars().first()
+    if fence is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Geo-fence not found.")
+    return fence
+
+
+async def _name_taken(db: AsyncSession, name: str, exclude_id: int | None = None) -> bool:
+    stmt = select(GeoFence.id).filter(GeoFence.name == name, GeoFence.is_deleted.is_(False))
+    if exclude_id is not None:
+        stmt = stmt.filter(GeoFence.id != exclude_id)
+    result = await db.execute(stmt)
+    return result.first() is not None
+
+
+async def create_geofence(db: AsyncSession, fence_in: GeoFenceCreate) -> dict:
+    """Creates a geo-fence from a validated, simplified polygon."""
+    geometry = validate_polygon(fence_in.geojson)
+    await _lock_fence_writes(db)
+    if await _name_taken(db, fence_in.name):
+        raise _invalid("A geo-fence with this name already exists.")
+    fence = GeoFence(name=fence_in.name, description=fence_in.description, zone_type=fence_in.zone_type,
+                     sensitivity=fence_in.sensitivity,
+                     **_area_values(geometry))
+    db.add(fence)
+    await db.commit()
+    return await get_geofence(db, fence.id)
+
+
+async def update_geofence(db: AsyncSession, fence_id: int, fence_in: GeoFenceUpdate) -> dict:
+    """Updates a geo-fence's name, description and/or polygon."""
+    geometry = validate_polygon(fence_in.geojson) if fence_in.geojson is not None else None
+    await _lock_fence_writes(db)
+    fence = await _get_live_fence(db, fence_id)
+    if fence_in.name and fence_in.name != fence.name:
+        if await _name_taken(db, fence_in.name, exclude_id=fence_id):
+            raise _invalid("A geo-fence with this name already exists.")
+        fence.name = fence_in.name
+    if fence_in.description is not None:
+        fence.description = fence_in.description
+    if fence_in.zone_type is not None:
+        fence.zone_type = fence_in.zone_type
+    if fence_in.sensitivity is not None:
+        fence.sensitivity = fence_in.sensitivity
+    if geometry is not None:
+        for key, value in _area_values(geometry).items():
+            setattr(fence, key, value)
+    await db.commit()
+    return await get_geofence(db, fence_id)
+
+
+async def delete_geofence(db: AsyncSession, fence_id: int):
+    """Deletes a geo-fence, leaving a tombstone revision for location workers."""
+    await _lock_fence_writes(db)
+    fence = await _get_live_fence(db, fence_id)
+    fence.is_deleted = True
+    await db.commit()
+
+
+async def import_geofences(db: AsyncSession, collection: GeoFenceFeatureCollection) -> dict:
+    """
+    Imports a GeoJSON FeatureCollection in one transaction.
+    Features whose name matches a live fence replace that fence; the rest are created.
+    The whole import is rejected if any feature is invalid.
+    """
+    parsed = {}
+    for position, feature in enumerate(collection.features):
+        properties = feature.get("properties") or {}
+        name = properties.get("name")
+        if not isinstance(name, str) or len(name) < 3:
+            raise _invalid(f"Feature {position} needs a 'name' property of at least 3 characters.")
+        try:
+            zone_type = ZoneType(properties.get("zone_type", ZoneType.SAFE))
+        except ValueError:
+            raise _invalid(f"Feature {position} ({name}): zone_type must be 'safe' or 'restricted'.")
+        sensitivity = properties.get("sensitivity", 0.0)
+        if isinstance(sensitivity, bool) or not isinstance(sensitivity, (int, float)) or not 0 <= sensitivity <= 1:
+            raise _invalid(f"Feature {position} ({name}): sensitivity must be a number between 0 and 1.")
+        try:
+            geometry = validate_polygon(feature.get("geometry"))
+        except HTTPException as exc:
+            raise _invalid(f"Feature {position} ({name}): {exc.detail}")
+        parsed[name] = (properties.get("description"), zone_type, float(sensitivity), geometry)
+
+    await _lock_fence_writes(db)
+    result = await db.execute(
+        select(GeoFence).filter(GeoFence.name.in_(list(parsed)), GeoFence.is_deleted.is_(False))
+    )
+    existing = {fence.name: fence for fence in result.scalars()}
+    created = updated = 0
+    for name, (description, zone_type, sensitivity, geometry) in parsed.items():
+        values = _area_values(geometry)
+        fence = existing.get(name)
+        if fence is None:
+            db.add(GeoFence(name=name, description=description, zone_type=zone_type, sensitivity=sensitivity,
+                            **values))
+            created += 1
+        else:
+            fence.description = description
+            fence.zone_type = zone_type
+            fence.sensitivity = sensitivity
+            for key, value in values.items():
+                setattr(fence, key, value)
+            updated += 1
+    await db.commit()
+    return {"created": created, "updated": updated, "revision": await get_geofence_revision(db)}
+
+
+def _mark_fences_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["geofences_changed"] = True
+
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(GeoFence, _event_name, _mark_fences_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    # Only drop the index once the change is visible to other sessions
+    if session.info.pop("geofences_changed", False):
+        fence_index.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("geofences_changed", None)
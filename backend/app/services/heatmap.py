@@ -0,0 +1,229 @@
+# Filename: app/services/heatmap.py
+import asyncio
+import itertools
+import logging
+import secrets
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from app.core import geohash
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.alert import EmergencyAlert, AlertStatus
+from app.models.tourist import Tourist
+from app.services import events
+from typing import Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+_TOURISTS = 0
+_ALERTS = 1
+
+
+class HeatmapAggregator:
+    """
+    Per-geohash counts of tourists and active alerts at several precisions (zoom levels).
+
+    Counts are adjusted incrementally as tourists move and alerts change status. Every
+    change stamps each enclosing tile with a new version from a single counter, and rendered
+    tiles are cached with that version, so an unchanged tile is served from memory and
+    revalidates with a 304. Tiles without any counts have version 0 and hold no entry, so
+    requests for arbitrary tiles do not grow the version map.
+    Each worker applies the tourist moves it handles itself and alert changes from the
+    event broker; a periodic reseed from the database corrects anything it missed. Changes
+    applied while a reseed is querying are replayed on top of its snapshot.
+    """
+
+    def __init__(self, precisions: Iterable[int], max_tile_depth: int, cache_size: int, reseed_interval: float):
+        self.precisions = sorted(set(precisions))
+        self.finest = self.precisions[-1]
+        self.max_tile_depth = max_tile_depth
+        self.reseed_interval = reseed_interval
+        # Distinguishes this worker's versions from another worker's in ETags
+        self._etag_prefix = secrets.token_hex(4)
+        self._tourist_cells: Dict[int, str] = {}
+        self._alert_cells: Dict[int, str] = {}
+        self._counts: Dict[int, Dict[str, List[int]]] = {p: {} for p in self.precisions}
+        # (precision, tile) -> version; only tiles that have held counts since the last reseed
+        self._versions: Dict[tuple, int] = {}
+        self._clock = itertools.count(1)
+        # (kind, key, cell) changes made while a reseed is in flight, or None
+        self._journal: List[tuple] | None = None
+        self._cache = TTLCache(cache_size, ttl=reseed_interval)
+        self._task: asyncio.Task | None = None
+
+    def stats(self) -> dict:
+        return {
+            "tourists": len(self._tourist_cells),
+            "active_alerts": len(self._alert_cells),
+            "cells": {p: len(cells) for p, cells in self._counts.items()},
+            "versions": len(self._versions),
+            "cache": self._cache.stats(),
+        }
+
+    def _bump(self, precision: int, cell: str):
+        # Every enclosing tile, from the whole world ("") down to the cell itself
+        version = next(self._clock)
+        for length in range(precision + 1):
+            self._versions[(precision, cell[:length])] = version
+
+    def _adjust(self, cell: str, kind: int, delta: int):
+        for precision in self.precisions:
+            key = cell[:precision]
+            counts = self._counts[precision].get(key)
+            if counts is None:
+                counts = self._counts[precision][key] = [0, 0]
+            counts[kind] += delta
+            if counts == [0, 0]:
+                del self._counts[precision][key]
+            self._bump(precision, key)
+
+    def _move(self, cells: Dict[int, str], kind: int, key: int, cell: str | None):
+        if self._journal is not None:
+            self._journal.append((kind, key, cell))
+        previous = cells.get(key)
+        if previous == cell:
+            return
+        if previous is not None:
+            self._adjust(previous, kind, -1)
+        if cell is None:
+            cells.pop(key, None)
+        else:
+            cells[key] = cell
+            self._adjust(cell, kind, 1)
+
+    def move_tourist(self, tourist_id: int, latitude: float, longitude: float):
+        self._move(self._tourist_cells, _TOURISTS, tourist_id, geohash.encode(latitude, longitude, self.finest))
+
+    def set_alert(self, alert_id: int, latitude: float | None, longitude: float | None, active: bool):
+        cell = geohash.encode(latitude, longitude, self.finest) if active and latitude is not None else None
+        self._move(self._alert_cells, _ALERTS, alert_id, cell)
+
+    def apply_event(self, message: dict):
+        """Applies an alert lifecycle event from the broker."""
+        if message.get("alert_id") is None:
+            return
+        self.set_alert(message["alert_id"], message.get("latitude"), message.get("longitude"),
+                       message.get("status") == AlertStatus.ACTIVE.value)
+
+    def load(self, tourists: Dict[int, tuple], alerts: Dict[int, tuple]):
+        """
+        Replaces all state with (latitude, longitude) snapshots, bumping only the tiles whose
+        counts actually changed so that dashboards keep their cached tiles.
+        """
+        old_counts = self._counts
+        self._tourist_cells = {i: geohash.encode(lat, lon, self.finest) for i, (lat, lon) in tourists.items()}
+        self._alert_cells = {i: geohash.encode(lat, lon, self.finest) for i, (lat, lon) in alerts.items()}
+        self._counts = {p: {} for p in self.precisions}
+        for kind, cells in ((_TOURISTS, self._tourist_cells), (_ALERTS, self._alert_cells)):
+            for cell in cells.values():
+                for precision in self.precisions:
+                    counts = self._counts[precision].setdefault(cell[:precision], [0, 0])
+                    counts[kind] += 1
+        for precision in self.precisions:
+            old, new = old_counts[precision], self._counts[precision]
+            for cell in old.keys() | new.keys():
+                if old.get(cell) != new.get(cell):
+                    self._bump(precision, cell)
+        # Tiles that are empty now render the same as never-seen ones, at version 0
+        live = {(precision, cell[:length]) for precision, cells in self._counts.items()
+                for cell in cells for length in range(precision + 1)}
+        self._versions = {key: version for key, version in self._versions.items() if key in live}
+
+    def etag(self, precision: int, tile: str) -> str:
+        return f'W/"{self._etag_prefix}.{precision}.{tile}.{self._versions.get((precision, tile), 0)}"'
+
+    def _cells_in_tile(self, precision: int, tile: str) -> List[str]:
+        counts = self._counts[precision]
+        depth = precision - len(tile)
+        if 32 ** depth < len(counts):
+            candidates = [tile]
+            for _ in range(depth):
+                candidates = [prefix + char for prefix in candidates for char in geohash.BASE32]
+            return [cell for cell in candidates if cell in counts]
+        return sorted(cell for cell in counts if cell.startswith(tile))
+
+    def tile(self, precision: int, tile: str) -> tuple[dict, str]:
+        """Returns the rendered tile and its ETag, from the cache when its version is unchanged."""
+        version = self._versions.get((precision, tile), 0)
+        cached = self._cache.get((precision, tile))
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        counts = self._counts[precision]
+        cells = []
+        for cell in self._cells_in_tile(precision, tile):
+            min_lon, min_lat, max_lon, max_lat = geohash.bounds(cell)
+            cells.append({
+                "geohash": cell,
+                "latitude": (min_lat + max_lat) / 2,
+                "longitude": (min_lon + max_lon) / 2,
+                "tourists": counts[cell][_TOURISTS],
+                "active_alerts": counts[cell][_ALERTS],
+            })
+        body = {"precision": precision, "tile": tile, "version": version, "cells": cells}
+        etag = self.etag(precision, tile)
+        self._cache.set((precision, tile), (version, body, etag))
+        return body, etag
+
+    async def seed(self, db: AsyncSession):
+        """
+        Loads current tourist locations and active alerts from the database, then replays the
+        moves and alert changes applied meanwhile, which the snapshot may predate.
+        """
+        self._journal = []
+        try:
+            tourists = await db.execute(
+                select(Tourist.id, func.ST_Y(Tourist.last_location), func.ST_X(Tourist.last_location))
+                .filter(Tourist.last_location.is_not(None))
+            )
+            alerts = await db.execute(
+                select(EmergencyAlert.id, func.ST_Y(EmergencyAlert.location), func.ST_X(EmergencyAlert.location))
+                .filter(EmergencyAlert.status == AlertStatus.ACTIVE)
+            )
+        finally:
+            journal, self._journal = self._journal, None
+        self.load({row[0]: (row[1], row[2]) for row in tourists},
+                  {row[0]: (row[1], row[2]) for row in alerts})
+        for kind, key, cell in journal:
+            self._move(self._tourist_cells if kind == _TOURISTS else self._alert_cells, kind, key, cell)
+
+    async def start(self):
+        """Subscribes to alert events and starts the periodic reseed (seeding immediately)."""
+        if self._task is not None:
+            return
+        subscription = await events.event_broker.subscribe(
+            events.ALERTS_CHANNEL, lambda message: message.get("type", "").startswith("alert."))
+        self._task = asyncio.create_task(self._run(subscription))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self, subscription):
+        reseed = asyncio.create_task(self._run_reseed())
+        try:
+            while True:
+                self.apply_event(await subscription.get())
+        finally:
+            subscription.close()
+            reseed.cancel()
+
+    async def _run_reseed(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.seed(db)
+            except Exception:
+                logger.exception("Failed to reseed the heat map")
+            await asyncio.sleep(self.reseed_interval)
+
+
+heatmap = HeatmapAggregator(
+    precisions=settings.HEATMAP_PRECISIONS,
+    max_tile_depth=settings.HEATMAP_MAX_TILE_DEPTH,
+    cache_size=settings.HEATMAP_CACHE_MAX_ENTRIES,
+    reseed_interval=settings.HEATMAP_RESEED_SECONDS,
+)
@@ -0,0 +1,226 @@
+# Filename: app/services/location_history.py
+import asyncio
+import logging
+from collections import defaultdict
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, select, delete, func
+from datetime import datetime, timezone, timedelta
+from app.core.config import settings
+from app.core.trackcodec import COORDINATE_SCALE, TrackPoint, to_track_point, encode_track, decode_track, \
+    downsample_track
+from app.database import AsyncSessionLocal
+from app.models.tourist import LocationSegment
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+_DAY_MS = 86_400_000
+# Key for the advisory lock held by the worker downsampling a batch of segments
+_COMPACTION_LOCK = 0x6c6f_6368
+
+
+def _to_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def _from_ms(value: int) -> datetime:
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+
+
+def _segment_rows(tourist_id: int, points: List[TrackPoint], max_points: int, resolution_seconds: int = 0) -> List[dict]:
+    """Splits time-ordered points into encoded LocationSegment rows of at most `max_points` each."""
+    rows = []
+    for i in range(0, len(points), max_points):
+        chunk = points[i:i + max_points]
+        rows.append({
+            "tourist_id": tourist_id,
+            "start_time": _from_ms(chunk[0][0]),
+            "end_time": _from_ms(chunk[-1][0]),
+            "point_count": len(chunk),
+            "resolution_seconds": resolution_seconds,
+            "payload": encode_track(chunk),
+        })
+    return rows
+
+
+class LocationHistoryWriter:
+    """
+    Buffers location fixes per tourist and periodically writes them as delta-encoded
+    segments with one multi-row INSERT, so Postgres sees one row per tourist per flush
+    instead of one per ping. A second loop downsamples and expires old segments.
+    When the buffer is full and cannot be flushed, new fixes are dropped and counted.
+    """
+
+    def __init__(self, flush_interval: float, max_buffered: int, segment_max_points: int, compact_interval: float):
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.segment_max_points = segment_max_points
+        self.compact_interval = compact_interval
+        self.buffered = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._buffers: Dict[int, List[TrackPoint]] = defaultdict(list)
+        self._flush_requested: asyncio.Event | None = None
+        self._tasks: List[asyncio.Task] = []
+
+    def append(self, tourist_id: int, timestamp: datetime, latitude: float, longitude: float):
+        """Buffers one fix without waiting."""
+        if self.buffered >= self.max_buffered:
+            self.dropped += 1
+            return
+        self._buffers[tourist_id].append(to_track_point(_to_ms(timestamp), latitude, longitude))
+        self.buffered += 1
+        if self.buffered >= self.max_buffered and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    def pending(self, tourist_id: int) -> List[TrackPoint]:
+        """Returns the fixes of a tourist that have not been written yet."""
+        return list(self._buffers.get(tourist_id, ()))
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self.buffered,
+            "tourists": len(self._buffers),
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+    def start(self):
+        """Starts the flush and compaction loops on the running event loop."""
+        if self._tasks:
+            return
+        self._flush_requested = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run_flush()), asyncio.create_task(self._run_compaction())]
+
+    async def stop(self):
+        """Stops the background loops and writes whatever is still buffered."""
+        if not self._tasks:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._flush_requested = None
+        await self.flush()
+
+    async def flush(self):
+        """Writes all buffered fixes as one segment per tourist (split at the segment size limit)."""
+        if not self._buffers:
+            return
+        buffers, self._buffers = self._buffers, defaultdict(list)
+        count, self.buffered = self.buffered, 0
+        rows = []
+        for tourist_id, points in buffers.items():
+            points.sort()
+            rows.extend(_segment_rows(tourist_id, points, self.segment_max_points))
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(LocationSegment).values(rows))
+                await db.commit()
+            self.written += count
+        except Exception:
+            self.failed += count
+            logger.exception("Failed to write %d location history points", count)
+
+    async def _run_flush(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def _run_compaction(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await compact_location_history(db)
+            except Exception:
+                logger.exception("Location history compaction failed")
+
+
+location_history = LocationHistoryWriter(
+    flush_interval=settings.LOCATION_HISTORY_FLUSH_SECONDS,
+    max_buffered=settings.LOCATION_HISTORY_MAX_BUFFERED_POINTS,
+    segment_max_points=settings.LOCATION_HISTORY_SEGMENT_MAX_POINTS,
+    compact_interval=settings.LOCATION_HISTORY_COMPACT_SECONDS,
+)
+
+
+async def get_location_track(db: AsyncSession, tourist_id: int, since: datetime, until: datetime,
+                             interval_seconds: int = 0) -> List[dict]:
+    """
+    Returns a tourist's fixes in [since, until), oldest first, including fixes not yet flushed
+    by this worker. With `interval_seconds`, only the last fix of each interval is kept.
+    """
+    since_ms, until_ms = _to_ms(since), _to_ms(until)
+    result = await db.execute(
+        select(LocationSegment.payload)
+        .filter(LocationSegment.tourist_id == tourist_id,
+                LocationSegment.start_time < until,
+                LocationSegment.end_time >= since)
+        .order_by(LocationSegment.start_time)
+    )
+    points = [point for payload in result.scalars() for point in decode_track(payload)]
+    points.extend(location_history.pending(tourist_id))
+    points = sorted(point for point in points if since_ms <= point[0] < until_ms)
+    points = downsample_track(points, interval_seconds * 1000)
+    return [
+        {"timestamp": _from_ms(ts), "latitude": lat / COORDINATE_SCALE, "longitude": lon / COORDINATE_SCALE}
+        for ts, lat, lon in points
+    ]
+
+
+async def compact_location_history(db: AsyncSession, batch_size: int = 500) -> dict:
+    """
+    Applies the retention policy: deletes segments past LOCATION_HISTORY_RETENTION_DAYS and
+    merges raw segments older than LOCATION_HISTORY_DOWNSAMPLE_AFTER_HOURS into one
+    downsampled segment per tourist and day, so old history is bounded by the bucket
+    width rather than the ping rate.
+
+    Each downsampling batch is selected and replaced under a transaction-level advisory lock;
+    a worker that finds it taken leaves the remaining segments to the worker holding it.
+    """
+    now = datetime.now(timezone.utc)
+    resolution = settings.LOCATION_HISTORY_DOWNSAMPLE_SECONDS
+    expired = await db.execute(
+        delete(LocationSegment)
+        .where(LocationSegment.end_time < now - timedelta(days=settings.LOCATION_HISTORY_RETENTION_DAYS))
+    )
+    await db.commit()
+
+    downsampled = 0
+    cutoff = now - timedelta(hours=settings.LOCATION_HISTORY_DOWNSAMPLE_AFTER_HOURS)
+    while True:
+        if not (await db.execute(select(func.pg_try_advisory_xact_lock(_COMPACTION_LOCK)))).scalar():
+            await db.rollback()
+            break
+        result = await db.execute(
+            select(LocationSegment.id, LocationSegment.tourist_id, LocationSegment.payload)
+            .filter(LocationSegment.resolution_seconds == 0, LocationSegment.end_time < cutoff)
+            .order_by(LocationSegment.tourist_id, LocationSegment.start_time)
+            .limit(batch_size)
+        )
+        segments = result.all()
+        if not segments:
+            break
+
+        days = defaultdict(list)
+        for segment in segments:
+            for point in decode_track(segment.payload):
+                days[(segment.tourist_id, point[0] // _DAY_MS)].append(point)
+        rows = []
+        for (tourist_id, _), points in days.items():
+            points = downsample_track(sorted(points), resolution * 1000)
+            rows.extend(_segment_rows(tourist_id, points, settings.LOCATION_HISTORY_SEGMENT_MAX_POINTS, resolution))
+
+        await db.execute(delete(LocationSegment).where(LocationSegment.id.in_([s.id for s in segments])))
+        await db.execute(insert(LocationSegment).values(rows))
+        await db.commit()
+        downsampled += len(segments)
+
+    return {"expired_segments": expired.rowcount, "downsampled_segments": downsampled}
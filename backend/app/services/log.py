@@ -1,35 +1,165 @@
 # Filename: app/services/log.py
+import asyncio
 import csv
 import json
 import io
+import logging
+import zlib
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import insert, select, func
-from datetime import datetime
+from datetime import datetime, timezone
+from app.core.config import settings
+from app.database import AsyncSessionLocal
 from app.models.log import AccessLog, FailedLoginAttempt
-from typing import List
+from typing import AsyncIterator, List
+
+logger = logging.getLogger(__name__)
+
+
+class LogSink:
+    """
+    Background writer for rows of a log table.
+    Rows are buffered in a bounded queue and written with one multi-row INSERT
+    per batch, once the batch is full or the flush interval has elapsed.
+    When the queue is full new rows are dropped and counted instead of
+    blocking the request that produced them.
+    """
+
+    def __init__(self, model, max_queue_size: int, batch_size: int, flush_interval: float):
+        self.model = model
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._queue: asyncio.Queue | None = None
+        self._closing: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing.is_set()
+
+    def start(self):
+        """Starts the background writer on the running event loop."""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._closing = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops accepting rows and waits until everything queued has been written."""
+        if self._task is None:
+            return
+        self._closing.set()
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def submit(self, row: dict) -> bool:
+        """Queues a row without waiting. Returns False if the sink is not running."""
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(row)
+            self.enqueued += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+        return True
+
+    def stats(self) -> dict:
+        """Returns the sink's counters and current queue depth."""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+    async def _run(self):
+        running = True
+        while running:
+            row = await self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            # Give a partial batch time to fill up before paying for a round trip
+            if self._queue.qsize() < self.batch_size and not self._closing.is_set():
+                try:
+                    await asyncio.wait_for(self._closing.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if row is None:
+                    running = False
+                    break
+                batch.append(row)
+            await self._write(batch)
+
+    async def _write(self, rows: List[dict]):
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(self.model).values(rows))
+                await db.commit()
+            self.written += len(rows)
+        except Exception:
+            self.failed += len(rows)
+            logger.exception("Failed to write %d %s rows", len(rows), self.model.__tablename__)
+
+
+access_log_sink = LogSink(
+    AccessLog,
+    max_queue_size=settings.ACCESS_LOG_QUEUE_SIZE,
+    batch_size=settings.ACCESS_LOG_BATCH_SIZE,
+    flush_interval=settings.ACCESS_LOG_FLUSH_INTERVAL_SECONDS,
+)
+failed_login_sink = LogSink(
+    FailedLoginAttempt,
+    max_queue_size=settings.ACCESS_LOG_QUEUE_SIZE,
+    batch_size=settings.ACCESS_LOG_BATCH_SIZE,
+    flush_interval=settings.ACCESS_LOG_FLUSH_INTERVAL_SECONDS,
+)
 
 
 async def create_access_log(db: AsyncSession, user_id: int | None, endpoint: str, method: str, is_successful: bool,
                             role: str):
-    """Logs an API access event."""
-    stmt = insert(AccessLog).values(
+    """
+    Logs an API access event.
+    The row is handed to the background sink; it is only written inline
+    (on the given session) when the sink is not running.
+    """
+    row = dict(
         user_id=user_id,
         endpoint=endpoint,
         method=method,
+        timestamp=datetime.now(timezone.utc),
         is_successful=is_successful,
         role=role
     )
-    await db.execute(stmt)
+    if access_log_sink.submit(row):
+        return
+    await db.execute(insert(AccessLog).values(**row))
     await db.commit()
 
 
 async def create_failed_login_log(db: AsyncSession, username: str, ip_address: str | None):
-    """Logs a failed login attempt."""
-    stmt = insert(FailedLoginAttempt).values(
-        username=username,
-        ip_address=ip_address
-    )
-    await db.execute(stmt)
+    """
+    Logs a failed login attempt.
+    Like access logs, the row goes through a background sink and is only written inline
+    when the sink is not running.
+    """
+    row = dict(username=username, ip_address=ip_address, timestamp=datetime.now(timezone.utc))
+    if failed_login_sink.submit(row):
+        return
+    await db.execute(insert(FailedLoginAttempt).values(**row))
     await db.commit()
 
 
@@ -45,6 +175,67 @@ async def get_all_failed_login_logs(db: AsyncSession) -> List[FailedLoginAttempt
     return result.scalars().all()
 
 
+async def stream_logs(model, since: datetime | None = None, until: datetime | None = None,
+                      after_id: int | None = None, batch_size: int = 1000) -> AsyncIterator[dict]:
+    """
+    Streams rows of a log table as dicts in ascending id order using a server-side cursor.
+    `after_id` continues an earlier export (keyset pagination); `since`/`until` bound the timestamp.
+    The stream opens its own session so it can outlive the request handler.
+    """
+    stmt = select(model).order_by(model.id)
+    if after_id is not None:
+        stmt = stmt.filter(model.id > after_id)
+    if since is not None:
+        stmt = stmt.filter(model.timestamp >= since)
+    if until is not None:
+        stmt = stmt.filter(model.timestamp < until)
+    columns = [column.key for column in model.__table__.columns]
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(stmt.execution_options(yield_per=batch_size))
+        async for row in result:
+            yield {key: getattr(row, key) for key in columns}
+
+
+async def iter_csv(rows: AsyncIterator[dict], fieldnames: List[str], chunk_rows: int = 1000) -> AsyncIterator[str]:
+    """Encodes a stream of log dicts as CSV, yielding one chunk per `chunk_rows` rows."""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=fieldnames)
+    writer.writeheader()
+    pending = 0
+    async for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+            pending = 0
+    yield output.getvalue()
+
+
+async def iter_ndjson(rows: AsyncIterator[dict], chunk_rows: int = 1000) -> AsyncIterator[str]:
+    """Encodes a stream of log dicts as newline-delimited JSON."""
+    lines = []
+    async for row in rows:
+        lines.append(json.dumps(row, default=str))
+        if len(lines) >= chunk_rows:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+async def iter_gzip(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """Gzip-compresses a stream of text chunks."""
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 def export_logs_csv(logs: List[dict]) -> str:
     """Converts a list of log dictionaries to a CSV string."""
     if not logs:
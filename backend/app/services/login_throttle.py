@@ -0,0 +1,70 @@
+# Filename: app/services/login_throttle.py
+import math
+import time
+from fastapi import HTTPException, Request, status
+from app.core.config import settings
+from app.core.ratelimit import SlidingWindowCounter
+
+
+class LoginThrottle:
+    """
+    Brute-force protection for the login endpoint.
+
+    Failed logins are counted per username and per client IP over a sliding window. Once
+    either count reaches its limit, further attempts are refused before the user is loaded or
+    bcrypt runs, so a credential-stuffing wave costs counter increments instead of password
+    verifications. A successful login clears its username's failures but not its IP's.
+    Counts are per worker, so the effective limits scale with the number of workers.
+    """
+
+    def __init__(self, window_seconds: float, max_per_username: int, max_per_ip: int, max_keys: int):
+        self.max_per_username = max_per_username
+        self.max_per_ip = max_per_ip
+        self.blocked = 0
+        self._usernames = SlidingWindowCounter(window_seconds, max_keys)
+        self._ips = SlidingWindowCounter(window_seconds, max_keys)
+
+    def stats(self) -> dict:
+        return {"usernames": len(self._usernames), "ips": len(self._ips), "blocked": self.blocked}
+
+    def retry_after(self, username: str, ip: str | None, now: float | None = None) -> float:
+        """Seconds until the username and IP may try again; 0 if they are not locked out."""
+        now = time.time() if now is None else now
+        wait = self._usernames.retry_after(username.lower(), self.max_per_username, now)
+        if ip is not None:
+            wait = max(wait, self._ips.retry_after(ip, self.max_per_ip, now))
+        return wait
+
+    def check(self, username: str, ip: str | None):
+        """Raises 429 with a Retry-After header while the username or IP is locked out."""
+        wait = self.retry_after(username, ip)
+        if wait > 0:
+            self.blocked += 1
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail="Too many failed login attempts. Please retry later.",
+                                headers={"Retry-After": str(math.ceil(wait))})
+
+    def record_failure(self, username: str, ip: str | None):
+        self._usernames.hit(username.lower())
+        if ip is not None:
+            self._ips.hit(ip)
+
+    def record_success(self, username: str):
+        self._usernames.reset(username.lower())
+
+
+login_throttle = LoginThrottle(
+    window_seconds=settings.LOGIN_WINDOW_SECONDS,
+    max_per_username=settings.LOGIN_MAX_FAILURES_PER_USERNAME,
+    max_per_ip=settings.LOGIN_MAX_FAILURES_PER_IP,
+    max_keys=settings.LOGIN_THROTTLE_MAX_KEYS,
+)
+
+
+def client_ip(request: Request) -> str | None:
+    """The client's IP address, taken from X-Forwarded-For only when a trusted proxy sets it."""
+    if settings.LOGIN_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
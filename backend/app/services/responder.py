@@ -0,0 +1,207 @@
+# Filename: app/services/responder.py
+import asyncio
+import logging
+import time
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timezone
+from app.core.config import settings
+from app.core.spatial import SphereKDTree, unit_vectors, chord_to_meters
+from app.database import AsyncSessionLocal
+from app.models.user import User, UserRole, ResponderLocation
+from app.schemas.responder import ResponderLocationUpdate
+from typing import Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+
+class ResponderRegistry:
+    """
+    In-memory index of available police responders for nearest-unit dispatch.
+
+    Positions are held in a SphereKDTree that is rebuilt from the database every
+    `refresh_interval` seconds, so every worker eventually sees every responder.
+    Position reports handled by this worker go into a small overlay that queries scan
+    brute-force alongside the tree; once it holds `overlay_limit` entries the tree is
+    rebuilt in place. Reports made while a refresh is querying are merged into its snapshot
+    by `updated_at`, so a refresh never rolls a responder back to an older position.
+    """
+
+    def __init__(self, refresh_interval: float, overlay_limit: int, max_age_seconds: float):
+        self.refresh_interval = refresh_interval
+        self.overlay_limit = overlay_limit
+        self.max_age_seconds = max_age_seconds
+        self.rebuilds = 0
+        # user_id -> (latitude, longitude, updated_at unix seconds)
+        self._positions: Dict[int, tuple] = {}
+        self._overlay: set = set()
+        self._tree = SphereKDTree([], [], [])
+        # (user_id, position or None if removed, updated_at) reported while a refresh is in flight, or None
+        self._journal: List[tuple] | None = None
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def stats(self) -> dict:
+        return {"responders": len(self._positions), "tree": len(self._tree),
+                "overlay": len(self._overlay), "rebuilds": self.rebuilds}
+
+    def rebuild(self):
+        """Rebuilds the tree from the current positions and clears the overlay."""
+        ids = list(self._positions)
+        coords = np.array([self._positions[i][:2] for i in ids], dtype=np.float64).reshape(-1, 2)
+        self._tree = SphereKDTree(ids, coords[:, 0], coords[:, 1])
+        self._overlay = set()
+        self.rebuilds += 1
+
+    def load(self, positions: Dict[int, tuple], reported: Iterable[tuple] = ()):
+        """
+        Replaces all positions with a snapshot from the database, then applies the `reported`
+        (user_id, position or None, updated_at) changes that are not older than the snapshot's.
+        """
+        positions = dict(positions)
+        for user_id, position, updated_at in reported:
+            current = positions.get(user_id)
+            if current is not None and current[2] > updated_at:
+                continue
+            if position is None:
+                positions.pop(user_id, None)
+            else:
+                positions[user_id] = position
+        self._positions = positions
+        self.rebuild()
+
+    def update(self, user_id: int, latitude: float, longitude: float, updated_at: float):
+        if self._journal is not None:
+            self._journal.append((user_id, (latitude, longitude, updated_at), updated_at))
+        self._positions[user_id] = (latitude, longitude, updated_at)
+        self._overlay.add(user_id)
+        if len(self._overlay) >= self.overlay_limit:
+            self.rebuild()
+
+    def remove(self, user_id: int, updated_at: float):
+        if self._journal is not None:
+            self._journal.append((user_id, None, updated_at))
+        if self._positions.pop(user_id, None) is not None:
+            self._overlay.add(user_id)
+            if len(self._overlay) >= self.overlay_limit:
+                self.rebuild()
+
+    def nearest(self, latitude: float, longitude: float, k: int, now: float | None = None) -> List[dict]:
+        """Returns up to k available responders nearest to the point by great-circle distance, nearest first."""
+        now = time.time() if now is None else now
+        cutoff = now - self.max_age_seconds
+        found = {}
+
+        # Responders in the overlay moved (or left) since the tree was built; skip their tree entries
+        want = k + len(self._overlay)
+        while True:
+            ids, distances = self._tree.query(latitude, longitude, want)
+            for user_id, distance in zip(ids.tolist(), distances.tolist()):
+                position = self._positions.get(user_id)
+                if user_id not in self._overlay and position is not None and position[2] >= cutoff:
+                    found[user_id] = distance
+            if len(found) >= k or len(ids) < want:
+                break
+            found.clear()
+            want *= 2
+
+        overlay = [user_id for user_id in self._overlay
+                   if user_id in self._positions and self._positions[user_id][2] >= cutoff]
+        if overlay:
+            coords = np.array([self._positions[user_id][:2] for user_id in overlay])
+            diff = unit_vectors(coords[:, 0], coords[:, 1]) - unit_vectors([latitude], [longitude])[0]
+            distances = chord_to_meters(np.einsum("ij,ij->i", diff, diff))
+            found.update(zip(overlay, distances.tolist()))
+
+        return [
+            {
+                "user_id": user_id,
+                "latitude": self._positions[user_id][0],
+                "longitude": self._positions[user_id][1],
+                "updated_at": datetime.fromtimestamp(self._positions[user_id][2], tz=timezone.utc),
+                "distance_m": distance,
+            }
+            for user_id, distance in sorted(found.items(), key=lambda item: item[1])[:k]
+        ]
+
+    async def refresh(self, db: AsyncSession):
+        """Reloads available, active police responders from the database and rebuilds the tree."""
+        self._journal = []
+        try:
+            result = await db.execute(
+                select(ResponderLocation.user_id, ResponderLocation.latitude, ResponderLocation.longitude,
+                       ResponderLocation.updated_at)
+                .join(User, User.id == ResponderLocation.user_id)
+                .filter(ResponderLocation.is_available.is_(True), User.is_active.is_(True),
+                        User.role == UserRole.POLICE)
+            )
+        finally:
+            reported, self._journal = self._journal, None
+        self.load({row.user_id: (row.latitude, row.longitude, row.updated_at.timestamp()) for row in result},
+                  reported)
+
+    def start(self):
+        """Starts the periodic refresh loop on the running event loop; the first load happens immediately."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.refresh(db)
+            except Exception:
+                logger.exception("Failed to refresh the responder registry")
+            await asyncio.sleep(self.refresh_interval)
+
+
+responder_registry = ResponderRegistry(
+    refresh_interval=settings.RESPONDER_REFRESH_SECONDS,
+    overlay_limit=settings.RESPONDER_OVERLAY_LIMIT,
+    max_age_seconds=settings.RESPONDER_MAX_AGE_SECONDS,
+)
+
+
+async def update_responder_location(db: AsyncSession, user_id: int, location_in: ResponderLocationUpdate) -> dict:
+    """Upserts a responder's position and applies it to this worker's registry immediately."""
+    result = await db.execute(
+        insert(ResponderLocation)
+        .values(
+            user_id=user_id,
+            location=func.ST_SetSRID(func.ST_MakePoint(location_in.longitude, location_in.latitude), 4326),
+            latitude=location_in.latitude,
+            longitude=location_in.longitude,
+            is_available=location_in.is_available,
+        )
+        .on_conflict_do_update(
+            index_elements=[ResponderLocation.user_id],
+            set_=dict(
+                location=func.ST_SetSRID(func.ST_MakePoint(location_in.longitude, location_in.latitude), 4326),
+                latitude=location_in.latitude,
+                longitude=location_in.longitude,
+                is_available=location_in.is_available,
+                updated_at=func.now(),
+            ),
+        )
+        .returning(ResponderLocation.updated_at)
+    )
+    updated_at = result.scalar_one()
+    await db.commit()
+
+    if location_in.is_available:
+        responder_registry.update(user_id, location_in.latitude, location_in.longitude, updated_at.timestamp())
+    else:
+        responder_registry.remove(user_id, updated_at.timestamp())
+    return {"user_id": user_id, "latitude": location_in.latitude, "longitude": location_in.longitude,
+            "updated_at": updated_at}
@@ -0,0 +1,144 @@
+# Filename: app/services/revocation.py
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.user import RevokedToken
+from app.services import events
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+ACCESS = "access"
+REFRESH = "refresh"
+
+
+class RevocationList:
+    """
+    In-memory deny-list of revoked access-token ids, checked on every authenticated request.
+
+    Entries are grouped into buckets by expiry time, and whole buckets are dropped once their
+    tokens have expired, so memory is bounded by the revocations made within one access-token
+    lifetime. Revocations made by other workers arrive over the event broker, and a periodic
+    reload from the revokedtokens table (the authoritative record) fills any gaps.
+    """
+
+    def __init__(self, bucket_seconds: int, sync_interval: float):
+        self.bucket_seconds = bucket_seconds
+        self.sync_interval = sync_interval
+        self._expiry: Dict[str, float] = {}
+        self._buckets: Dict[int, set] = {}
+        self._task: asyncio.Task | None = None
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._expiry
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def stats(self) -> dict:
+        return {"revoked": len(self._expiry), "buckets": len(self._buckets)}
+
+    def add(self, jti: str, expires_at: float):
+        if jti in self._expiry:
+            return
+        self._expiry[jti] = expires_at
+        self._buckets.setdefault(math.ceil(expires_at / self.bucket_seconds), set()).add(jti)
+
+    def purge(self, now: float | None = None):
+        """Drops every bucket whose tokens have all expired; their signatures no longer verify anyway."""
+        now = time.time() if now is None else now
+        current = math.floor(now / self.bucket_seconds)
+        for bucket in [b for b in self._buckets if b <= current]:
+            for jti in self._buckets.pop(bucket):
+                del self._expiry[jti]
+
+    async def sync(self, db: AsyncSession):
+        """Loads unexpired access-token revocations and deletes expired rows of any type."""
+        now = datetime.now(timezone.utc)
+        result = await db.execute(
+            select(RevokedToken.jti, RevokedToken.expires_at)
+            .filter(RevokedToken.token_type == ACCESS, RevokedToken.expires_at > now)
+        )
+        for jti, expires_at in result:
+            self.add(jti, expires_at.timestamp())
+        await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+        await db.commit()
+        self.purge()
+
+    async def start(self):
+        """Subscribes to revocations from other workers and starts the periodic reload."""
+        if self._task is not None:
+            return
+        subscription = await events.event_broker.subscribe(
+            events.AUTH_CHANNEL, lambda message: message.get("type") == events.TOKEN_REVOKED)
+        self._task = asyncio.create_task(self._run(subscription))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self, subscription):
+        sync = asyncio.create_task(self._run_sync())
+        try:
+            while True:
+                message = await subscription.get()
+                self.add(message["jti"], message["expires_at"])
+        finally:
+            subscription.close()
+            sync.cancel()
+
+    async def _run_sync(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.sync(db)
+            except Exception:
+                logger.exception("Failed to reload revoked tokens")
+            await asyncio.sleep(self.sync_interval)
+
+
+revoked_tokens = RevocationList(
+    bucket_seconds=settings.TOKEN_REVOCATION_BUCKET_SECONDS,
+    sync_interval=settings.TOKEN_REVOCATION_SYNC_SECONDS,
+)
+
+
+async def revoke_tokens(db: AsyncSession, user_id: int, claims: List[dict]) -> List[str]:
+    """
+    Revokes tokens given their decoded claims, commits and broadcasts access-token revocations.
+    Returns the ids that were not revoked before, so a caller can detect a reused refresh token.
+    """
+    if not claims:
+        return []
+    result = await db.execute(
+        insert(RevokedToken)
+        .values([
+            {
+                "jti": c["jti"],
+                "user_id": user_id,
+                "token_type": c.get("type", ACCESS),
+                "expires_at": datetime.fromtimestamp(c["exp"], tz=timezone.utc),
+            }
+            for c in claims
+        ])
+        .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+        .returning(RevokedToken.jti)
+    )
+    revoked = result.scalars().all()
+    await db.commit()
+
+    for c in claims:
+        if c.get("type", ACCESS) == ACCESS and c["jti"] in revoked:
+            revoked_tokens.add(c["jti"], c["exp"])
+            await events.publish_token_revocation(c["jti"], c["exp"])
+    return revoked
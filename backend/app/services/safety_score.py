@@ -0,0 +1,240 @@
+# Filename: app/services/safety_score.py
+import asyncio
+import logging
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, values, column, func, and_, or_, case, extract, literal, Integer, Float
+from datetime import datetime, timezone, timedelta
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.alert import EmergencyAlert
+from app.models.tourist import Tourist, ZoneType
+from app.services import events
+from app.services.geofence import GeoFenceIndex, get_fence_index
+from typing import Iterable, List
+
+logger = logging.getLogger(__name__)
+
+# A tourist silent for longer than the anomaly detector allows at the default cadence counts as full trajectory risk
+_SILENCE_SECONDS = min(max(settings.ANOMALY_DEFAULT_CADENCE_SECONDS * settings.ANOMALY_SILENCE_FACTOR,
+                           settings.ANOMALY_MIN_SILENCE_SECONDS), settings.ANOMALY_MAX_SILENCE_SECONDS)
+
+
+def area_risk(index: GeoFenceIndex, latitude: float, longitude: float) -> float:
+    """
+    0-1 risk of a position from the fences containing it: a safe zone contributes its
+    sensitivity, a restricted zone at least 0.5, and being outside every safe zone at
+    least SAFETY_SCORE_UNFENCED_RISK.
+    """
+    risk = 0.0
+    in_safe_zone = False
+    for fence in index.containing(longitude, latitude):
+        if fence.zone_type == ZoneType.SAFE:
+            in_safe_zone = True
+            risk = max(risk, fence.sensitivity)
+        else:
+            risk = max(risk, 0.5 + 0.5 * fence.sensitivity)
+    if not in_safe_zone:
+        risk = max(risk, settings.SAFETY_SCORE_UNFENCED_RISK)
+    return risk
+
+
+def compute_safety_scores(longitudes: np.ndarray, area_risks: np.ndarray, alert_counts: np.ndarray,
+                          trajectory_risks: np.ndarray, now: datetime) -> np.ndarray:
+    """
+    Vectorized safety scores from 0 (high risk) to 100 (safe).
+    Time of day is the local solar hour derived from longitude: night (22-05) is full risk,
+    dusk and dawn half. Recent alerts saturate towards full risk after a handful.
+    """
+    utc_hour = now.hour + now.minute / 60 + now.second / 3600
+    hours = (utc_hour + longitudes / 15.0) % 24
+    night = (hours >= 22) | (hours < 5)
+    twilight = ((hours >= 19) & (hours < 22)) | ((hours >= 5) & (hours < 7))
+    time_risk = np.where(night, 1.0, np.where(twilight, 0.5, 0.0))
+    alert_risk = 1.0 - np.exp(-alert_counts / 3.0)
+    risk = (settings.SAFETY_SCORE_WEIGHT_AREA * area_risks
+            + settings.SAFETY_SCORE_WEIGHT_TIME * time_risk
+            + settings.SAFETY_SCORE_WEIGHT_ALERTS * alert_risk
+            + settings.SAFETY_SCORE_WEIGHT_TRAJECTORY * trajectory_risks)
+    return np.round(100.0 * (1.0 - np.clip(risk, 0.0, 1.0)), 1)
+
+
+def _time_band(timestamp, longitude):
+    """SQL expression for the time-of-day band (0 day, 1 dusk or dawn, 2 night) used by compute_safety_scores."""
+    hours = extract("epoch", timestamp) / 3600 + longitude / 15.0
+    hours = hours - 24 * func.floor(hours / 24)
+    return case((or_(hours >= 22, hours < 5), 2), (or_(hours >= 19, hours < 7), 1), else_=0)
+
+
+def _trajectory_risk(last_location_at: datetime | None, stored_risk: float | None, now: datetime) -> float:
+    if last_location_at is not None and (now - last_location_at).total_seconds() > _SILENCE_SECONDS:
+        return 1.0
+    return stored_risk or 0.0
+
+
+async def rescore_tourists(db: AsyncSession, tourist_ids: List[int]) -> int:
+    """
+    Recomputes and stores the scores of the given tourists with one query for positions,
+    one for alert counts and one bulk UPDATE. Tourists without a location are skipped.
+    Only persisted state is used, so every worker computes the same score.
+    """
+    if not tourist_ids:
+        return 0
+    now = datetime.now(timezone.utc)
+    positions = (await db.execute(
+        select(Tourist.id, func.ST_Y(Tourist.last_location), func.ST_X(Tourist.last_location),
+               Tourist.last_location_at, Tourist.trajectory_risk)
+        .filter(Tourist.id.in_(tourist_ids), Tourist.last_location.is_not(None))
+        # Lock in id order, as ingest_location_batch does, so concurrent bulk updates cannot deadlock
+        .order_by(Tourist.id)
+        .with_for_update()
+    )).all()
+    if not positions:
+        return 0
+    counts = dict((await db.execute(
+        select(EmergencyAlert.tourist_id, func.count())
+        .filter(EmergencyAlert.tourist_id.in_([row[0] for row in positions]),
+                EmergencyAlert.timestamp >= now - timedelta(days=settings.SAFETY_SCORE_ALERT_WINDOW_DAYS))
+        .group_by(EmergencyAlert.tourist_id)
+    )).all())
+
+    index = await get_fence_index(db)
+    ids = [row[0] for row in positions]
+    longitudes = np.array([row[2] for row in positions], dtype=np.float64)
+    scores = compute_safety_scores(
+        longitudes,
+        np.array([area_risk(index, row[1], row[2]) for row in positions]),
+        np.array([counts.get(tourist_id, 0) for tourist_id in ids], dtype=np.float64),
+        np.array([_trajectory_risk(row[3], row[4], now) for row in positions]),
+        now,
+    )
+
+    scores_table = values(column("id", Integer), column("score", Float), name="scores").data(
+        list(zip(ids, scores.tolist()))
+    )
+    await db.execute(
+        update(Tourist)
+        .where(Tourist.id == scores_table.c.id)
+        .values(safety_score=scores_table.c.score, safety_score_updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return len(ids)
+
+
+async def _tourists_in_bbox(db: AsyncSession, bbox: tuple) -> List[int]:
+    result = await db.execute(
+        select(Tourist.id).filter(func.ST_Intersects(Tourist.last_location, func.ST_MakeEnvelope(*bbox, 4326)))
+    )
+    return result.scalars().all()
+
+
+async def rescore_region(db: AsyncSession, bbox: tuple) -> int:
+    """Recomputes the scores of every tourist whose last location is inside the bounding box."""
+    tourist_ids = await _tourists_in_bbox(db, bbox)
+    rescored = 0
+    for i in range(0, len(tourist_ids), settings.SAFETY_SCORE_BATCH_SIZE):
+        rescored += await rescore_tourists(db, tourist_ids[i:i + settings.SAFETY_SCORE_BATCH_SIZE])
+    return rescored
+
+
+class SafetyScoreEngine:
+    """
+    Keeps safety scores current without full scans: location fixes and alerts mark the
+    affected tourist dirty, fence edits mark every tourist inside the edited area, and a
+    background loop rescores the dirty set in batches every `interval` seconds.
+
+    Each pass also sweeps one batch of tourists whose score no longer matches its inputs
+    without having been marked: a fix newer than the score (e.g. handled by a worker that
+    stopped before rescoring), a silence that began after scoring, or a local time-of-day
+    band that changed since scoring. The rows are locked with SKIP LOCKED so that workers
+    sweep disjoint batches.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.rescored = 0
+        self._dirty: set = set()
+        self._task: asyncio.Task | None = None
+
+    def mark(self, tourist_ids: Iterable[int]):
+        self._dirty.update(tourist_ids)
+
+    def stats(self) -> dict:
+        return {"dirty": len(self._dirty), "rescored": self.rescored}
+
+    async def flush(self, db: AsyncSession):
+        """Rescores every tourist marked dirty, including those inside recently edited fences."""
+        index = await get_fence_index(db)
+        regions, index.changed_regions = index.changed_regions, []
+        for bbox in regions:
+            self._dirty.update(await _tourists_in_bbox(db, bbox))
+        while self._dirty:
+            batch = [self._dirty.pop() for _ in range(min(self.batch_size, len(self._dirty)))]
+            try:
+                self.rescored += await rescore_tourists(db, batch)
+            except Exception:
+                self._dirty.update(batch)
+                raise
+        await self._rescore_stale(db)
+
+    async def _rescore_stale(self, db: AsyncSession):
+        now = datetime.now(timezone.utc)
+        silence = timedelta(seconds=_SILENCE_SECONDS)
+        scored_at = Tourist.safety_score_updated_at
+        longitude = func.ST_X(Tourist.last_location)
+        result = await db.execute(
+            select(Tourist.id)
+            .filter(Tourist.last_location.is_not(None),
+                    or_(scored_at.is_(None),
+                        Tourist.last_location_at > scored_at,
+                        and_(Tourist.last_location_at < now - silence, scored_at < Tourist.last_location_at + silence),
+                        _time_band(scored_at, longitude) != _time_band(literal(now), longitude)))
+            .order_by(Tourist.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        # The row locks are held until rescore_tourists commits
+        self.rescored += await rescore_tourists(db, result.scalars().all())
+
+    async def start(self):
+        """Subscribes to alert events and starts the rescoring loop."""
+        if self._task is not None:
+            return
+        subscription = await events.event_broker.subscribe(
+            events.ALERTS_CHANNEL, lambda message: message.get("type") == events.ALERT_CREATED)
+        self._task = asyncio.create_task(self._run(subscription))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self, subscription):
+        listener = asyncio.create_task(self._run_listener(subscription))
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    async with AsyncSessionLocal() as db:
+                        await self.flush(db)
+                except Exception:
+                    logger.exception("Failed to recompute safety scores")
+        finally:
+            listener.cancel()
+            subscription.close()
+
+    async def _run_listener(self, subscription):
+        while True:
+            message = await subscription.get()
+            if message.get("tourist_id") is not None:
+                self._dirty.add(message["tourist_id"])
+
+
+safety_scores = SafetyScoreEngine(
+    interval=settings.SAFETY_SCORE_INTERVAL_SECONDS,
+    batch_size=settings.SAFETY_SCORE_BATCH_SIZE,
+)
@@ -1,14 +1,178 @@
 # Filename: app/services/tourist.py
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from sqlalchemy.orm import selectinload
-from geoalchemy2.functions import ST_GeomFromText, ST_Contains
-import geojson
+from sqlalchemy import select, and_, update, values, column, func, DateTime, Integer, Float
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import selectinload, joinedload
 from app.models.user import User, UserRole
-from app.models.tourist import Tourist, GeoFence
-from app.schemas.tourist import TouristCreate, TouristUpdate, TouristLocationUpdate
-from fastapi import HTTPException, status
-from typing import List
+from app.models.tourist import Tourist
+from app.schemas.tourist import TouristCreate, TouristUpdate, TouristLocationUpdate, TouristLocationFix, \
+    TouristProfile
+from app.schemas.user import Principal
+from app.core.cache import TTLCache, InMemorySharedCache
+from app.core.config import settings
+from app.core.context import RequestContext, get_request_context
+from app.core.geometry import point_element
+from app.database import get_db
+from app.services import events
+from app.services.alert import create_system_alerts
+from app.services.auth import get_current_active_user
+from app.services.geofence import get_fence_index
+from app.services.location_history import location_history
+from app.services.heatmap import heatmap
+from app.services.safety_score import safety_scores
+from app.services.anomaly import anomaly_detector
+from app.services.fence_membership import FenceMembership, membership_tracker, transition_record, \
+    record_transitions
+from fastapi import Depends, HTTPException, status
+from typing import Dict, Iterable, List, Tuple
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# (ETag, JSON body) of a serialized profile
+ProfileEntry = Tuple[str, bytes]
+
+
+class ProfileCache:
+    """
+    Read-through cache of tourist profiles, held as serialized JSON with its ETag, so a
+    repeated read costs neither a query nor serialization.
+
+    A per-worker LRU with TTL sits in front of an optional shared backend. Writes invalidate
+    after they commit: the profile is dropped locally and from the shared backend at once,
+    and other workers are told over the event broker, batched every flush interval. A fill
+    racing with an invalidation of the same profile is not stored, as it may have read the
+    row before the write.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, shared=None, flush_interval: float = 0.5):
+        self._profiles = TTLCache(maxsize, ttl)
+        # user id -> tourist id, which never changes once the profile exists
+        self._tourist_ids = TTLCache(maxsize, ttl)
+        self.shared = shared
+        self.flush_interval = flush_interval
+        self.generation = 0
+        self.invalidations = 0
+        # tourist id -> generation of its latest invalidation, for the most recent `maxsize` ids
+        self._invalidated: OrderedDict = OrderedDict()
+        self._max_tracked = maxsize
+        # Newest generation that was dropped from _invalidated
+        self._forgotten = 0
+        self._pending: set = set()
+        self._task: asyncio.Task | None = None
+
+    def stats(self) -> dict:
+        return {**self._profiles.stats(), "invalidations": self.invalidations, "pending": len(self._pending)}
+
+    @staticmethod
+    def _etag(body: bytes) -> str:
+        return f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+    async def get(self, tourist_id: int) -> ProfileEntry | None:
+        entry = self._profiles.get(tourist_id)
+        if entry is None and self.shared is not None:
+            body = await self.shared.get(f"tourist:{tourist_id}")
+            if body is not None:
+                entry = (self._etag(body), body)
+                self._profiles.set(tourist_id, entry)
+        return entry
+
+    async def tourist_id_for_user(self, user_id: int) -> int | None:
+        tourist_id = self._tourist_ids.get(user_id)
+        if tourist_id is None and self.shared is not None:
+            value = await self.shared.get(f"user:{user_id}")
+            if value is not None:
+                tourist_id = int(value)
+                self._tourist_ids.set(user_id, tourist_id)
+        return tourist_id
+
+    async def put(self, tourist: Tourist, generation: int) -> ProfileEntry:
+        """
+        Serializes a profile loaded when the cache was at `generation` and stores it unless
+        the profile was invalidated since. Returns the entry either way.
+        """
+        body = TouristProfile.model_validate(tourist, from_attributes=True).model_dump_json().encode()
+        entry = (self._etag(body), body)
+        if generation >= self._forgotten and self._invalidated.get(tourist.id, 0) <= generation:
+            self._profiles.set(tourist.id, entry)
+            self._tourist_ids.set(tourist.user_id, tourist.id)
+            if self.shared is not None:
+                await self.shared.set(f"tourist:{tourist.id}", body)
+                await self.shared.set(f"user:{tourist.user_id}", str(tourist.id).encode())
+        return entry
+
+    def _drop(self, tourist_ids: Iterable[int]):
+        self.generation += 1
+        for tourist_id in tourist_ids:
+            self._profiles.pop(tourist_id)
+            self._invalidated[tourist_id] = self.generation
+            self._invalidated.move_to_end(tourist_id)
+        while len(self._invalidated) > self._max_tracked:
+            self._forgotten = max(self._forgotten, self._invalidated.popitem(last=False)[1])
+
+    async def invalidate(self, tourist_ids: Iterable[int]):
+        """Drops changed profiles here and in the shared backend, and queues the broadcast."""
+        tourist_ids = list(tourist_ids)
+        if not tourist_ids:
+            return
+        self._drop(tourist_ids)
+        self.invalidations += len(tourist_ids)
+        if self.shared is not None:
+            await self.shared.delete([f"tourist:{tourist_id}" for tourist_id in tourist_ids])
+        if self._task is not None:
+            self._pending.update(tourist_ids)
+
+    async def start(self):
+        """Subscribes to other workers' invalidations and starts broadcasting this worker's."""
+        if self._task is not None:
+            return
+        subscription = await events.event_broker.subscribe(
+            events.TOURISTS_CHANNEL, lambda message: message.get("type") == events.PROFILES_CHANGED)
+        self._task = asyncio.create_task(self._run(subscription))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._pending.clear()
+
+    async def _run(self, subscription):
+        flush = asyncio.create_task(self._run_flush())
+        try:
+            while True:
+                message = await subscription.get()
+                self._drop(message["tourist_ids"])
+        finally:
+            subscription.close()
+            flush.cancel()
+
+    async def _run_flush(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self._pending:
+                continue
+            pending, self._pending = sorted(self._pending), set()
+            try:
+                # Keep each notification well below the 8000-byte NOTIFY payload limit
+                for i in range(0, len(pending), 500):
+                    await events.publish_profile_invalidation(pending[i:i + 500])
+            except Exception:
+                logger.exception("Failed to broadcast %d profile invalidations", len(pending))
+
+
+profile_cache = ProfileCache(
+    maxsize=settings.PROFILE_CACHE_MAX_ENTRIES,
+    ttl=settings.PROFILE_CACHE_TTL_SECONDS,
+    shared=(InMemorySharedCache(settings.PROFILE_CACHE_MAX_ENTRIES, settings.PROFILE_CACHE_SHARED_TTL_SECONDS)
+            if settings.PROFILE_CACHE_SHARED_BACKEND == "memory" else None),
+    flush_interval=settings.PROFILE_CACHE_INVALIDATION_FLUSH_SECONDS,
+)
 
 
 async def create_tourist_profile(db: AsyncSession, user_id: int, tourist_in: TouristCreate) -> Tourist:
@@ -26,65 +190,215 @@ async def create_tourist_profile(db: AsyncSession, user_id: int, tourist_in: Tou
 
 
 async def get_tourist_by_user_id(db: AsyncSession, user_id: int) -> Tourist | None:
-    """Fetches a tourist profile by their user ID."""
+    """Fetches a tourist profile, with its user, by their user ID in one query."""
     result = await db.execute(
         select(Tourist)
         .filter(Tourist.user_id == user_id)
-        .options(selectinload(Tourist.user))
+        .options(joinedload(Tourist.user))
     )
     return result.scalars().first()
 
 
 async def get_tourist_by_id(db: AsyncSession, tourist_id: int) -> Tourist | None:
-    """Fetches a tourist profile by their tourist ID."""
+    """Fetches a tourist profile, with its user, by their tourist ID in one query."""
     result = await db.execute(
         select(Tourist)
         .filter(Tourist.id == tourist_id)
-        .options(selectinload(Tourist.user))
+        .options(joinedload(Tourist.user))
     )
     return result.scalars().first()
 
 
+async def get_context_tourist(db: AsyncSession, context: RequestContext) -> Tourist | None:
+    """The tourist profile of the request's principal, loaded at most once per request."""
+    if not context.tourist_resolved:
+        context.tourist = await get_tourist_by_user_id(db, context.principal.id)
+    return context.tourist
+
+
+async def get_current_tourist(
+        current_user: Principal = Depends(get_current_active_user),
+        context: RequestContext = Depends(get_request_context),
+        db: AsyncSession = Depends(get_db)
+) -> Tourist:
+    """Dependency for the authenticated user's tourist profile; 404 if they have none."""
+    tourist = await get_context_tourist(db, context)
+    if tourist is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tourist profile not found.")
+    return tourist
+
+
+async def get_profile(db: AsyncSession, tourist_id: int) -> ProfileEntry | None:
+    """A tourist's serialized profile and its ETag, read through the profile cache."""
+    entry = await profile_cache.get(tourist_id)
+    if entry is not None:
+        return entry
+    generation = profile_cache.generation
+    tourist = await get_tourist_by_id(db, tourist_id)
+    return None if tourist is None else await profile_cache.put(tourist, generation)
+
+
+async def get_context_profile(db: AsyncSession, context: RequestContext) -> ProfileEntry | None:
+    """The serialized profile of the request's principal, read through the profile cache."""
+    tourist_id = await profile_cache.tourist_id_for_user(context.principal.id)
+    if tourist_id is not None:
+        entry = await profile_cache.get(tourist_id)
+        if entry is not None:
+            return entry
+    generation = profile_cache.generation
+    tourist = await get_context_tourist(db, context)
+    return None if tourist is None else await profile_cache.put(tourist, generation)
+
+
 async def update_tourist_profile(db: AsyncSession, tourist: Tourist, tourist_in: TouristUpdate) -> Tourist:
-    """Updates an existing tourist profile."""
+    """Updates an existing tourist profile. Only plain columns change, so nothing needs reloading."""
     if tourist_in.full_name:
         tourist.full_name = tourist_in.full_name
     if tourist_in.contact_number:
         tourist.contact_number = tourist_in.contact_number
 
     await db.commit()
-    await db.refresh(tourist)
+    await profile_cache.invalidate([tourist.id])
     return tourist
 
 
-async def update_tourist_location(db: AsyncSession, tourist_id: int, location_in: TouristLocationUpdate) -> Tourist:
-    """Updates a tourist's location and checks for geo-fence violations."""
-    tourist = await get_tourist_by_id(db, tourist_id)
-    if not tourist:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tourist not found.")
-
-    point = f'POINT({location_in.longitude} {location_in.latitude})'
-    tourist.last_location = ST_GeomFromText(point, 4326)
-
-    # Geo-fence check: Check if the tourist's new location is outside of any geo-fences
-    geo_fences = await db.execute(select(GeoFence))
-    for fence in geo_fences.scalars():
-        is_inside = await db.execute(
-            select(ST_Contains(fence.area, tourist.last_location))
-        )
-        if not is_inside.scalar_one():
-            # Trigger alert for geo-fence violation
-            # This is where you would call an alert service function
-            print(f"ALERT: Tourist {tourist_id} exited geo-fence: {fence.name}")
+async def _commit_fixes(db: AsyncSession, transitions: List[dict], anomalies: List[dict]) -> List[dict]:
+    """
+    Inserts alerts for anomalies and fence violations, commits them together with the pending
+    location writes and then broadcasts them. Returns the violations.
+    """
+    anomaly_alerts = await create_system_alerts(db, anomalies) if anomalies else []
+    violations = await record_transitions(db, transitions)
+    for alert in anomaly_alerts:
+        await events.publish_alert_event(events.ALERT_CREATED, alert)
+    return violations
 
-    await db.commit()
-    await db.refresh(tourist)
+
+async def update_tourist_location(db: AsyncSession, tourist: Tourist, location_in: TouristLocationUpdate) -> Tourist:
+    """
+    Updates a tourist's location and checks for geo-fence violations and anomalies.
+    Everything is written with a single commit and the tourist is not reloaded afterwards.
+    """
+    tourist_id = tourist.id
+    now = datetime.now(timezone.utc)
+    tourist.last_location = point_element(location_in.longitude, location_in.latitude)
+    tourist.last_location_at = now
+
+    # Geo-fence check: only confirmed enter/exit transitions are recorded. The membership is
+    # written back in the same commit as the resulting alerts.
+    fence_index = await get_fence_index(db)
+    membership, fence_transitions = membership_tracker.observe(
+        FenceMembership.from_json(tourist.fence_membership), location_in.longitude, location_in.latitude,
+        now.timestamp(), fence_index)
+    tourist.fence_membership = membership.to_json()
+    transitions = [
+        transition_record(tourist_id, transition, fence, location_in.longitude, location_in.latitude, now)
+        for transition, fence in fence_transitions
+    ]
+
+    anomalies = anomaly_detector.observe(tourist_id, location_in.longitude, location_in.latitude, now.timestamp())
+    tourist.trajectory_risk = anomaly_detector.trajectory_risk(tourist_id)
+
+    await _commit_fixes(db, transitions, anomalies)
+    await profile_cache.invalidate([tourist_id])
+    location_history.append(tourist_id, now, location_in.latitude, location_in.longitude)
+    heatmap.move_tourist(tourist_id, location_in.latitude, location_in.longitude)
+    safety_scores.mark([tourist_id])
     return tourist
 
 
-async def get_all_tourists(db: AsyncSession) -> List[Tourist]:
-    """Fetches all tourist profiles from the database."""
+async def ingest_location_batch(db: AsyncSession, fixes_by_tourist: Dict[int, List[TouristLocationFix]]) -> dict:
+    """
+    Processes buffered location fixes for one or more tourists.
+    Every fix of a known tourist is fed through the fence membership tracker and anomaly
+    detector in a single pass, and the latest fix and fence membership of each tourist are
+    written with one bulk UPDATE. A batch older than the tourist's stored position (a delayed
+    gateway upload) only adds to the location history.
+    """
+    fence_index = await get_fence_index(db)
+    result = await db.execute(
+        select(Tourist.id, Tourist.fence_membership)
+        .filter(Tourist.id.in_(list(fixes_by_tourist)))
+        # Lock in id order before the bulk UPDATE, as the safety score rescoring does
+        .order_by(Tourist.id)
+        .with_for_update()
+    )
+    memberships = {tourist_id: FenceMembership.from_json(data) for tourist_id, data in result.all()}
+    latest = {}
+    transitions = []
+    anomalies = []
+    for tourist_id, fixes in fixes_by_tourist.items():
+        if tourist_id not in memberships:
+            continue
+        membership = memberships[tourist_id]
+        for fix in sorted(fixes, key=lambda f: f.timestamp.timestamp()):
+            fix_ts = fix.timestamp.timestamp()
+            membership, fence_transitions = membership_tracker.observe(
+                membership, fix.longitude, fix.latitude, fix_ts, fence_index)
+            for transition, fence in fence_transitions:
+                transitions.append(transition_record(tourist_id, transition, fence,
+                                                     fix.longitude, fix.latitude, fix.timestamp))
+            anomalies.extend(anomaly_detector.observe(tourist_id, fix.longitude, fix.latitude, fix_ts))
+            latest[tourist_id] = fix
+        memberships[tourist_id] = membership
+    if not latest:
+        return {"accepted_fixes": 0, "updated_tourists": 0, "violations": []}
+
+    fixes_table = values(
+        column("id", Integer), column("longitude", Float), column("latitude", Float),
+        column("fix_ts", DateTime(timezone=True)), column("membership", JSONB), column("trajectory_risk", Float),
+        name="fixes"
+    ).data([(tourist_id, fix.longitude, fix.latitude, fix.timestamp, memberships[tourist_id].to_json(),
+             anomaly_detector.trajectory_risk(tourist_id)) for tourist_id, fix in latest.items()])
     result = await db.execute(
-        select(Tourist).options(selectinload(Tourist.user))
+        update(Tourist)
+        .where(Tourist.id == fixes_table.c.id,
+               Tourist.last_location_at.is_(None) | (Tourist.last_location_at < fixes_table.c.fix_ts))
+        .values(last_location=func.ST_SetSRID(func.ST_MakePoint(fixes_table.c.longitude, fixes_table.c.latitude), 4326),
+                last_location_at=fixes_table.c.fix_ts,
+                fence_membership=fixes_table.c.membership,
+                trajectory_risk=fixes_table.c.trajectory_risk)
+        .returning(Tourist.id)
+        .execution_options(synchronize_session=False)
     )
+    updated_ids = set(result.scalars().all())
+
+    violations = await _commit_fixes(db, [t for t in transitions if t["tourist_id"] in updated_ids],
+                                     [a for a in anomalies if a["tourist_id"] in updated_ids])
+    await profile_cache.invalidate(updated_ids)
+    for tourist_id in latest:
+        for fix in fixes_by_tourist[tourist_id]:
+            location_history.append(tourist_id, fix.timestamp, fix.latitude, fix.longitude)
+    for tourist_id in updated_ids:
+        heatmap.move_tourist(tourist_id, latest[tourist_id].latitude, latest[tourist_id].longitude)
+    safety_scores.mark(updated_ids)
+
+    return {
+        "accepted_fixes": sum(len(fixes_by_tourist[tourist_id]) for tourist_id in latest),
+        "updated_tourists": len(updated_ids),
+        "violations": violations,
+    }
+
+
+async def get_all_tourists(db: AsyncSession, limit: int = 100, after_id: int | None = None,
+                           is_active: bool | None = None, registered_since: datetime | None = None,
+                           registered_until: datetime | None = None, bbox: tuple | None = None) -> List[Tourist]:
+    """
+    Fetches one page of tourist profiles in ascending ID order.
+    `after_id` is the ID of the last tourist of the previous page.
+    """
+    stmt = select(Tourist).options(selectinload(Tourist.user)).order_by(Tourist.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.filter(Tourist.id > after_id)
+    if is_active is not None or registered_since is not None or registered_until is not None:
+        stmt = stmt.join(Tourist.user)
+        if is_active is not None:
+            stmt = stmt.filter(User.is_active == is_active)
+        if registered_since is not None:
+            stmt = stmt.filter(User.created_at >= registered_since)
+        if registered_until is not None:
+            stmt = stmt.filter(User.created_at < registered_until)
+    if bbox is not None:
+        stmt = stmt.filter(func.ST_Intersects(Tourist.last_location, func.ST_MakeEnvelope(*bbox, 4326)))
+    result = await db.execute(stmt)
     return result.scalars().all()
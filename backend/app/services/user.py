@@ -12,7 +12,7 @@ async def get_user_by_username(db: AsyncSession, username: str) -> User | None:
 
 async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
     """Creates a new user in the database."""
-    hashed_password = get_password_hash(user_in.password)
+    hashed_password = await get_password_hash(user_in.password)
     db_user = User(
         username=user_in.username,
         hashed_password=hashed_password,
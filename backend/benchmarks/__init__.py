@@ -0,0 +1,11 @@
+# Filename: benchmarks/__init__.py
+"""
+Benchmarks for the API hot paths. Run from `backend/` with the usual settings environment:
+
+    python -m benchmarks.micro --output micro.json
+    python -m benchmarks.load --create-schema --concurrency 32 --requests 2000 --output load.json
+    python -m benchmarks.compare baseline.json load.json --threshold 0.1
+
+The load test drives the app in-process over ASGI against the configured PostgreSQL/PostGIS
+database; use a throwaway database, as it registers users and raises alerts.
+"""
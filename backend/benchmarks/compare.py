@@ -0,0 +1,53 @@
+# Filename: benchmarks/compare.py
+import argparse
+import json
+import sys
+
+# Metrics where a larger value is better; every other numeric metric is a cost
+_HIGHER_IS_BETTER = {"ops_per_s", "throughput_rps"}
+# Metrics that describe the run rather than its performance
+_IGNORED = {"operations", "requests", "max_ms"}
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Returns a line per metric that regressed by more than `threshold` (a fraction)."""
+    regressions = []
+    for name, metrics in sorted(current["results"].items()):
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        for metric, value in sorted(metrics.items()):
+            old = before.get(metric)
+            if metric in _IGNORED or not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                continue
+            if metric == "errors":
+                if value > old:
+                    regressions.append(f"{name}.{metric}: {old} -> {value}")
+                continue
+            if old == 0:
+                continue
+            change = (value - old) / old
+            worse = -change if metric in _HIGHER_IS_BETTER else change
+            if worse > threshold:
+                regressions.append(f"{name}.{metric}: {old} -> {value} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Fails when benchmark results regressed against a baseline.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative regression")
+    args = parser.parse_args(argv)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    for line in regressions:
+        print(line)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# Filename: benchmarks/load.py
+import argparse
+import asyncio
+import math
+import random
+import secrets
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Dict, List
+import httpx
+from sqlalchemy import text
+from app.core.config import settings
+from app.main import app
+from app.database import Base, async_engine
+from benchmarks.report import QueryCounter, instrument_engine, summarize_latencies, write_results
+
+API = "/api/v1"
+PASSWORD = "benchmark-password"
+
+
+class Fixture:
+    """Users and tokens shared by the scenarios of one run."""
+
+    def __init__(self, latitude: float, longitude: float):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.tourists: List[dict] = []
+        self.police_token: str | None = None
+
+    def tourist(self, i: int) -> dict:
+        return self.tourists[i % len(self.tourists)]
+
+    def position(self, i: int) -> dict:
+        # Spread fixes over roughly 10 km around the base point
+        return {"latitude": self.latitude + random.uniform(-0.05, 0.05),
+                "longitude": self.longitude + random.uniform(-0.05, 0.05)}
+
+
+def _auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def _register_and_login(client: httpx.AsyncClient, username: str, role: str) -> str:
+    response = await client.post(f"{API}/auth/register", json={"username": username, "password": PASSWORD, "role": role})
+    response.raise_for_status()
+    response = await client.post(f"{API}/auth/login", json={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def prepare(client: httpx.AsyncClient, tourists: int, latitude: float, longitude: float) -> Fixture:
+    """Registers a police user and `tourists` tourists with profiles under a fresh run prefix."""
+    fixture = Fixture(latitude, longitude)
+    run = secrets.token_hex(3)
+    fixture.police_token = await _register_and_login(client, f"bench-{run}-police", "police")
+
+    async def add_tourist(i: int):
+        username = f"bench-{run}-t{i}"
+        token = await _register_and_login(client, username, "tourist")
+        response = await client.post(f"{API}/tourists/", headers=_auth(token), json={
+            "full_name": f"Benchmark Tourist {i}",
+            "passport_id": f"B{run}{i:05d}",
+            "contact_number": f"+9100000{i:05d}",
+        })
+        response.raise_for_status()
+        fixture.tourists.append({"username": username, "token": token})
+
+    await asyncio.gather(*(add_tourist(i) for i in range(tourists)))
+    return fixture
+
+
+async def login(client: httpx.AsyncClient, fixture: Fixture, i: int) -> httpx.Response:
+    return await client.post(f"{API}/auth/login",
+                             json={"username": fixture.tourist(i)["username"], "password": PASSWORD})
+
+
+async def location(client: httpx.AsyncClient, fixture: Fixture, i: int) -> httpx.Response:
+    return await client.put(f"{API}/tourists/me/location", headers=_auth(fixture.tourist(i)["token"]),
+                            json=fixture.position(i))
+
+
+async def sos(client: httpx.AsyncClient, fixture: Fixture, i: int) -> httpx.Response:
+    return await client.post(f"{API}/alerts/sos",
+                             headers={**_auth(fixture.tourist(i)["token"]), "Idempotency-Key": str(uuid.uuid4())},
+                             json={**fixture.position(i), "message": "Benchmark SOS"})
+
+
+async def active_alerts(client: httpx.AsyncClient, fixture: Fixture, i: int) -> httpx.Response:
+    return await client.get(f"{API}/alerts/active", params={"limit": 100}, headers=_auth(fixture.police_token))
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "login": login,
+    "location": location,
+    "sos": sos,
+    "active_alerts": active_alerts,
+}
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Callable, fixture: Fixture,
+                       concurrency: int, requests: int) -> dict:
+    """Issues `requests` requests from `concurrency` workers and summarizes them."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    remaining = iter(range(requests))
+
+    async def worker():
+        for i in remaining:
+            start = time.perf_counter()
+            try:
+                response = await scenario(client, fixture, i)
+                statuses[response.status_code] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    with QueryCounter() as counter:
+        # Workers are created inside the counter so their queries are attributed to this scenario
+        start = time.perf_counter()
+        await asyncio.gather(*(asyncio.create_task(worker()) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    errors = sum(count for code, count in statuses.items() if not (isinstance(code, int) and code < 400))
+    return {
+        "requests": requests,
+        "errors": errors,
+        "statuses": {str(code): count for code, count in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else math.inf,
+        "queries_per_request": round(counter.queries / requests, 2),
+        **summarize_latencies(latencies),
+    }
+
+
+async def create_schema():
+    async with async_engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def main(args):
+    # Every simulated client shares one address and the scenarios exceed per-user limits by design
+    settings.ADMISSION_ENABLED = args.admission
+    instrument_engine(async_engine.sync_engine)
+    if args.create_schema:
+        await create_schema()
+    random.seed(args.seed)
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            fixture = await prepare(client, args.tourists, args.latitude, args.longitude)
+            for name in args.scenarios:
+                if args.warmup:
+                    await run_scenario(client, SCENARIOS[name], fixture, args.concurrency, args.warmup)
+                results[name] = await run_scenario(client, SCENARIOS[name], fixture, args.concurrency, args.requests)
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "create_schema")}
+    write_results(args.output, "load", params, results)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="In-process load test of the API hot paths.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per scenario")
+    parser.add_argument("--tourists", type=int, default=32, help="distinct tourist accounts to spread load over")
+    parser.add_argument("--latitude", type=float, default=26.1445)
+    parser.add_argument("--longitude", type=float, default=91.7362)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--admission", action="store_true",
+                        help="keep admission control (rate limits, shedding) enabled")
+    parser.add_argument("--create-schema", action="store_true", help="create PostGIS and all tables first")
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,190 @@
+# Filename: benchmarks/micro.py
+import argparse
+import asyncio
+import math
+import random
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+from pydantic import TypeAdapter
+from app.core.geometry import point_coordinates
+from app.models.alert import AlertStatus
+from app.models.tourist import ZoneType
+from app.models.user import UserRole
+from app.schemas.alert import EmergencyAlertResponse
+from app.schemas.user import Principal
+from app.services import auth
+from app.services import log as log_service
+from app.services.geofence import GeoFenceIndex, compile_fence
+from app.services.heatmap import HeatmapAggregator
+from app.core.config import settings
+from benchmarks.report import write_results
+
+
+def measure(fn: Callable[[], object], operations: int, repeat: int) -> dict:
+    """
+    Runs `fn` (which performs `operations` operations per call) `repeat` times and reports
+    the best run, which is the least disturbed by other activity on the machine.
+    """
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return {
+        "operations": operations,
+        "ns_per_op": round(best / operations * 1e9, 1),
+        "ops_per_s": round(operations / best, 1),
+    }
+
+
+def _polygon(lon: float, lat: float, radius: float, vertices: int) -> dict:
+    ring = [[lon + radius * math.cos(2 * math.pi * i / vertices), lat + radius * math.sin(2 * math.pi * i / vertices)]
+            for i in range(vertices)]
+    return {"type": "Polygon", "coordinates": [ring + [ring[0]]]}
+
+
+def bench_geofence_containment(fences: int, points: int, repeat: int) -> dict:
+    """Point lookups against `fences` 32-vertex fences scattered over about 2x2 degrees."""
+    index = GeoFenceIndex(settings.GEOFENCE_GRID_CELL_DEGREES)
+    for i in range(fences):
+        geometry = _polygon(91 + random.uniform(0, 2), 25 + random.uniform(0, 2), random.uniform(0.005, 0.05), 32)
+        index.add(compile_fence(i, f"fence-{i}", random.choice(list(ZoneType)), geometry))
+    queries = [(91 + random.uniform(0, 2), 25 + random.uniform(0, 2)) for _ in range(points)]
+
+    def run():
+        for x, y in queries:
+            index.containing(x, y)
+
+    return measure(run, points, repeat)
+
+
+def bench_token_decode(tokens: int, repeat: int) -> dict:
+    """JWT signature check and decode, the CPU cost of a principal cache miss."""
+    token = auth.create_access_token({"sub": "benchmark", "role": UserRole.TOURIST.value}, timedelta(minutes=30))
+
+    def run():
+        for _ in range(tokens):
+            auth.jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+    return measure(run, tokens, repeat)
+
+
+def bench_token_cache_hit(tokens: int, repeat: int) -> dict:
+    """resolve_principal answered from the principal cache, without touching the database."""
+    token = auth.create_access_token({"sub": "benchmark", "role": UserRole.TOURIST.value}, timedelta(minutes=30))
+    principal = Principal(id=1, username="benchmark", role=UserRole.TOURIST, is_active=True)
+    jti = auth.jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])["jti"]
+    auth.principal_cache.set(token, (principal, auth.user_invalidations.generation, time.time() + 1800, jti))
+
+    async def resolve_all():
+        for _ in range(tokens):
+            await auth.resolve_principal(token, None)
+
+    return measure(lambda: asyncio.run(resolve_all()), tokens, repeat)
+
+
+def _access_log_rows(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {"id": i, "user_id": i % 500, "endpoint": "/api/v1/tourists/me/location", "method": "PUT",
+         "timestamp": now + timedelta(milliseconds=i), "is_successful": True, "role": "tourist"}
+        for i in range(count)
+    ]
+
+
+def bench_log_export(rows: int, export_format: str, compress: bool, repeat: int) -> dict:
+    """Encoding of streamed access-log rows, as done by the export endpoints (database excluded)."""
+    data = _access_log_rows(rows)
+    fieldnames = list(data[0])
+
+    async def source():
+        for row in data:
+            yield row
+
+    async def export():
+        chunks = (log_service.iter_csv(source(), fieldnames) if export_format == "csv"
+                  else log_service.iter_ndjson(source()))
+        if compress:
+            chunks = log_service.iter_gzip(chunks)
+        async for _ in chunks:
+            pass
+
+    return measure(lambda: asyncio.run(export()), rows, repeat)
+
+
+def bench_alert_serialization(alerts: int, repeat: int) -> dict:
+    """Validation and JSON encoding of an alert listing, as done for /alerts/active and /alerts/history."""
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"id": i, "tourist_id": i, "location": {"type": "Point", "coordinates": [91.7362, 26.1445]},
+         "timestamp": now, "status": AlertStatus.ACTIVE, "message": "Help", "acknowledged_by": None}
+        for i in range(alerts)
+    ]
+    adapter = TypeAdapter(List[EmergencyAlertResponse])
+    return measure(lambda: adapter.dump_json(adapter.validate_python(rows)), alerts, repeat)
+
+
+def bench_wkb_point_decode(points: int, repeat: int) -> dict:
+    """Decoding of EWKB points returned by the database for geometry columns."""
+    data = struct.pack("<BIIdd", 1, 0x20000001, 4326, 91.7362, 26.1445)
+
+    def run():
+        for _ in range(points):
+            point_coordinates(data)
+
+    return measure(run, points, repeat)
+
+
+def bench_heatmap_moves(moves: int, repeat: int) -> dict:
+    """Tourist moves between cells, each followed by the ETag lookup of a conditional tile request."""
+    aggregator = HeatmapAggregator(settings.HEATMAP_PRECISIONS, settings.HEATMAP_MAX_TILE_DEPTH,
+                                   settings.HEATMAP_CACHE_MAX_ENTRIES, settings.HEATMAP_RESEED_SECONDS)
+    precision = aggregator.finest
+    positions = [(26 + random.uniform(0, 0.1), 91 + random.uniform(0, 0.1)) for _ in range(moves)]
+
+    # A tile as deep as its precision is a single cell and must still change version when it changes
+    aggregator.move_tourist(0, *positions[0])
+    cell = aggregator._tourist_cells[0]
+    before = aggregator.etag(precision, cell)
+    aggregator.move_tourist(1, *positions[0])
+    if aggregator.etag(precision, cell) == before:
+        raise RuntimeError(f"heatmap tile {cell!r} kept its ETag after a change")
+
+    def run():
+        for i, (lat, lon) in enumerate(positions):
+            aggregator.move_tourist(i % 1000, lat, lon)
+            aggregator.etag(precision, aggregator._tourist_cells[i % 1000])
+
+    return measure(run, moves, repeat)
+
+
+def main(args):
+    random.seed(args.seed)
+    n = args.scale
+    results: Dict[str, dict] = {
+        "geofence_containment": bench_geofence_containment(1000, 20 * n, args.repeat),
+        "token_decode": bench_token_decode(n, args.repeat),
+        "token_cache_hit": bench_token_cache_hit(10 * n, args.repeat),
+        "log_export_csv": bench_log_export(10 * n, "csv", False, args.repeat),
+        "log_export_ndjson": bench_log_export(10 * n, "ndjson", False, args.repeat),
+        "log_export_ndjson_gzip": bench_log_export(10 * n, "ndjson", True, args.repeat),
+        "alert_serialization": bench_alert_serialization(n, args.repeat),
+        "wkb_point_decode": bench_wkb_point_decode(10 * n, args.repeat),
+        "heatmap_moves": bench_heatmap_moves(10 * n, args.repeat),
+    }
+    write_results(args.output, "micro", {"scale": n, "repeat": args.repeat, "seed": args.seed}, results)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of CPU-bound hot paths.")
+    parser.add_argument("--scale", type=int, default=10000, help="base number of operations per benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
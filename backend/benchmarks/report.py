@@ -0,0 +1,88 @@
+# Filename: benchmarks/report.py
+import contextvars
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from sqlalchemy import event
+from typing import Dict, List
+
+# Counter of the scenario that issued the current request; tasks spawned by a request inherit it
+_query_counter: contextvars.ContextVar[list | None] = contextvars.ContextVar("query_counter", default=None)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds."""
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+class QueryCounter:
+    """Counts SQL statements executed on behalf of the current context, e.g. one scenario."""
+
+    def __init__(self):
+        self.count = [0]
+        self._token = None
+
+    def __enter__(self):
+        self._token = _query_counter.set(self.count)
+        return self
+
+    def __exit__(self, *exc):
+        _query_counter.reset(self._token)
+
+    @property
+    def queries(self) -> int:
+        return self.count[0]
+
+
+def instrument_engine(engine):
+    """Attributes every statement executed on the (sync) engine to the active QueryCounter."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter = _query_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str | None, kind: str, params: dict, results: Dict[str, dict]):
+    """
+    Writes results as JSON with sorted keys so that two runs diff line by line.
+    `results` maps a benchmark name to its metrics. Prints to stdout without a path.
+    """
+    document = {
+        "kind": kind,
+        "revision": _git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": params,
+        "results": results,
+    }
+    text = json.dumps(document, indent=2, sort_keys=True) + "\n"
+    if path is None:
+        print(text, end="")
+        return
+    with open(path, "w") as f:
+        f.write(text)
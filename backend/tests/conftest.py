@@ -0,0 +1,17 @@
+# Filename: tests/conftest.py
+import os
+
+# Settings without defaults are required at import time; the unit tests never connect anywhere
+for _name, _value in {
+    "SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "15",
+    "REFRESH_TOKEN_EXPIRE_MINUTES": "1440",
+    "API_VERSION": "1",
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_DB": "test",
+}.items():
+    os.environ.setdefault(_name, _value)
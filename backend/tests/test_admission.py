@@ -0,0 +1,87 @@
+# Filename: tests/test_admission.py
+import asyncio
+from app.services.admission import CRITICAL, LOW, NORMAL, PriorityLimiter
+
+
+def test_fast_path_until_the_limit():
+    async def run():
+        limiter = PriorityLimiter(2)
+        assert await limiter.acquire(NORMAL, 0.01)
+        assert await limiter.acquire(NORMAL, 0.01)
+        assert not await limiter.acquire(NORMAL, 0.01)
+        assert limiter.active == 2 and len(limiter) == 0
+
+    asyncio.run(run())
+
+
+def test_released_slots_go_to_the_highest_priority_first():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire(NORMAL, 1)
+        order = []
+
+        async def wait(priority, name):
+            await limiter.acquire(priority, 1)
+            order.append(name)
+
+        tasks = [asyncio.create_task(wait(LOW, "low")), asyncio.create_task(wait(NORMAL, "normal-1")),
+                 asyncio.create_task(wait(CRITICAL, "critical")), asyncio.create_task(wait(NORMAL, "normal-2"))]
+        await asyncio.sleep(0)
+        assert len(limiter) == 4
+        for _ in tasks:
+            limiter.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert order == ["critical", "normal-1", "normal-2", "low"]
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiters_leave_the_queue():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire(NORMAL, 1)
+        tasks = [asyncio.create_task(limiter.acquire(NORMAL, 10)) for _ in range(50)]
+        await asyncio.sleep(0)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert len(limiter) == 0
+        # Dead entries are purged rather than left to block the fast path
+        assert len(limiter._waiters) <= 16
+        limiter.release()
+        assert limiter.active == 0
+        assert await limiter.acquire(NORMAL, 0.01)
+
+    asyncio.run(run())
+
+
+def test_cancellation_after_handover_does_not_leak_the_slot():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire(NORMAL, 1)
+        waiter = asyncio.create_task(limiter.acquire(NORMAL, 10))
+        await asyncio.sleep(0)
+        # Hand the slot over and cancel the waiter before it gets to run
+        limiter.release()
+        waiter.cancel()
+        result = (await asyncio.gather(waiter, return_exceptions=True))[0]
+        if result is True:
+            # Depending on the Python version, the handed-over slot may be kept; then it is released normally
+            limiter.release()
+        assert limiter.active == 0 and len(limiter) == 0
+        assert await limiter.acquire(NORMAL, 0.01)
+
+    asyncio.run(run())
+
+
+def test_timed_out_waiters_are_not_counted():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire(NORMAL, 1)
+        assert not any(await asyncio.gather(*[limiter.acquire(NORMAL, 0.01) for _ in range(5)]))
+        assert len(limiter) == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(run())
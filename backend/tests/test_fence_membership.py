@@ -0,0 +1,94 @@
+# Filename: tests/test_fence_membership.py
+from app.models.tourist import ZoneType
+from app.services.fence_membership import ENTER, EXIT, FenceMembership, FenceMembershipTracker, raises_alert
+from app.services.geofence import GeoFenceIndex, compile_fence
+
+# A square of about 1.1 km around the origin
+_SQUARE = {"type": "Polygon", "coordinates": [[[-0.005, -0.005], [0.005, -0.005], [0.005, 0.005],
+                                               [-0.005, 0.005], [-0.005, -0.005]]]}
+INSIDE = (0.0, 0.0)
+OUTSIDE = (0.02, 0.0)
+# About 5 m outside the east edge
+NEAR_EDGE = (0.00505, 0.0)
+
+
+def _index(zone_type=ZoneType.RESTRICTED) -> GeoFenceIndex:
+    index = GeoFenceIndex(0.1)
+    index.add(compile_fence(1, "square", zone_type, _SQUARE))
+    return index
+
+
+def _feed(tracker, index, state, fixes):
+    transitions = []
+    for timestamp, (lon, lat) in fixes:
+        state, found = tracker.observe(state, lon, lat, timestamp, index)
+        transitions.extend((transition, fence.id) for transition, fence in found)
+    return state, transitions
+
+
+def test_first_fix_only_sets_baseline():
+    tracker = FenceMembershipTracker(dwell_seconds=30, min_fixes=2, hysteresis_m=15)
+    state, transitions = tracker.observe(None, *INSIDE, 0.0, _index())
+    assert transitions == []
+    assert state.confirmed == frozenset({1})
+
+
+def test_enter_needs_min_fixes_and_dwell():
+    tracker = FenceMembershipTracker(dwell_seconds=30, min_fixes=2, hysteresis_m=15)
+    index = _index()
+    state, _ = tracker.observe(None, *OUTSIDE, 0.0, index)
+    state, transitions = _feed(tracker, index, state, [(10, INSIDE), (20, INSIDE)])
+    assert transitions == []
+    state, transitions = _feed(tracker, index, state, [(40, INSIDE)])
+    assert transitions == [(ENTER, 1)]
+    assert state.confirmed == frozenset({1}) and state.candidate is None
+
+
+def test_flapping_resets_the_candidate():
+    tracker = FenceMembershipTracker(dwell_seconds=30, min_fixes=2, hysteresis_m=15)
+    index = _index()
+    state, _ = tracker.observe(None, *OUTSIDE, 0.0, index)
+    state, transitions = _feed(tracker, index, state, [(10, INSIDE), (20, OUTSIDE), (30, INSIDE), (45, INSIDE)])
+    assert transitions == []
+    assert state.candidate_since == 30
+
+
+def test_hysteresis_keeps_membership_near_the_edge():
+    tracker = FenceMembershipTracker(dwell_seconds=0, min_fixes=1, hysteresis_m=15)
+    index = _index()
+    state, _ = tracker.observe(None, *INSIDE, 0.0, index)
+    state, transitions = _feed(tracker, index, state, [(10, NEAR_EDGE), (20, NEAR_EDGE)])
+    assert transitions == []
+    state, transitions = _feed(tracker, index, state, [(30, OUTSIDE)])
+    assert transitions == [(EXIT, 1)]
+
+
+def test_observe_does_not_modify_the_given_state():
+    tracker = FenceMembershipTracker(dwell_seconds=0, min_fixes=1, hysteresis_m=15)
+    index = _index()
+    before = FenceMembership(frozenset())
+    after, transitions = tracker.observe(before, *INSIDE, 10.0, index)
+    assert transitions == [(ENTER, index.fences[1])]
+    assert before.confirmed == frozenset() and after.confirmed == frozenset({1})
+
+
+def test_deleted_fences_leave_the_membership_silently():
+    tracker = FenceMembershipTracker(dwell_seconds=0, min_fixes=1, hysteresis_m=15)
+    index = _index()
+    state, _ = tracker.observe(None, *INSIDE, 0.0, index)
+    index.remove(1)
+    state, transitions = tracker.observe(state, *INSIDE, 10.0, index)
+    assert transitions == [] and state.confirmed == frozenset()
+
+
+def test_json_round_trip():
+    state = FenceMembership(frozenset({3, 1}), frozenset({2}), 12.5, 1)
+    restored = FenceMembership.from_json(state.to_json())
+    assert (restored.confirmed, restored.candidate, restored.candidate_since, restored.candidate_fixes) == \
+           (frozenset({1, 3}), frozenset({2}), 12.5, 1)
+    assert FenceMembership.from_json(None) is None
+
+
+def test_violations():
+    assert raises_alert(ENTER, ZoneType.RESTRICTED) and raises_alert(EXIT, ZoneType.SAFE)
+    assert not raises_alert(EXIT, ZoneType.RESTRICTED) and not raises_alert(ENTER, ZoneType.SAFE)
@@ -0,0 +1,34 @@
+# Filename: tests/test_heatmap.py
+from app.services.heatmap import HeatmapAggregator
+
+
+def _aggregator() -> HeatmapAggregator:
+    return HeatmapAggregator(precisions=[3, 5], max_tile_depth=2, cache_size=100, reseed_interval=60)
+
+
+def test_full_precision_tiles_change_version():
+    heatmap = _aggregator()
+    heatmap.move_tourist(1, 26.1445, 91.7362)
+    cell = heatmap._tourist_cells[1][:5]
+    body, etag = heatmap.tile(5, cell)
+    assert body["cells"][0]["tourists"] == 1
+
+    heatmap.move_tourist(2, 26.1445, 91.7362)
+    assert heatmap.etag(5, cell) != etag
+    assert heatmap.tile(5, cell)[0]["cells"][0]["tourists"] == 2
+
+
+def test_requests_for_unknown_tiles_do_not_grow_the_version_map():
+    heatmap = _aggregator()
+    for tile in ("abc", "zzz", "9q5", "s0000"):
+        heatmap.etag(5, tile)
+        heatmap.tile(5, tile[:3])
+    assert heatmap.stats()["versions"] == 0
+
+
+def test_reseed_forgets_versions_of_emptied_tiles():
+    heatmap = _aggregator()
+    heatmap.move_tourist(1, 26.1445, 91.7362)
+    assert heatmap.stats()["versions"] > 0
+    heatmap.load({}, {})
+    assert heatmap.stats()["versions"] == 0
@@ -0,0 +1,64 @@
+# Filename: tests/test_ratelimit.py
+import pytest
+from app.core.ratelimit import SlidingWindowCounter, TokenBuckets
+
+
+def test_sliding_window_weights_previous_window():
+    counter = SlidingWindowCounter(window_seconds=60, max_keys=10)
+    for _ in range(10):
+        counter.hit("ip", now=30.0)
+    assert counter.count("ip", now=30.0) == 10
+    # A quarter into the next window, three quarters of the previous one still overlaps
+    assert counter.count("ip", now=75.0) == pytest.approx(7.5)
+    # Two windows later nothing is left
+    assert counter.count("ip", now=180.0) == 0
+
+
+def test_sliding_window_retry_after():
+    counter = SlidingWindowCounter(window_seconds=60, max_keys=10)
+    for _ in range(5):
+        counter.hit("ip", now=0.0)
+    assert counter.retry_after("ip", limit=10, now=0.0) == 0.0
+    retry = counter.retry_after("ip", limit=5, now=0.0)
+    assert counter.count("ip", now=retry - 1.0) >= 5
+    assert counter.count("ip", now=retry + 1e-6) < 5
+
+
+def test_sliding_window_evicts_least_recently_used():
+    counter = SlidingWindowCounter(window_seconds=60, max_keys=2)
+    counter.hit("a", now=0.0)
+    counter.hit("b", now=0.0)
+    counter.hit("a", now=1.0)
+    counter.hit("c", now=2.0)
+    assert len(counter) == 2
+    assert counter.count("b", now=2.0) == 0
+    assert counter.count("a", now=2.0) == 2
+
+
+def test_token_bucket_burst_then_rate():
+    buckets = TokenBuckets(rate=2.0, burst=3.0, max_keys=10)
+    assert [buckets.take("u", now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("u", now=0.0) == pytest.approx(0.5)
+    assert buckets.take("u", now=0.5) == 0.0
+    # Keys are independent
+    assert buckets.take("v", now=0.5) == 0.0
+
+
+def test_token_bucket_refund_is_capped_at_burst():
+    buckets = TokenBuckets(rate=0.0, burst=2.0, max_keys=10)
+    buckets.take("u", now=0.0)
+    buckets.refund("u")
+    buckets.refund("u")
+    assert [buckets.take("u", now=0.0) for _ in range(3)][:2] == [0.0, 0.0]
+    assert buckets.take("u", now=0.0) > 0
+    # Refunding an unknown key does not create it
+    buckets.refund("nobody")
+    assert len(buckets) == 1
+
+
+def test_token_bucket_evicted_key_starts_full():
+    buckets = TokenBuckets(rate=0.0, burst=1.0, max_keys=1)
+    buckets.take("a", now=0.0)
+    buckets.take("b", now=0.0)
+    assert len(buckets) == 1
+    assert buckets.take("a", now=0.0) == 0.0
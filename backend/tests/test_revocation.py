@@ -0,0 +1,35 @@
+# Filename: tests/test_revocation.py
+from app.services.revocation import RevocationList
+
+
+def test_purge_drops_only_expired_buckets():
+    revoked = RevocationList(bucket_seconds=60, sync_interval=30)
+    revoked.add("old", expires_at=100.0)
+    revoked.add("soon", expires_at=170.0)
+    revoked.add("later", expires_at=1000.0)
+    assert revoked.stats() == {"revoked": 3, "buckets": 3}
+
+    revoked.purge(now=125.0)
+    assert "old" not in revoked
+    assert "soon" in revoked and "later" in revoked
+
+    revoked.purge(now=200.0)
+    assert "soon" not in revoked and "later" in revoked
+    assert revoked.stats() == {"revoked": 1, "buckets": 1}
+
+
+def test_buckets_never_drop_unexpired_tokens():
+    revoked = RevocationList(bucket_seconds=60, sync_interval=30)
+    revoked.add("a", expires_at=61.0)
+    # The bucket holding "a" covers expiries up to 120 and is only dropped once they have all passed
+    revoked.purge(now=100.0)
+    assert "a" in revoked
+
+
+def test_add_is_idempotent():
+    revoked = RevocationList(bucket_seconds=60, sync_interval=30)
+    revoked.add("a", expires_at=100.0)
+    revoked.add("a", expires_at=5000.0)
+    assert len(revoked) == 1
+    revoked.purge(now=150.0)
+    assert "a" not in revoked
@@ -0,0 +1,42 @@
+# Filename: tests/test_spatial.py
+import numpy as np
+import pytest
+from app.core.spatial import SphereKDTree, chord_to_meters, unit_vectors
+
+
+def _brute_force(latitudes, longitudes, latitude, longitude):
+    diff = unit_vectors(latitudes, longitudes) - unit_vectors([latitude], [longitude])[0]
+    return chord_to_meters(np.einsum("ij,ij->i", diff, diff))
+
+
+def test_one_degree_of_latitude():
+    diff = unit_vectors([0.0], [0.0]) - unit_vectors([1.0], [0.0])
+    assert chord_to_meters(np.einsum("ij,ij->i", diff, diff))[0] == pytest.approx(111_195, rel=1e-3)
+
+
+@pytest.mark.parametrize("k", [1, 5, 40])
+def test_matches_brute_force(k):
+    rng = np.random.default_rng(0)
+    latitudes = rng.uniform(-80, 80, 500)
+    longitudes = rng.uniform(-180, 180, 500)
+    ids = np.arange(1000, 1500)
+    tree = SphereKDTree(ids, latitudes, longitudes, leaf_size=8)
+    for latitude, longitude in [(26.1, 91.7), (0.0, 179.9), (0.0, -179.9), (-60.0, 10.0)]:
+        found_ids, found_distances = tree.query(latitude, longitude, k)
+        expected = _brute_force(latitudes, longitudes, latitude, longitude)
+        order = np.argsort(expected, kind="stable")[:k]
+        np.testing.assert_allclose(found_distances, expected[order])
+        assert set(found_ids.tolist()) == set(ids[order].tolist())
+
+
+def test_k_larger_than_tree():
+    tree = SphereKDTree([1, 2], [0.0, 1.0], [0.0, 0.0])
+    ids, distances = tree.query(0.0, 0.0, 10)
+    assert ids.tolist() == [1, 2]
+    assert distances[0] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_empty_tree():
+    tree = SphereKDTree([], [], [])
+    ids, distances = tree.query(0.0, 0.0, 3)
+    assert len(tree) == 0 and len(ids) == 0 and len(distances) == 0
@@ -0,0 +1,37 @@
+# Filename: tests/test_trackcodec.py
+import pytest
+from app.core.trackcodec import decode_track, downsample_track, encode_track, to_track_point
+
+
+def test_round_trip_preserves_points():
+    points = [
+        to_track_point(1_700_000_000_000, 26.1445, 91.7362),
+        to_track_point(1_700_000_005_000, 26.1446, 91.7361),
+        # Backwards in space and a large jump in time exercise negative and wide deltas
+        to_track_point(1_700_003_600_000, -33.8688, -151.2093),
+        to_track_point(1_700_003_600_001, 90.0, 180.0),
+    ]
+    assert decode_track(encode_track(points)) == points
+
+
+def test_empty_track():
+    assert encode_track([]) == b""
+    assert decode_track(b"") == []
+
+
+def test_consecutive_fixes_are_compact():
+    points = [to_track_point(1_700_000_000_000 + i * 5000, 26.1445 + i * 1e-4, 91.7362) for i in range(100)]
+    # The first point carries absolute values; the rest are small deltas
+    assert len(encode_track(points)) < 100 * 7
+
+
+def test_truncated_payload_is_rejected():
+    data = encode_track([to_track_point(1_700_000_000_000, 26.1445, 91.7362)])
+    with pytest.raises(ValueError):
+        decode_track(data[:-1])
+
+
+def test_downsample_keeps_last_point_per_bucket():
+    points = [(0, 1, 1), (400, 2, 2), (999, 3, 3), (1000, 4, 4), (2500, 5, 5)]
+    assert downsample_track(points, 1000) == [(999, 3, 3), (1000, 4, 4), (2500, 5, 5)]
+    assert downsample_track(points, 0) == points